@@ -6,21 +6,27 @@ Provee herramientas para:
   2. Configurar interactivamente una expresión vía GUI.
   3. Traducir una fórmula booleana a un P-sistema SAT jerárquico.
   4. Resolver satisfacibilidad simulando el P-sistema.
+  5. Leer instancias DIMACS CNF y resolverlas por lotes en paralelo.
 """
 
 import tkinter as tk
 from tkinter import ttk, messagebox
 import re
-from copy import deepcopy
-from typing import List, Dict, Optional
-
-from .SistemaP import SistemaP, Membrana, Regla, simular_lapso
+import gzip
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+
+from .SistemaP import SistemaP, Membrana, Regla, simular
 from .SistemaP import (
     SistemaP,
     Membrana,
     Regla,
     Production,
-    Direction
+    Direction,
+    compartir_reglas
 )
 # ----------------------------------------------------------------------
 # 1. AST para expresiones booleanas
@@ -30,6 +36,9 @@ class ExpresionBooleana:
     def __str__(self) -> str: ...
     def to_cnf(self) -> 'ExpresionBooleana': ...
     def obtener_clausulas(self) -> List[List[str]]: ...
+    def to_cnf_tseitin(self) -> 'ExpresionBooleana':
+        """CNF equisatisfacible de tamaño lineal (ver clausulas_tseitin)."""
+        return expresion_desde_clausulas(clausulas_tseitin(self))
 
 class Variable(ExpresionBooleana):
     def __init__(self, nombre: str):
@@ -68,7 +77,10 @@ class Conjuncion(ExpresionBooleana):
     def to_cnf(self) -> 'ExpresionBooleana':
         return Conjuncion(self.left.to_cnf(), self.right.to_cnf())
     def obtener_clausulas(self) -> List[List[str]]:
-        return self.left.obtener_clausulas() + self.right.obtener_clausulas()
+        clausulas: List[List[str]] = []
+        for e in _operandos(self):
+            clausulas.extend(e.obtener_clausulas())
+        return clausulas
 
 class Disyuncion(ExpresionBooleana):
     def __init__(self, left: ExpresionBooleana, right: ExpresionBooleana):
@@ -90,19 +102,194 @@ class Disyuncion(ExpresionBooleana):
             )
         return Disyuncion(L, R)
     def obtener_clausulas(self) -> List[List[str]]:
-        lits: List[str] = []
-        def recoger(e: ExpresionBooleana):
-            if isinstance(e, Disyuncion):
-                recoger(e.left); recoger(e.right)
-            elif isinstance(e, Variable):
-                lits.append(e.nombre)
-            elif isinstance(e, Negacion) and isinstance(e.operando, Variable):
-                lits.append(f"~{e.operando.nombre}")
-            else:
-                raise ValueError("Literal no válido en cláusula")
-        recoger(self)
+        lits = _literales(self)
+        if lits is None:
+            raise ValueError("Literal no válido en cláusula")
         return [lits]
 
+# ----------------------------------------------------------------------
+# 1.1. Codificación de Tseitin (iterativa, tamaño lineal)
+# ----------------------------------------------------------------------
+
+def _operandos(expr: ExpresionBooleana) -> List[ExpresionBooleana]:
+    """
+    Operandos de una cadena de conjunciones (o de disyunciones) del mismo
+    tipo que expr, de izquierda a derecha, sin recursión.
+    """
+    tipo = type(expr)
+    pila = [expr]
+    operandos: List[ExpresionBooleana] = []
+    while pila:
+        e = pila.pop()
+        if type(e) is tipo:
+            pila.append(e.right)
+            pila.append(e.left)
+        else:
+            operandos.append(e)
+    return operandos
+
+def _literales(expr: ExpresionBooleana) -> Optional[List[str]]:
+    """Literales de expr si es una cláusula (disyunción de literales); si no, None."""
+    lits: List[str] = []
+    for e in _operandos(expr) if isinstance(expr, Disyuncion) else [expr]:
+        if isinstance(e, Variable):
+            lits.append(e.nombre)
+        elif isinstance(e, Negacion) and isinstance(e.operando, Variable):
+            lits.append(f"~{e.operando.nombre}")
+        else:
+            return None
+    return lits
+
+def _negar(literal: str) -> str:
+    return literal[1:] if literal.startswith("~") else f"~{literal}"
+
+def clausulas_tseitin(expr: ExpresionBooleana, prefijo: str = "_t") -> List[List[str]]:
+    """
+    Cláusulas de una CNF equisatisfacible con expr, en el formato de
+    obtener_clausulas. Cada conjunción o disyunción (aplanada a n-aria)
+    recibe una variable auxiliar <prefijo><k> equivalente a ella; las
+    negaciones sólo cambian el signo del literal. Los conjuntos de primer
+    nivel que ya son cláusulas se emiten tal cual. El recorrido usa una
+    pila explícita y memoriza los nodos ya codificados, así que el número
+    de cláusulas y el tiempo son lineales en el tamaño de expr (nodos
+    compartidos incluidos). El prefijo no debe coincidir con el de
+    ninguna variable de expr (el parser no admite '_' inicial).
+    """
+    clausulas: List[List[str]] = []
+    literal: Dict[int, str] = {}
+    contador = 0
+
+    def hijos(e: ExpresionBooleana) -> List[ExpresionBooleana]:
+        if isinstance(e, Negacion):
+            return [e.operando]
+        if isinstance(e, (Conjuncion, Disyuncion)):
+            return _operandos(e)
+        if isinstance(e, Variable):
+            return []
+        raise ValueError(f"Nodo desconocido: {e}")
+
+    def codificar(raiz: ExpresionBooleana) -> str:
+        nonlocal contador
+        pila = [(raiz, False)]
+        while pila:
+            e, expandido = pila.pop()
+            if id(e) in literal:
+                continue
+            if isinstance(e, Variable):
+                literal[id(e)] = e.nombre
+                continue
+            operandos = hijos(e)
+            if not expandido:
+                pila.append((e, True))
+                pila.extend((h, False) for h in operandos if id(h) not in literal)
+                continue
+            lits = [literal[id(h)] for h in operandos]
+            if isinstance(e, Negacion):
+                literal[id(e)] = _negar(lits[0])
+                continue
+            contador += 1
+            t = f"{prefijo}{contador}"
+            if isinstance(e, Conjuncion):
+                # t ↔ (l1 ∧ … ∧ lk)
+                clausulas.extend([_negar(t), l] for l in lits)
+                clausulas.append([t] + [_negar(l) for l in lits])
+            else:
+                # t ↔ (l1 ∨ … ∨ lk)
+                clausulas.append([_negar(t)] + lits)
+                clausulas.extend([t, _negar(l)] for l in lits)
+            literal[id(e)] = t
+        return literal[id(raiz)]
+
+    conjuntos = _operandos(expr) if isinstance(expr, Conjuncion) else [expr]
+    for c in conjuntos:
+        lits = _literales(c)
+        clausulas.append(lits if lits is not None else [codificar(c)])
+    return clausulas
+
+def expresion_desde_clausulas(clausulas: List[List[str]]) -> ExpresionBooleana:
+    """Construye la conjunción de disyunciones de `clausulas` (sin recursión)."""
+    if not clausulas or not all(clausulas):
+        raise ValueError("Se necesita al menos una cláusula y ninguna vacía")
+
+    def literal(l: str) -> ExpresionBooleana:
+        return Negacion(Variable(l[1:])) if l.startswith("~") else Variable(l)
+
+    expr: Optional[ExpresionBooleana] = None
+    for clausula in clausulas:
+        disy = literal(clausula[0])
+        for l in clausula[1:]:
+            disy = Disyuncion(disy, literal(l))
+        expr = disy if expr is None else Conjuncion(expr, disy)
+    return expr
+
+# ----------------------------------------------------------------------
+# 1.2. Hash-consing: subexpresiones idénticas como un único nodo (DAG)
+# ----------------------------------------------------------------------
+
+class TablaExpresiones:
+    """
+    Tabla de hash-consing de expresiones booleanas: los constructores
+    devuelven siempre el mismo objeto para la misma estructura, así que
+    las subexpresiones idénticas pasan a ser un único nodo compartido.
+    La clave de un nodo es (tipo, ids de sus hijos canónicos), que la tabla
+    mantiene vivos.
+    """
+
+    def __init__(self):
+        self._nodos: Dict[Tuple, ExpresionBooleana] = {}
+
+    def _nodo(self, clave: Tuple, crear) -> ExpresionBooleana:
+        nodo = self._nodos.get(clave)
+        if nodo is None:
+            nodo = self._nodos[clave] = crear()
+        return nodo
+
+    def variable(self, nombre: str) -> ExpresionBooleana:
+        return self._nodo(('var', nombre), lambda: Variable(nombre))
+
+    def negacion(self, op: ExpresionBooleana) -> ExpresionBooleana:
+        return self._nodo(('not', id(op)), lambda: Negacion(op))
+
+    def conjuncion(self, left: ExpresionBooleana, right: ExpresionBooleana) -> ExpresionBooleana:
+        return self._nodo(('and', id(left), id(right)), lambda: Conjuncion(left, right))
+
+    def disyuncion(self, left: ExpresionBooleana, right: ExpresionBooleana) -> ExpresionBooleana:
+        return self._nodo(('or', id(left), id(right)), lambda: Disyuncion(left, right))
+
+    def compartir(self, expr: ExpresionBooleana) -> ExpresionBooleana:
+        """Versión canónica (DAG) de expr, construida sin recursión."""
+        canonico: Dict[int, ExpresionBooleana] = {}
+        pila = [(expr, False)]
+        while pila:
+            e, expandido = pila.pop()
+            if id(e) in canonico:
+                continue
+            if isinstance(e, Variable):
+                canonico[id(e)] = self.variable(e.nombre)
+            elif not expandido:
+                pila.append((e, True))
+                if isinstance(e, Negacion):
+                    pila.append((e.operando, False))
+                elif isinstance(e, (Conjuncion, Disyuncion)):
+                    pila.append((e.right, False))
+                    pila.append((e.left, False))
+                else:
+                    raise ValueError(f"Nodo desconocido: {e}")
+            elif isinstance(e, Negacion):
+                canonico[id(e)] = self.negacion(canonico[id(e.operando)])
+            elif isinstance(e, Conjuncion):
+                canonico[id(e)] = self.conjuncion(canonico[id(e.left)], canonico[id(e.right)])
+            else:
+                canonico[id(e)] = self.disyuncion(canonico[id(e.left)], canonico[id(e.right)])
+        return canonico[id(expr)]
+
+    def __len__(self) -> int:
+        return len(self._nodos)
+
+def compartir_subexpresiones(expr: ExpresionBooleana) -> ExpresionBooleana:
+    """expr con las subexpresiones estructuralmente idénticas fusionadas en un DAG."""
+    return TablaExpresiones().compartir(expr)
+
 # ----------------------------------------------------------------------
 # 2. Parser recursivo con sintaxis (~, &, |, not, and, or)
 # ----------------------------------------------------------------------
@@ -245,46 +432,216 @@ from .SistemaP import SistemaP, Membrana, Regla, Production, Direction
 from .SAT import ExpresionBooleana, Variable, Negacion, Conjuncion, Disyuncion
 
 
-def generar_sistema_por_estructura(expr: ExpresionBooleana) -> SistemaP:
+def _arbol_nodos(
+    expr: ExpresionBooleana
+) -> Tuple[Dict[str, Tuple[str, ...]], Dict[str, str], Dict[str, str], Dict[str, List[str]], str]:
     """
-    Genera un P-sistema en el que la membrana raíz "M_root" contiene
-    las membranas de asignación, cada una codificando completamente la
-    expresión booleana expr para evaluar satisfacibilidad.
+    Numera los nodos de expr (n0, n1, ... en preorden) y devuelve
+    (hijos, tipo, variable de cada hoja, salidas, id de la raíz). Un nodo
+    compartido (mismo objeto, ver compartir_subexpresiones) recibe un solo
+    id y produce una copia de su valor por cada uso: salidas[nid] son los
+    prefijos de esas copias ("n3" si se usa una vez; "n3.0", "n3.1", ...
+    si se usa varias), y hijos[nid] indica qué copia consume el padre.
+    Así ninguna regla puede quedarse con la copia de otro padre. Las
+    cadenas de conjunciones (o disyunciones) se aplanan en un único nodo
+    n-ario. El recorrido es iterativo.
     """
-    # 1. Recorrer el árbol de la expresión para asignar IDs a nodos
     node_children: Dict[str, Tuple[str, ...]] = {}
     node_type: Dict[str, str] = {}
     node_var: Dict[str, str] = {}
-    counter = {"i": 0}
+    usos: Dict[str, int] = {}
+    ids: Dict[int, str] = {}
 
-    def build(node: ExpresionBooleana) -> str:
-        i = counter["i"]
-        nid = f"n{i}"
-        counter["i"] += 1
+    def hijos(node: ExpresionBooleana) -> Tuple[ExpresionBooleana, ...]:
+        if isinstance(node, Variable):
+            return ()
+        if isinstance(node, Negacion):
+            return (node.operando,)
+        if isinstance(node, (Conjuncion, Disyuncion)):
+            return tuple(_operandos(node))   # cadenas asociativas → puerta n-aria
+        raise ValueError(f"Nodo desconocido: {node}")
+
+    tipos = {Variable: 'var', Negacion: 'not', Conjuncion: 'and', Disyuncion: 'or'}
+    pila = [(expr, False)]
+    while pila:
+        node, expandido = pila.pop()
+        if not expandido:
+            if id(node) in ids:
+                continue
+            ids[id(node)] = f"n{len(ids)}"
+            pila.append((node, True))
+            pila.extend((h, False) for h in reversed(hijos(node)))
+            continue
+        nid = ids[id(node)]
+        if nid in node_type:
+            continue
+        node_type[nid] = tipos[type(node)]
         if isinstance(node, Variable):
-            node_type[nid] = 'var'
             node_var[nid] = node.nombre
-            node_children[nid] = ()
-        elif isinstance(node, Negacion):
-            child = build(node.operando)
-            node_type[nid] = 'not'
-            node_children[nid] = (child,)
-        elif isinstance(node, Conjuncion):
-            left = build(node.left)
-            right = build(node.right)
-            node_type[nid] = 'and'
-            node_children[nid] = (left, right)
-        elif isinstance(node, Disyuncion):
-            left = build(node.left)
-            right = build(node.right)
-            node_type[nid] = 'or'
-            node_children[nid] = (left, right)
-        else:
-            raise ValueError(f"Nodo desconocido: {node}")
-        return nid
+        node_children[nid] = tuple(ids[id(h)] for h in hijos(node))
+        usos.setdefault(nid, 0)
+        for c in node_children[nid]:
+            usos[c] = usos.get(c, 0) + 1
 
-    # Construir nodos y determinar root_id
-    root_id = build(expr)
+    root_id = ids[id(expr)]
+    usos[root_id] += 1   # la regla final
+
+    def prefijo(nid: str, k: int) -> str:
+        return nid if usos[nid] == 1 else f"{nid}.{k}"
+
+    salidas = {nid: [prefijo(nid, k) for k in range(usos[nid])] for nid in node_type}
+    siguiente: Dict[str, int] = {}
+    for nid in node_type:
+        copias = []
+        for c in node_children[nid]:
+            k = siguiente.get(c, 0)
+            siguiente[c] = k + 1
+            copias.append(salidas[c][k])
+        node_children[nid] = tuple(copias)
+    return node_children, node_type, node_var, salidas, root_id
+
+
+VEREDICTO_T = "veredicto_T"
+VEREDICTO_F = "veredicto_F"
+
+
+def _marca(var: str, valor: bool) -> str:
+    """Objeto inerte que registra el valor de `var` en una membrana de asignación."""
+    return f"asig_{var}_{'T' if valor else 'F'}"
+
+
+def asignacion_de(recursos: Dict[str, int]) -> Dict[str, bool]:
+    """Asignación codificada en los recursos de una membrana de asignación."""
+    asignacion: Dict[str, bool] = {}
+    for simbolo in recursos:
+        if simbolo.startswith("asig_"):
+            var, valor = simbolo[len("asig_"):].rsplit("_", 1)
+            asignacion[var] = valor == "T"
+    return dict(sorted(asignacion.items()))
+
+
+def _copias(prefijos: List[str], valor: str) -> List[Production]:
+    """Producciones de una copia del valor ("T"/"F") por cada prefijo."""
+    return [Production(symbol=f"{p}_{valor}", count=1) for p in prefijos]
+
+
+def _reglas_operadores(
+    node_type: Dict[str, str],
+    node_children: Dict[str, Tuple[str, ...]],
+    salidas: Dict[str, List[str]],
+    root_id: str
+) -> List[Regla]:
+    """
+    Reglas de evaluación de los operadores (not, and, or) y regla final
+    de la raíz (SAT o X hacia la membrana padre). Cada nodo produce una
+    copia de su valor por cada prefijo de salidas[nid].
+    """
+    reglas: List[Regla] = []
+
+    # Operadores: not, and, or (n-arios). Los valores de un nodo en una
+    # membrana son todos T o todos F, así que sus reglas nunca compiten y
+    # no hacen falta prioridades: cada nivel se evalúa en un paso.
+    for nid, typ in node_type.items():
+        children = node_children[nid]
+        if typ == 'not':
+            c = children[0]
+            reglas.append(Regla(
+                left={f"{c}_T": 1},
+                productions=_copias(salidas[nid], "F")
+            ))
+            reglas.append(Regla(
+                left={f"{c}_F": 1},
+                productions=_copias(salidas[nid], "T")
+            ))
+        elif typ == 'and':
+            reglas.append(Regla(
+                left={f"{c}_T": 1 for c in children},
+                productions=_copias(salidas[nid], "T")
+            ))
+            for c in children:
+                reglas.append(Regla(
+                    left={f"{c}_F": 1},
+                    productions=_copias(salidas[nid], "F")
+                ))
+        elif typ == 'or':
+            for c in children:
+                reglas.append(Regla(
+                    left={f"{c}_T": 1},
+                    productions=_copias(salidas[nid], "T")
+                ))
+            reglas.append(Regla(
+                left={f"{c}_F": 1 for c in children},
+                productions=_copias(salidas[nid], "F")
+            ))
+
+    # Regla final: si root es true → SAT; si root es false → X. La membrana
+    # guarda además su veredicto para poder retirarla e identificar testigos.
+    reglas.append(Regla(
+        left={f"{root_id}_T": 1},
+        productions=[
+            Production(symbol="SAT", count=1, direction=Direction.OUT),
+            Production(symbol=VEREDICTO_T, count=1),
+        ]
+    ))
+    reglas.append(Regla(
+        left={f"{root_id}_F": 1},
+        productions=[
+            Production(symbol="X", count=1, direction=Direction.OUT),
+            Production(symbol=VEREDICTO_F, count=1),
+        ]
+    ))
+
+    return reglas
+
+
+def _profundidad(node_type: Dict[str, str], node_children: Dict[str, Tuple[str, ...]]) -> Dict[str, int]:
+    """Profundidad de cada nodo (hojas 0) en el DAG de puertas de _arbol_nodos."""
+    prof: Dict[str, int] = {}
+    for nid in node_type:   # orden postorden: hijos antes que padres
+        prof[nid] = 1 + max(
+            (prof[c.split(".")[0]] for c in node_children[nid]), default=-1
+        )
+    return prof
+
+
+def pasos_evaluacion(expr: ExpresionBooleana, por_division: bool = False) -> int:
+    """
+    Lapsos que necesita el sistema SAT de expr para enviar SAT o X a la
+    raíz: con generar_sistema_por_estructura, profundidad + 2 (reglas de
+    variable, una por nivel de puertas, regla final); con
+    generar_sistema_por_division, n + profundidad + 1 (n divisiones). La
+    profundidad se mide tras aplanar las cadenas en puertas n-arias, así
+    que una cláusula de mil literales cuenta como un solo nivel.
+    """
+    node_children, node_type, node_var, _, root_id = _arbol_nodos(expr)
+    profundidad = _profundidad(node_type, node_children)[root_id]
+    if por_division:
+        return len(set(node_var.values())) + profundidad + 1
+    return profundidad + 2
+
+
+def generar_sistema_por_estructura(
+    expr: ExpresionBooleana,
+    compartir: bool = True,
+    prefijo: Optional[Dict[str, bool]] = None
+) -> SistemaP:
+    """
+    Genera un P-sistema en el que la membrana raíz "M_root" contiene
+    las membranas de asignación, cada una codificando completamente la
+    expresión booleana expr para evaluar satisfacibilidad. Cada variable
+    tiene una sola regla por valor, con una producción por aparición. Con
+    `compartir`, las subexpresiones repetidas se fusionan antes en un
+    único nodo con producciones de fan-out. Las
+    variables de `prefijo` quedan fijadas: sólo se crean las membranas de
+    las asignaciones de las demás. Cada membrana lleva marcas asig_<var>_T/F
+    (ver asignacion_de).
+    """
+    prefijo = prefijo or {}
+    if compartir:
+        expr = compartir_subexpresiones(expr)
+
+    # 1. Recorrer el árbol de la expresión para asignar IDs a nodos
+    node_children, node_type, node_var, salidas, root_id = _arbol_nodos(expr)
 
     # 2. Crear sistema y membrana raíz fija "M_root"
     sistema = SistemaP()
@@ -294,87 +651,109 @@ def generar_sistema_por_estructura(expr: ExpresionBooleana) -> SistemaP:
 
     # 3. Extraer variables únicas y ordenadas
     variables = sorted({v for v in node_var.values()})
-    n = len(variables)
-
-    # 4. Para cada asignación booleana, crear membrana y reglas de evaluación
-    for bits in itertools.product([False, True], repeat=n):
-        assign_id = f"assign_{''.join('1' if b else '0' for b in bits)}"
-        # Recursos iniciales: var_T o var_F
-        res = {f"{var}_{'T' if val else 'F'}": 1 for var, val in zip(variables, bits)}
-        mem = Membrana(id_mem=assign_id, resources=res)
+
+    # 4. Reglas de evaluación: idénticas en todas las membranas de asignación,
+    #    así que se construyen una vez y se comparten como TablaReglas.
+    reglas: List[Regla] = []
+
+    # 4.1. Variables: una regla por variable y valor que produce nodo_T o
+    #      nodo_F en todas sus hojas. Sin compartir, cada aparición es una
+    #      hoja distinta, y una regla por hoja competiría por el único var_T.
+    hojas: Dict[str, List[str]] = {}
+    for nid, typ in node_type.items():
+        if typ == 'var':
+            hojas.setdefault(node_var[nid], []).extend(salidas[nid])
+    for var in variables:
+        reglas.append(Regla(
+            left={f"{var}_T": 1},
+            productions=_copias(hojas[var], "T")
+        ))
+        reglas.append(Regla(
+            left={f"{var}_F": 1},
+            productions=_copias(hojas[var], "F")
+        ))
+
+    # 4.2. Operadores y 4.3. regla final
+    reglas.extend(_reglas_operadores(node_type, node_children, salidas, root_id))
+
+    tabla = compartir_reglas(reglas)
+
+    # 5. Para cada asignación booleana de las variables libres, crear su membrana
+    libres = [var for var in variables if var not in prefijo]
+    for bits in itertools.product([False, True], repeat=len(libres)):
+        valores = {**prefijo, **dict(zip(libres, bits))}
+        assign_id = f"assign_{''.join('1' if valores[var] else '0' for var in variables)}"
+        # Recursos iniciales: var_T o var_F, y su marca
+        res = {f"{var}_{'T' if valores[var] else 'F'}": 1 for var in variables}
+        res.update({_marca(var, valores[var]): 1 for var in variables})
+        mem = Membrana(id_mem=assign_id, resources=res, reglas=tabla)
         sistema.add_membrane(mem, parent_id="M_root")
 
-        # 4.1. Variables: generan nodo_T o nodo_F
-        for nid, typ in node_type.items():
-            if typ == 'var':
-                var = node_var[nid]
-                mem.add_regla(Regla(
-                    left={f"{var}_T": 1},
-                    productions=[Production(symbol=f"{nid}_T", count=1)],
-                    priority=1
-                ))
-                mem.add_regla(Regla(
-                    left={f"{var}_F": 1},
-                    productions=[Production(symbol=f"{nid}_F", count=1)]
-                ))
+    return sistema
 
-        # 4.2. Operadores: not, and, or
-        for nid, typ in node_type.items():
-            children = node_children[nid]
-            if typ == 'not':
-                c = children[0]
-                mem.add_regla(Regla(
-                    left={f"{c}_T": 1},
-                    productions=[Production(symbol=f"{nid}_F", count=1)]
-                ))
-                mem.add_regla(Regla(
-                    left={f"{c}_F": 1},
-                    productions=[Production(symbol=f"{nid}_T", count=1)],
-                    priority=1
-                ))
-            elif typ == 'and':
-                c1, c2 = children
-                mem.add_regla(Regla(
-                    left={f"{c1}_T": 1, f"{c2}_T": 1},
-                    productions=[Production(symbol=f"{nid}_T", count=1)],
-                    priority=1
-                ))
-                mem.add_regla(Regla(
-                    left={f"{c1}_F": 1},
-                    productions=[Production(symbol=f"{nid}_F", count=1)]
-                ))
-                mem.add_regla(Regla(
-                    left={f"{c2}_F": 1},
-                    productions=[Production(symbol=f"{nid}_F", count=1)]
-                ))
-            elif typ == 'or':
-                c1, c2 = children
-                mem.add_regla(Regla(
-                    left={f"{c1}_T": 1},
-                    productions=[Production(symbol=f"{nid}_T", count=1)],
-                    priority=1
-                ))
-                mem.add_regla(Regla(
-                    left={f"{c2}_T": 1},
-                    productions=[Production(symbol=f"{nid}_T", count=1)],
-                    priority=1
-                ))
-                mem.add_regla(Regla(
-                    left={f"{c1}_F": 1, f"{c2}_F": 1},
-                    productions=[Production(symbol=f"{nid}_F", count=1)]
-                ))
 
-        # 4.3. Regla final: si root es true → SAT; si root es false → X
-        mem.add_regla(Regla(
-            left={f"{root_id}_T": 1},
-            productions=[Production(symbol="SAT", count=1, direction=Direction.OUT)],
-            priority=2
-        ))
-        mem.add_regla(Regla(
-            left={f"{root_id}_F": 1},
-            productions=[Production(symbol="X", count=1, direction=Direction.OUT)]
-        ))
+def generar_sistema_por_division(
+    expr: ExpresionBooleana,
+    compartir: bool = True,
+    prefijo: Optional[Dict[str, bool]] = None
+) -> SistemaP:
+    """
+    Variante de generar_sistema_por_estructura que no crea las 2^n
+    membranas de asignación de antemano: "M_root" contiene una sola
+    membrana "assign" con el contador d0, y en el paso i una regla de
+    división sobre d<i> la parte en dos, con la variable i a true en una y
+    a false en la otra. Cada hija recibe directamente los objetos de hoja
+    (n<k>_T o n<k>_F) de todas las apariciones de la variable. Las
+    divisiones tienen la prioridad más alta, así que cada membrana empieza
+    a evaluar con las reglas de operadores en cuanto su asignación está
+    completa. El coste de construcción es lineal en el tamaño de la
+    fórmula; las 2^n membranas aparecen tras n pasos. `compartir`,
+    `prefijo` y las marcas de asignación como en
+    generar_sistema_por_estructura: las variables fijadas no se dividen.
+    """
+    prefijo = prefijo or {}
+    if compartir:
+        expr = compartir_subexpresiones(expr)
+
+    node_children, node_type, node_var, salidas, root_id = _arbol_nodos(expr)
+
+    sistema = SistemaP()
+    sistema.add_membrane(Membrana(id_mem="M_root", resources={}), parent_id=None)
+    sistema.output_membrane = "M_root"
 
+    # Hojas de cada variable, en orden de variable
+    hojas: Dict[str, List[str]] = {}
+    for nid, typ in node_type.items():
+        if typ == 'var':
+            hojas.setdefault(node_var[nid], []).append(nid)
+    libres = [var for var in sorted(hojas) if var not in prefijo]
+    n = len(libres)
+
+    def rama(var: str, valor: bool) -> Dict[str, int]:
+        v = 'T' if valor else 'F'
+        objetos = {f"{copia}_{v}": 1 for nid in hojas[var] for copia in salidas[nid]}
+        objetos[_marca(var, valor)] = 1
+        return objetos
+
+    # Divisiones: d<i> → (hojas de la variable i a T, d<i+1>) | (hojas a F, d<i+1>)
+    prioridad_division = 3
+    reglas: List[Regla] = []
+    for i, var in enumerate(libres):
+        siguiente = {f"d{i + 1}": 1} if i + 1 < n else {}
+        reglas.append(Regla(
+            left={f"d{i}": 1},
+            priority=prioridad_division,
+            division=({**rama(var, True), **siguiente}, {**rama(var, False), **siguiente})
+        ))
+    reglas.extend(_reglas_operadores(node_type, node_children, salidas, root_id))
+
+    # Variables fijadas: sus hojas y marcas ya están en la membrana inicial
+    iniciales: Dict[str, int] = {"d0": 1} if n else {}
+    for var in sorted(hojas):
+        if var in prefijo:
+            iniciales.update(rama(var, prefijo[var]))
+    asignacion = Membrana(id_mem="assign", resources=iniciales, reglas=compartir_reglas(reglas))
+    sistema.add_membrane(asignacion, parent_id="M_root")
     return sistema
 
 
@@ -382,22 +761,184 @@ def generar_sistema_por_estructura(expr: ExpresionBooleana) -> SistemaP:
 
 
 
+def _con_veredicto(mem: Membrana) -> bool:
+    """Las membranas que ya enviaron SAT o X dejan de evaluarse."""
+    return VEREDICTO_T in mem.resources or VEREDICTO_F in mem.resources
+
+
+def _resolver(
+    expr: ExpresionBooleana,
+    max_pasos: Optional[int],
+    ejecutor: Optional[Executor],
+    por_division: bool
+) -> Tuple[bool, int, float, float]:
+    """(satisfacible, pasos, segundos de construcción, segundos de simulación)."""
+    if max_pasos is None:
+        max_pasos = pasos_evaluacion(expr, por_division)
+    inicio = time.perf_counter()
+    generar = generar_sistema_por_division if por_division else generar_sistema_por_estructura
+    sistema = generar(expr)   # recién creado: no hace falta copiarlo
+    construido = time.perf_counter()
+    resultado = simular(
+        sistema, max_pasos, parada=lambda salida: "SAT" in salida,
+        ejecutor=ejecutor, rng_por_membrana=ejecutor is not None,
+        retirar=_con_veredicto
+    )
+    fin = time.perf_counter()
+    # Si no se decide tras max_pasos, lo damos por insat.
+    return resultado.motivo == "predicado", resultado.pasos, construido - inicio, fin - construido
+
+
 def resolver_satisfaccion(
     expr: ExpresionBooleana,
-    max_pasos: int = 20
+    max_pasos: Optional[int] = None,
+    ejecutor: Optional[Executor] = None,
+    por_division: bool = False
 ) -> bool:
     """
-    Simula el sistema generado por generar_sistema_por_estructura,
-    y devuelve True si la membrana de salida contiene 'sat'.
+    Simula el sistema generado por generar_sistema_por_estructura (o por
+    generar_sistema_por_division si `por_division`) hasta que la membrana
+    de salida recibe 'SAT' o el sistema se detiene, y devuelve True en el
+    primer caso. Si no se indica `max_pasos` se usa pasos_evaluacion(expr).
+    Con `ejecutor`, la selección de las 2^n membranas de asignación se
+    reparte entre sus hilos o procesos.
     """
-    sistema = generar_sistema_por_estructura(expr)
-    copia   = deepcopy(sistema)
-    for _ in range(max_pasos):
-        simular_lapso(copia)
-        if "sat" in copia.skin[copia.output_membrane].resources:
-            return True
-    # Si no se decide tras max_pasos, lo damos por insat.
-    return False
+    return _resolver(expr, max_pasos, ejecutor, por_division)[0]
+
+def resolver_con_testigo(
+    expr: ExpresionBooleana,
+    por_division: bool = False,
+    libres: int = 10,
+    compartir: bool = True,
+    ejecutor: Optional[Executor] = None
+) -> Optional[Dict[str, bool]]:
+    """
+    Resuelve expr y devuelve una asignación que la satisface (el testigo),
+    o None si es insatisfacible. Las primeras n - `libres` variables se
+    enumeran fuera del P-sistema y, para cada prefijo, se simula un
+    sistema con las 2^libres asignaciones restantes (generadas de
+    antemano o por división), que se detiene en cuanto una membrana envía
+    SAT; las membranas que ya dieron su veredicto dejan de evaluarse. El
+    trabajo hasta la respuesta crece con la posición del primer testigo,
+    no con 2^n.
+    """
+    node_children, node_type, node_var, _, root_id = _arbol_nodos(expr)
+    profundidad = _profundidad(node_type, node_children)[root_id]
+    variables = sorted(set(node_var.values()))
+    libres = max(0, min(libres, len(variables)))
+    fijas = variables[:len(variables) - libres]
+    max_pasos = (libres + profundidad + 1) if por_division else (profundidad + 2)
+    generar = generar_sistema_por_division if por_division else generar_sistema_por_estructura
+
+    for bits in itertools.product([False, True], repeat=len(fijas)):
+        sistema = generar(expr, compartir, prefijo=dict(zip(fijas, bits)))
+        resultado = simular(
+            sistema, max_pasos, parada=lambda salida: "SAT" in salida,
+            ejecutor=ejecutor, rng_por_membrana=ejecutor is not None,
+            retirar=_con_veredicto
+        )
+        if resultado.motivo == "predicado":
+            for mem in sistema.skin.values():
+                if VEREDICTO_T in mem.resources:
+                    return asignacion_de(mem.resources)
+    return None
+
+# ----------------------------------------------------------------------
+# 5. Entrada DIMACS y resolución por lotes
+# ----------------------------------------------------------------------
+
+def iterar_clausulas_dimacs(ruta: str) -> Iterator[List[str]]:
+    """
+    Lee un fichero DIMACS CNF (".gz" se descomprime) línea a línea y va
+    devolviendo cada cláusula como lista de literales en el formato de
+    obtener_clausulas: la variable k es "x<k>" y su negación "~x<k>".
+    Las cláusulas pueden ocupar varias líneas; se ignoran comentarios
+    ("c"), la cabecera ("p cnf") y lo que siga a una línea "%".
+    """
+    abrir = gzip.open if str(ruta).endswith(".gz") else open
+    clausula: List[str] = []
+    with abrir(ruta, "rt") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea or linea[0] in "cp":
+                continue
+            if linea[0] == "%":
+                break
+            for token in linea.split():
+                k = int(token)
+                if k == 0:
+                    yield clausula
+                    clausula = []
+                else:
+                    clausula.append(f"x{k}" if k > 0 else f"~x{-k}")
+    if clausula:
+        yield clausula
+
+def leer_dimacs(ruta: str) -> List[List[str]]:
+    """Todas las cláusulas de un fichero DIMACS CNF (ver iterar_clausulas_dimacs)."""
+    return list(iterar_clausulas_dimacs(ruta))
+
+@dataclass
+class ResumenSAT:
+    """
+    Resultado de una instancia de resolver_satisfaccion_lote:
+      - ruta, variables, clausulas: la instancia.
+      - satisfacible: veredicto del P-sistema.
+      - pasos: lapsos simulados.
+      - segundos_lectura, segundos_construccion, segundos_simulacion.
+    """
+    ruta: str
+    variables: int
+    clausulas: int
+    satisfacible: bool
+    pasos: int
+    segundos_lectura: float
+    segundos_construccion: float
+    segundos_simulacion: float
+
+def _resolver_dimacs(ruta: str, max_pasos: Optional[int], por_division: bool) -> ResumenSAT:
+    inicio = time.perf_counter()
+    clausulas = leer_dimacs(ruta)
+    variables = len({l.lstrip("~") for c in clausulas for l in c})
+    leido = time.perf_counter()
+    if not clausulas or not all(clausulas):
+        # Sin cláusulas: satisfacible; con una cláusula vacía: insatisfacible
+        satisfacible, pasos, t_cons, t_sim = not clausulas, 0, 0.0, 0.0
+    else:
+        expr = expresion_desde_clausulas(clausulas)
+        satisfacible, pasos, t_cons, t_sim = _resolver(expr, max_pasos, None, por_division)
+    return ResumenSAT(
+        ruta=ruta,
+        variables=variables,
+        clausulas=len(clausulas),
+        satisfacible=satisfacible,
+        pasos=pasos,
+        segundos_lectura=leido - inicio,
+        segundos_construccion=t_cons,
+        segundos_simulacion=t_sim,
+    )
+
+def resolver_satisfaccion_lote(
+    rutas: Iterable[str],
+    workers: Optional[int] = None,
+    por_division: bool = True,
+    max_pasos: Optional[int] = None
+) -> List[ResumenSAT]:
+    """
+    Resuelve varias instancias DIMACS con el P-sistema, una por tarea en
+    un ProcessPoolExecutor de `workers` procesos (por defecto
+    os.cpu_count(); 1 = en este proceso). Por defecto usa el generador
+    por división, cuyo coste de construcción es lineal. Devuelve un
+    ResumenSAT por instancia, en el orden de `rutas`.
+    """
+    rutas = [os.fspath(r) for r in rutas]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(rutas) <= 1:
+        return [_resolver_dimacs(r, max_pasos, por_division) for r in rutas]
+    with ProcessPoolExecutor(max_workers=min(workers, len(rutas))) as pool:
+        return list(pool.map(
+            _resolver_dimacs, rutas, [max_pasos] * len(rutas), [por_division] * len(rutas)
+        ))
 
 # ----------------------------------------------------------------------
 # Ejecución directa
@@ -1,10 +1,20 @@
 from __future__ import annotations
-import uuid
+import copy
+import dataclasses
 from copy import deepcopy
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, DefaultDict, Set
+from concurrent.futures import Executor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, DefaultDict, Set, Union
 import random
 import collections
+import sys
+import os
+import csv
+import gzip
+import itertools
+import functools
+import operator
+import time
 import pandas as pd
 from enum import Enum
 from collections import defaultdict
@@ -13,13 +23,17 @@ import re
 
 Multiset = Dict[str, int]
 
+# Production y Regla usan __slots__ cuando el intérprete lo permite: copiar o
+# serializar dataclasses frozen con slots no funciona antes de Python 3.11.
+_SLOTS = {"slots": True} if sys.version_info >= (3, 11) else {}
+
 
 class Direction(Enum):
     NORMAL = "normal"   # producción dentro de la misma membrana
     IN     = "in"       # producción dirigida a una membrana hija concreta
     OUT    = "out"      # producción dirigida a la membrana padre
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class Production:
     symbol: str
     count: int = 1
@@ -35,12 +49,26 @@ class LapsoResult:
       - producciones: multiconjuntos producidos para cada membrana este lapso.
       - created: lista de tuplas (id_padre, id_nueva) de membranas creadas.
       - dissolved: lista de IDs de membranas disueltas.
+      - pesos: copias que representaba cada membrana evaluada, si se
+        simuló un sistema comprimido (ver ponderado.SistemaPonderado);
+        None en otro caso. Lo anterior se refiere a una sola copia.
+      - maximales: número de multiconjuntos maximales entre los que eligió
+        cada membrana evaluada (1 si no tenía reglas aplicables; None si
+        el recuento agotó el presupuesto), si se pidió con contar=True (ver
+        contar_maximales); None en otro caso.
+      - agotados: membranas cuya enumeración de maximales agotó el
+        presupuesto y recurrió a la selección voraz, con el límite agotado
+        ({id: "nodos" | "segundos" | "memoria" | "nodos_lapso" |
+        "segundos_lapso"}), si se pasó un Presupuesto; None en otro caso.
     """
     seleccionados: Dict[str, List[Tuple[Regla, int]]]
     consumos: Dict[str, Multiset]
     producciones: Dict[str, Multiset]
     created: List[Tuple[str, str]]
     dissolved: List[str]
+    pesos: Optional[Dict[str, int]] = None
+    maximales: Optional[Dict[str, Optional[int]]] = None
+    agotados: Optional[Dict[str, str]] = None
 
 
 # ------------------------ UTILIDADES PARA MULTICONJUNTOS ----------------------
@@ -64,6 +92,29 @@ def sub_multiset(ms: Multiset, rest: Multiset) -> Multiset:
 def multiset_times(ms: Multiset, times: int) -> Multiset:
     return {sym: cnt * times for sym, cnt in ms.items()}
 
+def _normalizar_producciones(regla: Regla) -> List[Production]:
+    """
+    Devuelve regla.productions como lista de Production. Las reglas legacy
+    con un dict símbolo->cantidad se interpretan como producciones OUT.
+    """
+    prod_defs = regla.productions
+    if isinstance(prod_defs, dict):
+        return [
+            Production(symbol=sym, count=cuenta, direction=Direction.OUT)
+            for sym, cuenta in prod_defs.items()
+        ]
+    return prod_defs
+
+def _normalizar_creacion(cm) -> Tuple[str, Multiset]:
+    """
+    Devuelve (etiqueta_prototipo, recursos_iniciales) de una entrada de
+    create_membranes. Sólo se usan los dos primeros elementos de la tupla;
+    una etiqueta suelta equivale a (etiqueta, {}).
+    """
+    if isinstance(cm, str):
+        return cm, {}
+    return cm[0], cm[1]
+
 def max_applications(resources: Multiset, rule: Regla) -> int:
     min_times = float('inf')
     for sym, needed in rule.left.items():
@@ -74,7 +125,7 @@ def max_applications(resources: Multiset, rule: Regla) -> int:
 
 # --------------------------------- CLASES BÁSICAS -----------------------------
 
-@dataclass
+@dataclass(frozen=True, **_SLOTS)
 class Regla:
     """
     Regla de evolución o estructural de un Sistema P, con producciones tipadas.
@@ -84,6 +135,8 @@ class Regla:
     - create_membranes: lista de (etiqueta_prototipo, recursos_iniciales).
     - dissolve_membranes: etiquetas a disolver (no usado aquí).
     - division: opcional (v, w) para regla de división.
+    Las reglas son inmutables y se comparten por referencia entre membranas
+    (ver TablaReglas): no deben modificarse sus multiconjuntos in situ.
     """
     left: Multiset
     productions: List[Production] = field(default_factory=list)
@@ -95,12 +148,15 @@ class Regla:
     def total_consumption(self) -> int:
         return sum(self.left.values())
 
+    def __hash__(self) -> int:
+        return hash(huella_regla(self))
+
     def __repr__(self) -> str:
         prods = ", ".join(
             f"{p.count}×{p.symbol}"
             + (f"_in({p.target})" if p.direction == Direction.IN else "")
             + (f"_out"       if p.direction == Direction.OUT else "")
-            for p in self.productions
+            for p in _normalizar_producciones(self)
         )
         return (
             f"Regla(left={self.left}, prods=[{prods}], "
@@ -108,13 +164,31 @@ class Regla:
             f"dissolve={self.dissolve_membranes}, div={self.division})"
         )
 
+class TablaReglas(tuple):
+    """
+    Tupla inmutable de reglas que se comparte por referencia entre todas las
+    membranas de una misma etiqueta o linaje (divisiones, creaciones desde
+    un prototipo). Guarda además su compilación (ver reglas_compiladas), así
+    que la memoria y el trabajo de compilar reglas crecen con el número de
+    tablas distintas, no con el de membranas.
+    """
+
+    def __repr__(self) -> str:
+        return f"TablaReglas({list(self)!r})"
+
+
+def compartir_reglas(reglas) -> TablaReglas:
+    """Devuelve `reglas` como TablaReglas (la misma si ya lo es)."""
+    return reglas if isinstance(reglas, TablaReglas) else TablaReglas(reglas)
+
+
 @dataclass
 class Membrana:
     """
     Representa una membrana de un Sistema P.
     - id_mem: identificador único.
     - resources: multiconjunto de objetos.
-    - reglas: lista de reglas asociadas.
+    - reglas: lista de reglas asociadas, o una TablaReglas compartida.
     - children: IDs de membranas hijas.
     - parent: ID de membrana padre.
     """
@@ -123,10 +197,19 @@ class Membrana:
     reglas: List[Regla] = field(default_factory=list)
     children: List[str] = field(default_factory=list)
     parent: Optional[str] = None
+    # Caché de reglas_compiladas(); se invalida si cambia la lista de reglas
+    _compiladas: Optional[object] = field(default=None, init=False, repr=False, compare=False)
 
     def add_regla(self, regla: Regla) -> None:
+        if isinstance(self.reglas, TablaReglas):
+            self.reglas = list(self.reglas)   # copia al escribir: la tabla es compartida
         self.reglas.append(regla)
 
+    def remove_regla(self, idx: int) -> Regla:
+        if isinstance(self.reglas, TablaReglas):
+            self.reglas = list(self.reglas)
+        return self.reglas.pop(idx)
+
     def __repr__(self) -> str:
         return (
             f"Membrana(id={self.id_mem!r}, resources={self.resources}, "
@@ -140,10 +223,20 @@ class SistemaP:
     - skin: todas las membranas activas.
     - prototypes: definición de membranas (por etiqueta) para creación.
     - output_membrane: ID de salida.
+    Las membranas de `skin` pueden estar compartidas con instantáneas
+    (ver snapshot); quien modifique una membrana del sistema debe obtenerla
+    con _editable().
     """
     skin: Dict[str, Membrana] = field(default_factory=dict)
     prototypes: Dict[str, Membrana] = field(default_factory=dict)
     output_membrane: Optional[str] = None
+    # IDs cuyo objeto Membrana puede estar compartido con otra instantánea
+    _compartidas: Set[str] = field(default_factory=set, init=False, repr=False, compare=False)
+    # Contador para IDs deterministas de membranas nuevas (ver nuevo_id)
+    _contador: int = field(default=0, init=False, repr=False, compare=False)
+    # IDs de las raíces en orden, mantenidos al añadir y eliminar membranas
+    # (None hasta la primera llamada a top_membranes)
+    _raices: Optional[Dict[str, None]] = field(default=None, init=False, repr=False, compare=False)
 
     def register_prototype(self, membrana: Membrana) -> None:
         """
@@ -152,55 +245,1041 @@ class SistemaP:
         """
         self.prototypes[membrana.id_mem] = membrana
 
+    def _anotar_raiz(self, mem_id: str, parent_id: Optional[str]) -> None:
+        if self._raices is None:
+            return
+        if parent_id is None or parent_id not in self.skin:
+            self._raices[mem_id] = None
+        else:
+            self._raices.pop(mem_id, None)
+
     def add_membrane(self, membrana: Membrana, parent_id: Optional[str] = None) -> None:
         membrana.parent = parent_id
         self.skin[membrana.id_mem] = membrana
+        self._compartidas.discard(membrana.id_mem)
+        self._anotar_raiz(membrana.id_mem, parent_id)
         if parent_id:
-            self.skin[parent_id].children.append(membrana.id_mem)
+            self._editable(parent_id).children.append(membrana.id_mem)
+
+    def add_membranes(self, membranas: List[Tuple[Membrana, Optional[str]]]) -> None:
+        """
+        Versión por lotes de add_membrane para parejas (membrana, id_padre):
+        cada padre amplía su lista de hijas una sola vez.
+        """
+        nuevas_por_padre: Dict[str, List[str]] = {}
+        for membrana, parent_id in membranas:
+            membrana.parent = parent_id
+            self.skin[membrana.id_mem] = membrana
+            self._compartidas.discard(membrana.id_mem)
+            self._anotar_raiz(membrana.id_mem, parent_id)
+            if parent_id:
+                nuevas_por_padre.setdefault(parent_id, []).append(membrana.id_mem)
+        for parent_id, ids in nuevas_por_padre.items():
+            self._editable(parent_id).children.extend(ids)
+
+    def remove_membranes(self, ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Elimina por lotes las membranas `ids` (las inexistentes se ignoran).
+        Las hijas de cada una pasan a su ancestro superviviente más cercano,
+        o quedan como raíces si no lo hay. Cada padre afectado reconstruye su
+        lista de hijas una sola vez, en lugar de un list.remove por membrana.
+        Devuelve {id_eliminada: id_heredera (o None)}.
+        """
+        eliminar = [mid for mid in dict.fromkeys(ids) if mid in self.skin]
+        conjunto = set(eliminar)
+
+        herederas: Dict[str, Optional[str]] = {}
+        for mid in eliminar:
+            p = self.skin[mid].parent
+            while p is not None and p in conjunto:
+                p = herederas[p] if p in herederas else self.skin[p].parent
+            herederas[mid] = p
+
+        movidas: Dict[Optional[str], List[str]] = {}
+        afectados: Dict[str, None] = {}
+        for mid in eliminar:
+            mem = self.skin[mid]
+            if mem.parent is not None and mem.parent not in conjunto and mem.parent in self.skin:
+                afectados[mem.parent] = None
+            destino = herederas[mid]
+            for hijo_id in mem.children:
+                if hijo_id not in conjunto and hijo_id in self.skin:
+                    movidas.setdefault(destino, []).append(hijo_id)
+                    if destino is not None:
+                        afectados[destino] = None
+
+        for pid in afectados:
+            padre = self._editable(pid)
+            padre.children = (
+                [c for c in padre.children if c not in conjunto] + movidas.get(pid, [])
+            )
+        for pid, hijos in movidas.items():
+            for hijo_id in hijos:
+                self._editable(hijo_id).parent = pid
+        for mid in eliminar:
+            del self.skin[mid]
+            self._compartidas.discard(mid)
+        if self._raices is not None:
+            for mid in eliminar:
+                self._raices.pop(mid, None)
+            self._raices.update(dict.fromkeys(movidas.get(None, [])))
+        return herederas
+
+    def nuevo_id(self, base: str) -> str:
+        """
+        ID determinista '<base>_<n>' para una membrana nueva, con un contador
+        propio del sistema (sin colisionar con IDs existentes).
+        """
+        while True:
+            self._contador += 1
+            candidato = f"{base}_{self._contador}"
+            if candidato not in self.skin:
+                return candidato
+
+    def top_membranes(self) -> List[Membrana]:
+        """
+        Membranas sin padre activo (raíces de la estructura). La primera
+        llamada recorre `skin`; después las raíces se mantienen en
+        add_membrane(s) y remove_membranes, así que el coste es el número
+        de raíces (las que pasan a serlo al eliminar a su padre van al final).
+        """
+        if self._raices is None:
+            self._raices = {
+                mid: None for mid, m in self.skin.items()
+                if m.parent is None or m.parent not in self.skin
+            }
+        return [
+            self.skin[mid] for mid in self._raices
+            if mid in self.skin and self.skin[mid].parent not in self.skin
+        ]
+
+    def snapshot(self) -> SistemaP:
+        """
+        Instantánea barata del sistema con compartición estructural: la
+        copia tiene su propio diccionario `skin`, pero comparte con el
+        original los objetos Membrana, sus multiconjuntos, listas de reglas
+        y prototipos. A partir de aquí, cualquiera de los dos sistemas copia
+        una membrana (copia superficial) sólo cuando la modifica, de modo
+        que un lapso cuesta memoria proporcional a lo que cambia.
+        Para modificar una membrana (recursos, reglas, hijas) hay que
+        obtenerla con _editable(), que hace esa copia.
+        """
+        copia = SistemaP(
+            skin=dict(self.skin),
+            prototypes=self.prototypes,
+            output_membrane=self.output_membrane,
+        )
+        self._compartidas = set(self.skin)
+        copia._compartidas = set(self.skin)
+        copia._contador = self._contador
+        if self._raices is not None:
+            copia._raices = dict(self._raices)
+        return copia
+
+    def fork(self) -> SistemaP:
+        """Igual que snapshot(); pensado para seguir simulando la copia."""
+        return self.snapshot()
+
+    def _editable(self, mem_id: str) -> Membrana:
+        """
+        Devuelve la membrana `mem_id` lista para modificarse: si puede estar
+        compartida con una instantánea, la sustituye antes por una copia
+        superficial propia, con su propia lista de hijas, su multiconjunto
+        y su lista de reglas (las TablaReglas ya se copian al escribir).
+        """
+        mem = self.skin[mem_id]
+        if mem_id in self._compartidas:
+            mem = copy.copy(mem)
+            mem.children = list(mem.children)
+            mem.resources = dict(mem.resources)
+            if not isinstance(mem.reglas, TablaReglas):
+                mem.reglas = list(mem.reglas)
+                if mem._compiladas is not None:
+                    # Mismo contenido: se conserva la compilación
+                    mem._compiladas = copy.copy(mem._compiladas)
+                    mem._compiladas.origen = mem.reglas
+            self.skin[mem_id] = mem
+            self._compartidas.discard(mem_id)
+        return mem
 
     def __repr__(self) -> str:
         return f"SistemaP(mem={list(self.skin.keys())}, output={self.output_membrane!r})"
 
 
+def huella_regla(regla: Regla) -> Tuple:
+    """
+    Clave canónica y hashable del contenido de una regla: dos reglas con la
+    misma huella se comportan igual en la simulación.
+    """
+    creaciones = []
+    for cm in regla.create_membranes:
+        etiqueta, iniciales = _normalizar_creacion(cm)
+        creaciones.append((etiqueta, tuple(sorted(dict(iniciales).items()))))
+    return (
+        tuple(sorted(regla.left.items())),
+        tuple(
+            (p.symbol, p.count, p.direction.value, p.target)
+            for p in _normalizar_producciones(regla)
+        ),
+        regla.priority,
+        tuple(creaciones),
+        tuple(regla.dissolve_membranes),
+        None if regla.division is None
+        else tuple(tuple(sorted(ms.items())) for ms in regla.division),
+    )
+
+def huella_reglas(reglas: List[Regla]) -> Tuple:
+    """Huella canónica de una lista ordenada de reglas (ver huella_regla)."""
+    return tuple(huella_regla(r) for r in reglas)
+
+
+# ---------------------- APLICABILIDAD VECTORIZADA POR MEMBRANA -----------------
+
+def reglas_compiladas(mem: Membrana):
+    """
+    Devuelve las reglas de `mem` compiladas (compilado.ReglasCompiladas):
+    matriz dispersa de lados izquierdos sobre los símbolos de sus reglas y
+    cubos de prioridad ordenados. Se calcula una vez y se guarda en la
+    membrana mientras mem.reglas sea la misma lista con la misma longitud
+    (o en la propia TablaReglas si es compartida); si se modifican reglas
+    in situ hay que asignar mem._compiladas = None.
+    """
+    from .compilado import ReglasCompiladas, TablaSimbolos
+
+    reglas = mem.reglas
+    compartida = isinstance(reglas, TablaReglas)
+    rc = reglas.__dict__.get("_compiladas") if compartida else mem._compiladas
+    if rc is None or rc.origen is not reglas or len(rc) != len(reglas):
+        tabla = TablaSimbolos()
+        for regla in reglas:
+            tabla.internar_regla(regla)
+        rc = ReglasCompiladas(reglas, tabla)
+        if compartida:
+            reglas._compiladas = rc   # una compilación por tabla compartida
+        else:
+            mem._compiladas = rc
+    return rc
+
+def max_applications_all(resources: Multiset, mem: Membrana):
+    """
+    Versión por lotes de max_applications: array con el número máximo de
+    aplicaciones de cada regla de mem.reglas sobre `resources`.
+    """
+    rc = reglas_compiladas(mem)
+    return rc.max_applications_all(rc.tabla.vector(resources, estricto=False))
+
+def reglas_top(mem: Membrana, resources: Optional[Multiset] = None) -> List[Regla]:
+    """
+    Reglas aplicables de mayor prioridad de `mem` sobre `resources`
+    (por defecto mem.resources), en el orden de mem.reglas.
+    """
+    rc = reglas_compiladas(mem)
+    recursos = mem.resources if resources is None else resources
+    top = rc.top(rc.max_applications_all(rc.tabla.vector(recursos, estricto=False)))
+    return [rc.reglas[k] for k in top]
+
+
 # --------------------------- GENERACIÓN DE MAXIMALES --------------------------
 
+class CacheMaximales:
+    """
+    Caché LRU acotada de conjuntos de maximales, por número de entradas y por
+    memoria aproximada. La clave es la huella canónica de las reglas
+    (huella_reglas) más el multiconjunto congelado de los recursos que
+    aparecen en sus lados izquierdos, así que membranas distintas con reglas
+    y recursos equivalentes comparten entrada. Se guardan posiciones de
+    regla, no objetos Regla, de modo que cada acierto devuelve las reglas
+    de quien consulta.
+    Contadores: aciertos, fallos y desalojos (ver estadisticas()).
+    """
+
+    def __init__(self, max_entradas: int = 4096, max_bytes: Optional[int] = 64 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos: "collections.OrderedDict[Tuple, Tuple[Tuple, int]]" = collections.OrderedDict()
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    @staticmethod
+    def clave(reglas: List[Regla], recursos: Multiset) -> Tuple:
+        simbolos = {sym for r in reglas for sym in r.left}
+        congelados = frozenset(
+            (sym, recursos[sym]) for sym in simbolos if recursos.get(sym, 0) > 0
+        )
+        return huella_reglas(reglas), congelados
+
+    @staticmethod
+    def _tamano(clave: Tuple, posiciones: Tuple) -> int:
+        par = sys.getsizeof((0, 0))
+        return (
+            sys.getsizeof(clave[1]) + sys.getsizeof(posiciones)
+            + sum(sys.getsizeof(m) + par * len(m) for m in posiciones)
+        )
+
+    def obtener(self, reglas: List[Regla], recursos: Multiset, generar) -> List[List[Tuple[Regla, int]]]:
+        """
+        Devuelve los maximales de (reglas, recursos), llamando a
+        generar(reglas, recursos) sólo si no están en caché.
+        """
+        clave = self.clave(reglas, recursos)
+        entrada = self._datos.get(clave)
+        if entrada is not None:
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return [[(reglas[k], cnt) for k, cnt in m] for m in entrada[0]]
+
+        self.fallos += 1
+        maximales = generar(reglas, recursos)
+        indice = {id(r): k for k, r in enumerate(reglas)}
+        posiciones = tuple(tuple((indice[id(r)], cnt) for r, cnt in m) for m in maximales)
+        tamano = self._tamano(clave, posiciones)
+        if self.max_bytes is None or tamano <= self.max_bytes:
+            self._datos[clave] = (posiciones, tamano)
+            self.bytes += tamano
+            self._recortar()
+        return maximales
+
+    def _recortar(self) -> None:
+        while self._datos and (
+            len(self._datos) > self.max_entradas
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            _, (_, tamano) = self._datos.popitem(last=False)
+            self.bytes -= tamano
+            self.desalojos += 1
+
+    def limpiar(self) -> None:
+        """Vacía la caché sin reiniciar los contadores."""
+        self._datos.clear()
+        self.bytes = 0
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {
+            "entradas": len(self._datos),
+            "bytes": self.bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "desalojos": self.desalojos,
+        }
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def __repr__(self) -> str:
+        return (
+            f"CacheMaximales(entradas={len(self._datos)}/{self.max_entradas}, "
+            f"aciertos={self.aciertos}, fallos={self.fallos}, desalojos={self.desalojos})"
+        )
+
+
+class PresupuestoAgotado(Exception):
+    """Lanzada por Presupuesto.gastar/reservar; `motivo` es el límite agotado."""
+
+    def __init__(self, motivo: str):
+        super().__init__(motivo)
+        self.motivo = motivo
+
+
+@dataclass
+class Presupuesto:
+    """
+    Límites de la enumeración exhaustiva de maximales (modo "uniforme"),
+    None = sin límite:
+      - nodos, segundos, memoria: por membrana evaluada (nodos del
+        backtracking, tiempo de reloj y bytes aproximados de las listas de
+        maximales), contados desde iniciar_membrana().
+      - nodos_lapso, segundos_lapso: acumulados desde iniciar_lapso().
+    Cuando se agota uno, seleccionar_maximal elige la componente que estaba
+    enumerando (y las siguientes de la membrana) con la selección voraz,
+    que es aleatoria pero no uniforme, y se anota en `agotados`
+    {id de la membrana: límite}. simular_lapso llama a iniciar_lapso e
+    iniciar_membrana y copia `agotados` en LapsoResult.agotados.
+    """
+    nodos: Optional[int] = None
+    segundos: Optional[float] = None
+    memoria: Optional[int] = None
+    nodos_lapso: Optional[int] = None
+    segundos_lapso: Optional[float] = None
+    agotados: Dict[str, str] = field(default_factory=dict, init=False)
+
+    TRAMO = 1024   # nodos entre dos comprobaciones como máximo
+
+    def __post_init__(self):
+        self.iniciar_lapso()
+
+    def iniciar_lapso(self) -> None:
+        """Reinicia los contadores del lapso y `agotados`."""
+        self.agotados = {}
+        self._nodos_lapso = 0
+        # Plazo absoluto (time.time()), comparable entre procesos
+        self._fin_lapso = (
+            time.time() + self.segundos_lapso if self.segundos_lapso is not None else None
+        )
+        self.iniciar_membrana()
+
+    def iniciar_membrana(self, mem_id: Optional[str] = None) -> None:
+        """Reinicia los contadores por membrana; `mem_id` se usa en `agotados`."""
+        self.membrana = mem_id
+        self._nodos = 0
+        self._bytes = 0
+        self._inicio = time.perf_counter()
+
+    def _agotar(self, motivo: str) -> None:
+        self.agotados.setdefault(self.membrana, motivo)
+        raise PresupuestoAgotado(motivo)
+
+    def gastar(self, nodos: int = 0) -> int:
+        """
+        Anota `nodos` visitados y comprueba todos los límites.
+        Devuelve cuántos nodos más se pueden visitar antes de volver a
+        llamar (al menos 1); lanza PresupuestoAgotado si se superó alguno.
+        """
+        self._nodos += nodos
+        self._nodos_lapso += nodos
+        ahora = time.perf_counter()
+        if self.nodos_lapso is not None and self._nodos_lapso > self.nodos_lapso:
+            self._agotar("nodos_lapso")
+        if self._fin_lapso is not None and time.time() > self._fin_lapso:
+            self._agotar("segundos_lapso")
+        if self.nodos is not None and self._nodos > self.nodos:
+            self._agotar("nodos")
+        if self.segundos is not None and ahora - self._inicio > self.segundos:
+            self._agotar("segundos")
+        if self.memoria is not None and self._bytes > self.memoria:
+            self._agotar("memoria")
+        tramo = self.TRAMO
+        if self.nodos is not None:
+            tramo = min(tramo, self.nodos - self._nodos)
+        if self.nodos_lapso is not None:
+            tramo = min(tramo, self.nodos_lapso - self._nodos_lapso)
+        return max(tramo, 1)
+
+    def repartir(self, partes: int) -> List["Presupuesto"]:
+        """
+        Copias para `partes` lotes que gastan el mismo lapso por separado
+        (p. ej. en otros procesos): comparten el plazo absoluto del lapso y
+        se reparten los nodos del lapso que quedan. Los límites por
+        membrana se copian tal cual.
+        """
+        copias = []
+        for i in range(partes):
+            copia = dataclasses.replace(self)
+            if self.nodos_lapso is not None:
+                restantes = max(self.nodos_lapso - self._nodos_lapso, 0)
+                copia.nodos_lapso = restantes // partes + (1 if i < restantes % partes else 0)
+            copia._fin_lapso = self._fin_lapso
+            copias.append(copia)
+        return copias
+
+    def reservar(self, tamano: int) -> None:
+        """Anota `tamano` bytes de maximales y comprueba el límite de memoria."""
+        self._bytes += tamano
+        if self.memoria is not None and self._bytes > self.memoria:
+            self._agotar("memoria")
+
+
+def _tamano_maximal(maximal: List[Tuple[Regla, int]]) -> int:
+    """Bytes aproximados de un maximal en una lista de maximales."""
+    return sys.getsizeof(maximal) + sys.getsizeof((None, 0)) * len(maximal)
+
+
+def componentes_reglas(reglas: List[Regla]) -> List[List[int]]:
+    """
+    Componentes conexas del grafo de conflictos de `reglas` (dos reglas
+    están unidas si comparten un símbolo del lado izquierdo), como listas
+    de posiciones ordenadas por su primera regla. Los maximales de reglas
+    que no comparten objetos son el producto cartesiano de los maximales
+    de cada componente.
+    """
+    padre = list(range(len(reglas)))
+
+    def raiz(i: int) -> int:
+        while padre[i] != i:
+            padre[i] = padre[padre[i]]
+            i = padre[i]
+        return i
+
+    primera: Dict[str, int] = {}
+    for idx, regla in enumerate(reglas):
+        for sym, cnt in regla.left.items():
+            if cnt <= 0:
+                continue
+            a, b = raiz(idx), raiz(primera.setdefault(sym, idx))
+            if a != b:
+                padre[max(a, b)] = min(a, b)
+    grupos: Dict[int, List[int]] = {}
+    for idx in range(len(reglas)):
+        grupos.setdefault(raiz(idx), []).append(idx)
+    return list(grupos.values())
+
+
+def _en_orden(
+    reglas: List[Regla],
+    partes: List[List[Tuple[Regla, int]]]
+) -> List[Tuple[Regla, int]]:
+    """Une las elecciones de varias componentes en el orden de `reglas`."""
+    orden = {id(regla): k for k, regla in enumerate(reglas)}
+    return sorted(itertools.chain.from_iterable(partes), key=lambda par: orden[id(par[0])])
+
+
 def generar_maximales(
     reglas: List[Regla],
-    recursos: Multiset
+    recursos: Multiset,
+    cache: Optional[CacheMaximales] = None,
+    presupuesto: Optional[Presupuesto] = None
 ) -> List[List[Tuple[Regla, int]]]:
-    maximales: List[List[Tuple[Regla, int]]] = []
-
-    def backtrack(start_idx: int, current_resources: Multiset, seleccionado: List[Tuple[Regla, int]]):
-        added = False
-        for idx in range(start_idx, len(reglas)):
-            regla = reglas[idx]
-            max_v = max_applications(current_resources, regla)
-            if max_v <= 0:
-                continue
-            added = True
-            for count in range(1, max_v + 1):
-                consume = multiset_times(regla.left, count)
-                new_resources = sub_multiset(current_resources, consume)
-                seleccionado.append((regla, count))
-                backtrack(idx + 1, new_resources, seleccionado)
-                seleccionado.pop()
-        if not added:
-            maximales.append(list(seleccionado))
-
-    backtrack(0, recursos, [])
+    """
+    Enumera los multiconjuntos de aplicaciones de `reglas` sobre `recursos`.
+    Cada componente independiente de las reglas (ver componentes_reglas)
+    se enumera por separado y los resultados se combinan. Con `cache` se
+    consulta antes una CacheMaximales, por componente. Con `presupuesto`
+    se cuentan los nodos, el tiempo y la memoria de la enumeración (los
+    aciertos de caché no gastan nada) y se lanza PresupuestoAgotado al
+    superar un límite.
+    """
+    componentes = componentes_reglas(reglas)
+    if len(componentes) > 1:
+        partes = [
+            generar_maximales([reglas[i] for i in comp], recursos, cache, presupuesto)
+            for comp in componentes
+        ]
+        if presupuesto is not None:
+            # El producto se materializa entero: se reserva antes de crearlo
+            largo = sum(max((len(m) for m in p), default=0) for p in partes)
+            presupuesto.reservar(
+                functools.reduce(operator.mul, (len(p) for p in partes), 1) * _tamano_maximal([None] * largo)
+            )
+        return [_en_orden(reglas, list(combinacion)) for combinacion in itertools.product(*partes)]
+    if cache is not None:
+        if presupuesto is None:
+            return cache.obtener(reglas, recursos, generar_maximales)
+        return cache.obtener(
+            reglas, recursos, lambda r, rec: generar_maximales(r, rec, None, presupuesto)
+        )
+    if presupuesto is None:
+        return list(iterar_maximales(reglas, recursos))
+    maximales = []
+    for maximal in iterar_maximales(reglas, recursos, presupuesto):
+        presupuesto.reservar(_tamano_maximal(maximal))
+        maximales.append(maximal)
     return maximales
 
 
+class _Backtracking:
+    """
+    Estado compartido por iterar_maximales y contar_maximales: las reglas
+    recorridas por componentes (ver componentes_reglas), sus lados
+    izquierdos sobre un vector de enteros `disponibles` que se actualiza y
+    deshace in situ, y en qué posición se "cierra" cada regla: la última
+    de una regla con la que comparte símbolos. A partir de ahí ya nada
+    puede consumir sus objetos, así que si sigue siendo aplicable la rama
+    no lleva a ningún maximal.
+    """
+
+    def __init__(self, reglas: List[Regla], recursos: Multiset):
+        self.orden = [i for comp in componentes_reglas(reglas) for i in comp]
+        self.n = len(self.orden)
+        indices: Dict[str, int] = {}
+        self.izquierdas: List[List[Tuple[int, int]]] = [
+            [(indices.setdefault(sym, len(indices)), cnt) for sym, cnt in reglas[i].left.items() if cnt > 0]
+            for i in self.orden
+        ]
+        self.disponibles = [recursos.get(sym, 0) for sym in indices]
+
+        # cierran[k]: reglas que dejan de poder bloquearse tras fijar la k-ésima
+        ultima: Dict[int, int] = {}
+        for k, izquierda in enumerate(self.izquierdas):
+            for sym, _ in izquierda:
+                ultima[sym] = k
+        self.cierre = [
+            max((ultima[sym] for sym, _ in izquierda), default=-1)
+            for izquierda in self.izquierdas
+        ]
+        self.cierran: List[List[int]] = [[] for _ in range(self.n)]
+        for k, c in enumerate(self.cierre):
+            if c >= 0:
+                self.cierran[c].append(k)
+        self.posicion = [0] * len(reglas)
+        for k, i in enumerate(self.orden):
+            self.posicion[i] = k
+
+    def maximo(self, k: int) -> int:
+        izquierda = self.izquierdas[k]
+        if not izquierda:
+            return 0
+        disponibles = self.disponibles
+        return min(disponibles[sym] // cnt for sym, cnt in izquierda)
+
+    def aplicar(self, k: int, veces: int) -> None:
+        disponibles = self.disponibles
+        for sym, cnt in self.izquierdas[k]:
+            disponibles[sym] -= cnt * veces
+
+    def cerradas(self, k: int) -> bool:
+        """True si las reglas que se cierran en k ya no son aplicables."""
+        return all(self.maximo(j) == 0 for j in self.cierran[k])
+
+
+def iterar_maximales(
+    reglas: List[Regla],
+    recursos: Multiset,
+    presupuesto: Optional[Presupuesto] = None
+) -> Iterator[List[Tuple[Regla, int]]]:
+    """
+    Genera de forma perezosa los multiconjuntos maximales de aplicaciones
+    de `reglas` sobre `recursos`, cada uno una sola vez y como lista de
+    (Regla, veces) en el orden de `reglas`; se puede dejar de iterar tras
+    los primeros K. Si ninguna regla es aplicable genera un único maximal
+    vacío.
+
+    Backtracking sobre las veces de cada regla, de mayor a menor, con los
+    recursos actualizados y deshechos in situ (ver _Backtracking). Una rama
+    en la que una regla cerrada sigue siendo aplicable se poda, junto con
+    las que aplican menos veces la regla actual (dejan aún más objetos),
+    así que toda hoja alcanzada es maximal.
+
+    Con `presupuesto`, cada paso del recorrido cuenta como un nodo (ver
+    Presupuesto.gastar) y la generación se corta con PresupuestoAgotado.
+    """
+    bt = _Backtracking(reglas, recursos)
+    n = bt.n
+    # Nodos que faltan hasta la próxima comprobación del presupuesto (0 = sin él)
+    tramo = pendientes = presupuesto.gastar() if presupuesto is not None else 0
+    if n == 0:
+        yield []
+        return
+    veces = [0] * n
+    siguiente = [0] * n        # próximas veces a probar (+1) en cada nivel
+    k = 0
+    siguiente[0] = bt.maximo(0) + 1
+    while k >= 0:
+        if tramo:
+            pendientes -= 1
+            if not pendientes:
+                tramo = pendientes = presupuesto.gastar(tramo)
+        if veces[k]:
+            bt.aplicar(k, -veces[k])
+            veces[k] = 0
+        cnt = siguiente[k] - 1
+        if cnt < 0:
+            k -= 1
+            continue
+        siguiente[k] = cnt
+        bt.aplicar(k, cnt)
+        veces[k] = cnt
+        if not bt.cerradas(k):
+            # Con menos aplicaciones de la regla k quedarían aún más objetos
+            bt.aplicar(k, -cnt)
+            veces[k] = 0
+            k -= 1
+            continue
+        if k == n - 1:
+            yield [
+                (regla, veces[bt.posicion[i]])
+                for i, regla in enumerate(reglas) if veces[bt.posicion[i]] > 0
+            ]
+            continue
+        k += 1
+        siguiente[k] = bt.maximo(k) + 1
+
+
+def _contar_componente(
+    reglas: List[Regla],
+    recursos: Multiset,
+    presupuesto: Optional[Presupuesto] = None
+) -> int:
+    """
+    Número de maximales de `reglas` por programación dinámica: el recorrido
+    de iterar_maximales, memorizando cuántas hojas cuelgan de cada
+    (posición, recursos de los símbolos que aún importan). Importan los de
+    las reglas pendientes y los de las reglas ya fijadas pero sin cerrar.
+    Con `presupuesto`, cada estado nuevo cuenta como un nodo y su entrada
+    de la tabla como memoria.
+    """
+    bt = _Backtracking(reglas, recursos)
+    n = bt.n
+    relevantes: List[Tuple[int, ...]] = []
+    for k in range(n + 1):
+        simbolos = {sym for j in range(k, n) for sym, _ in bt.izquierdas[j]}
+        simbolos.update(sym for j in range(k) if bt.cierre[j] >= k for sym, _ in bt.izquierdas[j])
+        relevantes.append(tuple(sorted(simbolos)))
+    memo: Dict[Tuple, int] = {}
+    tramo = pendientes = presupuesto.gastar() if presupuesto is not None else 0
+
+    def contar(k: int) -> int:
+        nonlocal tramo, pendientes
+        if k == n:
+            return 1
+        disponibles = bt.disponibles
+        clave = (k, tuple(disponibles[sym] for sym in relevantes[k]))
+        total = memo.get(clave)
+        if total is not None:
+            return total
+        if tramo:
+            presupuesto.reservar(sys.getsizeof(clave[1]) + 64)
+            pendientes -= 1
+            if not pendientes:
+                tramo = pendientes = presupuesto.gastar(tramo)
+        total = 0
+        for cnt in range(bt.maximo(k), -1, -1):
+            bt.aplicar(k, cnt)
+            cerradas = bt.cerradas(k)
+            if cerradas:
+                total += 1 if k == n - 1 else contar(k + 1)
+            bt.aplicar(k, -cnt)
+            if not cerradas:
+                break
+        memo[clave] = total
+        return total
+
+    return contar(0)
+
+
+def _binomial(n: int, k: int) -> int:
+    """C(n, k) exacto (math.comb no existe antes de Python 3.8)."""
+    k = min(k, n - k)
+    if k < 0:
+        return 0
+    total = 1
+    for i in range(1, k + 1):
+        total = total * (n - k + i) // i
+    return total
+
+
+def contar_maximales(
+    reglas: List[Regla],
+    recursos: Multiset,
+    presupuesto: Optional[Presupuesto] = None
+) -> int:
+    """
+    Número de multiconjuntos maximales de aplicaciones de `reglas` sobre
+    `recursos` (1 si ninguna es aplicable: el maximal vacío), sin
+    generarlos. Es el producto del de cada componente independiente (ver
+    componentes_reglas); en las no cooperativas cuyas k reglas compiten por
+    m aplicaciones es C(m + k - 1, k - 1), y en las demás se cuenta con
+    _contar_componente. Sirve para números que no cabrían en una lista.
+    Con `presupuesto`, la programación dinámica gasta nodos, tiempo y
+    memoria como la enumeración y se corta con PresupuestoAgotado.
+    """
+    total = 1
+    for comp in componentes_reglas(reglas):
+        sub = [reglas[i] for i in comp]
+        grupos = _grupos_no_cooperativos(sub)
+        if grupos is None:
+            total *= _contar_componente(sub, recursos, presupuesto)
+            continue
+        for sym, (necesario, posiciones) in grupos.items():
+            m = recursos.get(sym, 0) // necesario
+            if m > 0:
+                total *= _binomial(m + len(posiciones) - 1, len(posiciones) - 1)
+    return total
+
+
+# ------------------------ SELECCIÓN DE UN ÚNICO MAXIMAL -----------------------
+
+MODOS_SELECCION = ("voraz", "uniforme")
+
+
+def es_maximal(
+    reglas: List[Regla],
+    recursos: Multiset,
+    seleccion: List[Tuple[Regla, int]]
+) -> bool:
+    """
+    Indica si `seleccion` es aplicable sobre `recursos` y ninguna regla de
+    `reglas` puede aplicarse una vez más sobre los objetos sobrantes.
+    """
+    restantes = dict(recursos)
+    for regla, cnt in seleccion:
+        for sym, needed in regla.left.items():
+            restantes[sym] = restantes.get(sym, 0) - needed * cnt
+            if restantes[sym] < 0:
+                return False
+    return all(max_applications(restantes, r) == 0 for r in reglas)
+
+
+def _grupos_no_cooperativos(reglas: List[Regla]) -> Optional[Dict[str, Tuple[int, List[int]]]]:
+    """
+    Si todas las reglas son no cooperativas (un único tipo de objeto a la
+    izquierda) y las que compiten por un mismo símbolo piden la misma
+    cantidad, devuelve {símbolo: (cantidad, posiciones de sus reglas)}.
+    Las reglas con lado izquierdo vacío nunca son aplicables y se omiten.
+    En otro caso devuelve None.
+    """
+    grupos: Dict[str, Tuple[int, List[int]]] = {}
+    for idx, regla in enumerate(reglas):
+        izquierda = [(sym, cnt) for sym, cnt in regla.left.items() if cnt > 0]
+        if not izquierda:
+            continue
+        if len(izquierda) != 1:
+            return None
+        sym, cnt = izquierda[0]
+        necesario, posiciones = grupos.setdefault(sym, (cnt, []))
+        if necesario != cnt:
+            return None
+        posiciones.append(idx)
+    return grupos
+
+
+def _particion_uniforme(
+    reglas: List[Regla],
+    recursos: Multiset,
+    grupos: Dict[str, Tuple[int, List[int]]],
+    rng: random.Random
+) -> List[Tuple[Regla, int]]:
+    """
+    Maximal uniforme para reglas agrupadas con _grupos_no_cooperativos.
+    Cada símbolo es independiente de los demás, y los maximales de las k
+    reglas que compiten por m aplicaciones son las composiciones débiles
+    de m en k partes: se elige una con k - 1 separadores al azar entre
+    m + k - 1 posiciones (estrellas y barras). Coste O(reglas), sea cual
+    sea la multiplicidad de los objetos.
+    """
+    veces = [0] * len(reglas)
+    for sym, (necesario, posiciones) in grupos.items():
+        m = recursos.get(sym, 0) // necesario
+        if m <= 0:
+            continue
+        huecos = m + len(posiciones) - 1
+        separadores = sorted(rng.sample(range(huecos), len(posiciones) - 1))
+        anterior = -1
+        for idx, sep in zip(posiciones, separadores + [huecos]):
+            veces[idx] = sep - anterior - 1
+            anterior = sep
+    return [(regla, cnt) for regla, cnt in zip(reglas, veces) if cnt > 0]
+
+
+def seleccionar_maximal(
+    reglas: List[Regla],
+    recursos: Multiset,
+    rng: Optional[random.Random] = None,
+    modo: str = "voraz",
+    cache: Optional[CacheMaximales] = None,
+    componentes: Optional[List[List[int]]] = None,
+    presupuesto: Optional[Presupuesto] = None
+) -> List[Tuple[Regla, int]]:
+    """
+    Devuelve un único multiconjunto maximal de aplicaciones de `reglas`
+    sobre `recursos`, como lista de parejas (Regla, veces) en el orden de
+    `reglas`. Modos disponibles:
+      - "voraz": mientras alguna regla sea aplicable, elige una regla
+        aplicable de forma uniforme y la aplica un número uniforme de veces
+        entre 1 y su máximo sobre los objetos sobrantes. Todo maximal tiene
+        probabilidad positiva, aunque no todos la misma. Coste aproximado
+        O(reglas × símbolos) por iteración, sin enumerar nada.
+      - "uniforme": uniforme sobre el conjunto de maximales. Requiere
+        enumerarlos, por lo que su coste es exponencial; `cache` permite
+        reutilizar enumeraciones previas (ver CacheMaximales). Se elige un
+        maximal uniforme por cada componente de `componentes` (posiciones
+        de reglas que no comparten objetos con las demás; por defecto
+        componentes_reglas), así que el coste es la suma del de cada una y
+        no su producto. En las componentes no cooperativas cuyas reglas
+        piden la misma cantidad del símbolo, el maximal se elige sin
+        enumerar, como una partición aleatoria (ver _particion_uniforme).
+        Si la enumeración de una componente agota `presupuesto`, esa
+        componente se elige con "voraz" (ver Presupuesto).
+    """
+    if rng is None:
+        rng = random.Random()
+    if modo == "uniforme":
+        if componentes is None:
+            componentes = componentes_reglas(reglas)
+        partes: List[List[Tuple[Regla, int]]] = []
+        for comp in componentes:
+            sub = [reglas[i] for i in comp]
+            grupos = _grupos_no_cooperativos(sub)
+            if grupos is not None:
+                partes.append(_particion_uniforme(sub, recursos, grupos, rng))
+                continue
+            try:
+                candidatos = generar_maximales(sub, recursos, cache, presupuesto)
+            except PresupuestoAgotado:
+                partes.append(seleccionar_maximal(sub, recursos, rng, "voraz"))
+                continue
+            if candidatos:
+                partes.append(rng.choice(candidatos))
+        return _en_orden(reglas, partes)
+    if modo != "voraz":
+        raise ValueError(f"Modo de selección desconocido: {modo!r}")
+
+    restantes = dict(recursos)
+    veces = [0] * len(reglas)
+    while True:
+        aplicables: List[Tuple[int, int]] = []
+        for idx, regla in enumerate(reglas):
+            max_v = max_applications(restantes, regla)
+            if max_v > 0:
+                aplicables.append((idx, max_v))
+        if not aplicables:
+            break
+        idx, max_v = aplicables[rng.randrange(len(aplicables))]
+        cnt = rng.randint(1, max_v)
+        veces[idx] += cnt
+        for sym, needed in reglas[idx].left.items():
+            restantes[sym] -= needed * cnt
+    return [(regla, cnt) for regla, cnt in zip(reglas, veces) if cnt > 0]
+
+
+# --------------------- SELECCIÓN POR MEMBRANA EN PARALELO ----------------------
+
+def _elegir_lote(
+    lote: List[Tuple[str, Multiset, object]],
+    semilla_base: int,
+    modo: str,
+    presupuesto: Optional[Presupuesto] = None
+) -> Tuple[List[Tuple[str, List[Tuple[int, int]]]], Dict[str, str]]:
+    """
+    Selección de un lote de membranas (id, recursos, ReglasCompiladas) con
+    un generador por membrana. Devuelve posiciones de regla, no objetos
+    Regla, para no reenviar las reglas desde otro proceso, y los
+    agotamientos de `presupuesto` (la parte del lote, ver
+    Presupuesto.repartir).
+    """
+    from .compilado import PENDIENTE, preseleccionar_familias
+
+    vectores = [rc.tabla.vector(recursos, estricto=False) for _, recursos, rc in lote]
+    preseleccion = preseleccionar_familias(
+        [(rc, vector) for (_, _, rc), vector in zip(lote, vectores)], modo
+    )
+    resultado = []
+    for (mem_id, _, rc), vector, pre in zip(lote, vectores, preseleccion):
+        # Cada membrana tiene su propio generador: las filas ya resueltas
+        # por familias no necesitan reproducir sus llamadas
+        rng = None
+        if pre is None or pre[1] == PENDIENTE:
+            rng = random.Random(f"{semilla_base}/{mem_id}")
+        if presupuesto is not None:
+            presupuesto.iniciar_membrana(mem_id)
+        if pre is None:
+            veces = rc.seleccionar(vector, rng, modo, None, presupuesto)
+        else:
+            veces = rc.completar(*pre, vector, rng, modo, None, presupuesto)
+        if veces is not None:
+            resultado.append((mem_id, [(int(k), int(veces[k])) for k in veces.nonzero()[0]]))
+    return resultado, (presupuesto.agotados if presupuesto is not None else {})
+
+def seleccionar_por_lotes(
+    membranas: List[Membrana],
+    rng_seed: Optional[Union[int, str]] = None,
+    modo: str = "voraz",
+    ejecutor: Optional[Executor] = None,
+    tam_lote: Optional[int] = None,
+    presupuesto: Optional[Presupuesto] = None,
+    workers: Optional[int] = None
+) -> Dict[str, List[Tuple[Regla, int]]]:
+    """
+    Fase de selección de simular_lapso con un generador independiente por
+    membrana, sembrado con (rng_seed, id de la membrana), de modo que el
+    resultado no depende de cómo se repartan las membranas. Con `ejecutor`
+    (ThreadPoolExecutor o ProcessPoolExecutor) los lotes de `tam_lote`
+    membranas se evalúan en paralelo (por defecto, unos cuatro lotes por
+    cada uno de los `workers` del ejecutor, o por CPU si no se indica); a
+    los procesos sólo viajan recursos y reglas compiladas (una vez por
+    tabla compartida y lote).
+    Devuelve {id_membrana: [(Regla, veces), ...]} para las que eligen algo.
+
+    Sin ejecutor se gasta `presupuesto` directamente; con él, cada lote
+    gasta su parte (Presupuesto.repartir): el mismo plazo del lapso y una
+    fracción de los nodos que le quedan. Los agotamientos de todos los
+    lotes se reúnen en presupuesto.agotados. El lapso del presupuesto lo
+    inicia quien llama (simular_lapso).
+    """
+    semilla_base = rng_seed if rng_seed is not None else random.getrandbits(64)
+    compiladas = {mem.id_mem: reglas_compiladas(mem) for mem in membranas}
+    trabajo = [(mem.id_mem, mem.resources, compiladas[mem.id_mem]) for mem in membranas]
+
+    if ejecutor is None or len(trabajo) <= 1:
+        partes = [_elegir_lote(trabajo, semilla_base, modo, presupuesto)]
+    else:
+        n_workers = workers or os.cpu_count() or 1
+        tam_lote = tam_lote or max(1, -(-len(trabajo) // (4 * n_workers)))
+        inicios = range(0, len(trabajo), tam_lote)
+        cuotas = (
+            presupuesto.repartir(len(inicios)) if presupuesto is not None
+            else [None] * len(inicios)
+        )
+        futuros = [
+            ejecutor.submit(_elegir_lote, trabajo[i:i + tam_lote], semilla_base, modo, cuota)
+            for i, cuota in zip(inicios, cuotas)
+        ]
+        partes = [f.result() for f in futuros]
+
+    elecciones: Dict[str, List[Tuple[Regla, int]]] = {}
+    for parte, agotados in partes:
+        for mem_id, posiciones in parte:
+            reglas = compiladas[mem_id].reglas
+            elecciones[mem_id] = [(reglas[k], cnt) for k, cnt in posiciones]
+        if presupuesto is not None:
+            presupuesto.agotados.update(agotados)
+    return elecciones
+
+
 # --------------------------- SIMULACIÓN DE UN LAPSO ---------------------------
 
 def simular_lapso(
     sistema: SistemaP,
-    rng_seed: Optional[int] = None
+    rng_seed: Optional[Union[int, str]] = None,
+    modo_seleccion: str = "voraz",
+    cache: Optional[CacheMaximales] = None,
+    activas: Optional[Set[str]] = None,
+    ejecutor: Optional[Executor] = None,
+    rng_por_membrana: bool = False,
+    elecciones: Optional[Dict[str, List[Tuple[Regla, int]]]] = None,
+    pesos: Optional[Dict[str, int]] = None,
+    contar: bool = False,
+    presupuesto: Optional[Presupuesto] = None,
+    tam_lote: Optional[int] = None
 ) -> LapsoResult:
+    """
+    Simula un lapso en modo máximo paralelo. En cada membrana se elige un
+    multiconjunto maximal de las reglas aplicables de mayor prioridad con
+    seleccionar_maximal (ver allí la distribución de cada `modo_seleccion`).
+    `cache` se usa en los modos que enumeran maximales.
+
+    Si se pasa `activas`, sólo se evalúan esas membranas (las demás no
+    deben tener reglas aplicables) y el conjunto se actualiza in situ con
+    las que pueden tenerlas en el siguiente lapso: las que aplicaron
+    reglas, recibieron objetos o se crearon. Consumos y producciones del
+    LapsoResult cubren entonces sólo esas membranas. Saltarse membranas
+    inertes no altera el uso del generador aleatorio.
+
+    Con `rng_por_membrana`, cada membrana usa su propio generador derivado
+    de (rng_seed, id de la membrana) en lugar de uno compartido. Es lo que
+    permite repartir la selección entre los hilos o procesos de `ejecutor`
+    (ver seleccionar_por_lotes): con un ejecutor el resultado es idéntico
+    al de una ejecución en serie con rng_por_membrana=True y la misma
+    semilla. `cache` no se usa en ese modo; `tam_lote` fija cuántas
+    membranas evalúa cada tarea del ejecutor (ver seleccionar_por_lotes).
+
+    `elecciones` ({id: [(Regla, veces), ...]}) sustituye la fase de
+    selección: cada membrana aplica lo indicado (nada si no aparece).
+    Con `pesos` ({id: copias}, 1 si no aparece) cada membrana representa
+    varias copias idénticas: lo que envía a otras membranas (OUT, IN) se
+    multiplica por su peso, las hijas de una división heredan el peso y
+    `pesos` se actualiza in situ. Una membrana con peso mayor que 1 no
+    puede crear membranas (ver ponderado.SistemaPonderado).
+
+    Con `contar`, LapsoResult.maximales da para cada membrana evaluada el
+    número de maximales de sus reglas de mayor prioridad (contar_maximales),
+    sin enumerarlos. El recuento gasta `presupuesto` igual que la
+    enumeración (con sus propios límites por membrana); si lo agota, la
+    cuenta es None y la membrana queda en LapsoResult.agotados.
+
+    `presupuesto` acota la enumeración de maximales de cada membrana y del
+    lapso; al agotarse, la membrana elige con la selección voraz y queda
+    anotada en LapsoResult.agotados (ver Presupuesto). Sólo afecta a los
+    modos que enumeran.
+    """
     rng = random.Random(rng_seed)
+    if presupuesto is not None:
+        presupuesto.iniciar_lapso()
 
     # — Estructuras de recogida —
-    producciones: Dict[str, Dict[str,int]] = {mid: {} for mid in sistema.skin}
+    producciones: Dict[str, Dict[str,int]] = (
+        {mid: {} for mid in sistema.skin} if activas is None else {}
+    )
     consumos:     Dict[str, Dict[str,int]] = {}
     to_create:    List[Tuple[str, str, Dict[str,int], List[Regla]]] = []
     to_dissolve:  List[str] = []
@@ -208,75 +1287,117 @@ def simular_lapso(
     seleccionados: Dict[str, List[Tuple[Regla, int]]] = {}  # DICT, no lista
 
     # — Fase 1: Selección y Consumo —
-    for mem in list(sistema.skin.values()):
-        recursos_disp = deepcopy(mem.resources)
-        aplicables = [r for r in mem.reglas if max_applications(recursos_disp, r) > 0]
-
-        if aplicables:
-            max_prio  = max(r.priority for r in aplicables)
-            top_rules = [r for r in aplicables if r.priority == max_prio]
-            maxsets   = generar_maximales(top_rules, recursos_disp)
-
-            if maxsets:
-                rng.shuffle(maxsets)
-                elegido = maxsets[0]
-                seleccionados[mem.id_mem] = elegido
-
-                for regla, cnt in elegido:
-                    # — División estructural —
-                    if regla.division:
-                        v, w      = regla.division
-                        parent_id = mem.parent
-                        base      = sub_multiset(mem.resources, multiset_times(regla.left, cnt))
-
-                        to_dissolve.append(mem.id_mem)
-                        division_dissolved.add(mem.id_mem)
-
-                        for _ in range(cnt):
-                            id1 = f"{mem.id_mem}_{uuid.uuid4().hex[:8]}"
-                            id2 = f"{mem.id_mem}_{uuid.uuid4().hex[:8]}"
-                            r1  = add_multiset(base, v)
-                            r2  = add_multiset(base, w)
-                            child_rules = [deepcopy(r) for r in mem.reglas]
-                            to_create.append((parent_id, id1, r1, child_rules))
-                            to_create.append((parent_id, id2, r2, child_rules))
-                        continue
+    miembros = [
+        mem for mem in list(sistema.skin.values())
+        if activas is None or mem.id_mem in activas
+    ]
+    maximales: Optional[Dict[str, Optional[int]]] = None
+    if contar:
+        maximales = {}
+        for mem in miembros:
+            if presupuesto is not None:
+                presupuesto.iniciar_membrana(mem.id_mem)
+            try:
+                maximales[mem.id_mem] = contar_maximales(reglas_top(mem), mem.resources, presupuesto)
+            except PresupuestoAgotado:
+                maximales[mem.id_mem] = None
+    preseleccion: Dict[str, tuple] = {}
+    if elecciones is not None:
+        pass
+    elif ejecutor is not None or rng_por_membrana:
+        # Selección independiente por membrana, posiblemente en paralelo
+        elecciones = seleccionar_por_lotes(
+            miembros, rng_seed, modo_seleccion, ejecutor, tam_lote, presupuesto
+        )
+    elif len(miembros) > 1:
+        # Las membranas con la misma tabla de reglas (p. ej. las hijas de
+        # una división) se evalúan por familias sobre una matriz de recursos
+        from .compilado import preseleccionar_familias
+        compiladas = [reglas_compiladas(mem) for mem in miembros]
+        for mem, pre in zip(miembros, preseleccionar_familias([
+            (rc, rc.tabla.vector(mem.resources, estricto=False))
+            for mem, rc in zip(miembros, compiladas)
+        ], modo_seleccion)):
+            if pre is not None:
+                preseleccion[mem.id_mem] = pre
+
+    for mem in miembros:
+        if activas is not None:
+            producciones.setdefault(mem.id_mem, {})
+        recursos_disp = dict(mem.resources)
+        peso = pesos.get(mem.id_mem, 1) if pesos is not None else 1
+        if elecciones is None:
+            if presupuesto is not None:
+                presupuesto.iniciar_membrana(mem.id_mem)
+            # Aplicabilidad vectorizada y cubo de mayor prioridad (ver reglas_compiladas)
+            elegido = reglas_compiladas(mem).elegir(
+                recursos_disp, rng, modo_seleccion, cache, preseleccion.get(mem.id_mem),
+                presupuesto
+            )
+        else:
+            elegido = elecciones.get(mem.id_mem, [])
 
-                    # — Consumo de objetos —
-                    consumo_total = multiset_times(regla.left, cnt)
-                    recursos_disp = sub_multiset(recursos_disp, consumo_total)
-
-                    # — PRODUCCIONES: normalizamos regla.productions —
-                    prod_defs = regla.productions
-                    if isinstance(prod_defs, dict):
-                        prod_defs = [
-                            Production(symbol=sym, count=cuenta, direction=Direction.OUT)
-                            for sym, cuenta in prod_defs.items()
-                        ]
-
-                    for prod in prod_defs:
-                        total = prod.count * cnt
-                        if prod.direction == Direction.NORMAL:
-                            dst = producciones[mem.id_mem]
-                        elif prod.direction == Direction.IN and prod.target:
-                            dst = producciones.setdefault(prod.target, {})
-                        elif prod.direction == Direction.OUT and mem.parent:
-                            dst = producciones.setdefault(mem.parent, {})
-                        else:
-                            continue
-                        dst[prod.symbol] = dst.get(prod.symbol, 0) + total
+        if elegido:
+            seleccionados[mem.id_mem] = elegido
 
-                    # — Creación de membranas —
+            for regla, cnt in elegido:
+                # — División estructural —
+                if regla.division:
+                    v, w      = regla.division
+                    parent_id = mem.parent
+                    base      = sub_multiset(mem.resources, multiset_times(regla.left, cnt))
+
+                    to_dissolve.append(mem.id_mem)
+                    division_dissolved.add(mem.id_mem)
+
+                    # Todas las hijas comparten la tabla de reglas del linaje
+                    child_rules = compartir_reglas(mem.reglas)
                     for _ in range(cnt):
-                        for cm in regla.create_membranes:
-                            # solo usamos los dos primeros elementos de la tupla
-                            proto_label = cm[0]
-                            init_res    = cm[1]
-                            new_id      = f"{mem.id_mem}_{proto_label}_{uuid.uuid4().hex[:8]}"
-                            res_copy    = deepcopy(init_res)
-                            prot        = sistema.prototypes.get(proto_label)
-                            rules_list  = [] if prot is None else [deepcopy(rp) for rp in prot.reglas]
-                            to_create.append((mem.id_mem, new_id, res_copy, rules_list))
+                        id1 = sistema.nuevo_id(mem.id_mem)
+                        id2 = sistema.nuevo_id(mem.id_mem)
+                        r1  = add_multiset(base, v)
+                        r2  = add_multiset(base, w)
+                        to_create.append((parent_id, id1, r1, child_rules))
+                        to_create.append((parent_id, id2, r2, child_rules))
+                        if pesos is not None:
+                            pesos[id1] = pesos[id2] = peso
+                    continue
+
+                # — Consumo de objetos —
+                consumo_total = multiset_times(regla.left, cnt)
+                recursos_disp = sub_multiset(recursos_disp, consumo_total)
+
+                # — PRODUCCIONES: normalizamos regla.productions —
+                for prod in _normalizar_producciones(regla):
+                    total = prod.count * cnt
+                    if prod.direction == Direction.NORMAL:
+                        dst = producciones.setdefault(mem.id_mem, {})
+                    elif prod.direction == Direction.IN and prod.target:
+                        dst = producciones.setdefault(prod.target, {})
+                        total *= peso
+                    elif prod.direction == Direction.OUT and mem.parent:
+                        dst = producciones.setdefault(mem.parent, {})
+                        total *= peso
+                    else:
+                        continue
+                    dst[prod.symbol] = dst.get(prod.symbol, 0) + total
+
+                # — Creación de membranas —
+                if regla.create_membranes and peso > 1:
+                    raise ValueError(
+                        f"La membrana {mem.id_mem!r} representa {peso} copias y no puede crear membranas"
+                    )
+                for _ in range(cnt):
+                    for cm in regla.create_membranes:
+                        proto_label, init_res = _normalizar_creacion(cm)
+                        new_id      = sistema.nuevo_id(f"{mem.id_mem}_{proto_label}")
+                        res_copy    = deepcopy(init_res)
+                        prot        = sistema.prototypes.get(proto_label)
+                        if prot is None:
+                            rules_list = TablaReglas()
+                        else:
+                            prot.reglas = rules_list = compartir_reglas(prot.reglas)
+                        to_create.append((mem.id_mem, new_id, res_copy, rules_list))
 
         consumos[mem.id_mem] = recursos_disp
 
@@ -284,47 +1405,220 @@ def simular_lapso(
     for mem_id, prod in producciones.items():
         if mem_id in division_dissolved:
             continue
+        if not prod and mem_id not in seleccionados:
+            continue   # sin cambios: no se copia la membrana
         base = consumos.get(mem_id, sistema.skin[mem_id].resources)
-        sistema.skin[mem_id].resources = add_multiset(base, prod)
+        sistema._editable(mem_id).resources = add_multiset(base, prod)
 
-    # — Fase 3: Disoluciones —
+    # — Fase 3: Disoluciones (por lotes) —
     root_id = sistema.output_membrane
-    dissolved_list: List[str] = []
-    for dis_id in to_dissolve:
-        if dis_id == root_id or dis_id not in sistema.skin:
-            continue
-        padre_id = sistema.skin[dis_id].parent
-        if padre_id:
-            padre = sistema.skin[padre_id]
-            if dis_id not in division_dissolved:
-                padre.resources = add_multiset(padre.resources, sistema.skin[dis_id].resources)
-            for hijo_id in list(sistema.skin[dis_id].children):
-                sistema.skin[hijo_id].parent = padre_id
-                padre.children.append(hijo_id)
-            padre.children.remove(dis_id)
-        del sistema.skin[dis_id]
-        dissolved_list.append(dis_id)
-
-    # — Fase 4: Creaciones —
+    dissolved_list: List[str] = [
+        dis_id for dis_id in dict.fromkeys(to_dissolve)
+        if dis_id != root_id and dis_id in sistema.skin
+    ]
+    contenido = {
+        dis_id: sistema.skin[dis_id].resources
+        for dis_id in dissolved_list if dis_id not in division_dissolved
+    }
+    heredero = sistema.remove_membranes(dissolved_list)   # disuelta -> heredera
+    for dis_id, recursos_dis in contenido.items():
+        if heredero[dis_id]:
+            padre = sistema._editable(heredero[dis_id])
+            padre.resources = add_multiset(padre.resources, recursos_dis)
+
+    # — Fase 4: Creaciones (por lotes) —
     created_list: List[Tuple[str, str]] = []
+    nuevas: List[Tuple[Membrana, Optional[str]]] = []
     for parent_id, new_id, res, rules_list in to_create:
+        # Una membrana creada dentro de otra disuelta en este lapso pasa a su heredera
+        if parent_id in heredero:
+            parent_id = heredero[parent_id]
         nueva = Membrana(
             id_mem=new_id,
             resources=res,
-            reglas=[deepcopy(r) for r in rules_list]
+            reglas=rules_list   # tabla compartida, sin copias
         )
-        sistema.add_membrane(nueva, parent_id)
+        nuevas.append((nueva, parent_id))
         created_list.append((parent_id, new_id))
+    sistema.add_membranes(nuevas)
+
+    pesos_lapso = None
+    if pesos is not None:
+        pesos_lapso = {mem.id_mem: pesos.get(mem.id_mem, 1) for mem in miembros}
+        for dis_id in dissolved_list:
+            pesos.pop(dis_id, None)
+
+    if activas is not None:
+        # Sólo pueden cambiar de aplicabilidad las membranas con recursos nuevos
+        activas.intersection_update(seleccionados)
+        activas.update(mid for mid, prod in producciones.items() if prod)
+        activas.update(h for h in heredero.values() if h)
+        activas.update(new_id for _, new_id in created_list)
+        activas.difference_update(dissolved_list)
 
     return LapsoResult(
         seleccionados=seleccionados,
         consumos=consumos,
         producciones=producciones,
         created=created_list,
-        dissolved=dissolved_list
+        dissolved=dissolved_list,
+        pesos=pesos_lapso,
+        maximales=maximales,
+        agotados=dict(presupuesto.agotados) if presupuesto is not None else None
     )
 
 
+# ------------------------ SIMULACIÓN HASTA LA PARADA --------------------------
+
+REGISTROS = (None, "resumen", "completo")
+
+@dataclass
+class ResumenLapso:
+    """
+    Resumen ligero de un lapso: aplicaciones de reglas, membranas creadas y
+    disueltas, y membranas que agotaron el presupuesto de enumeración.
+    """
+    aplicaciones: int
+    creadas: int
+    disueltas: int
+    agotadas: int = 0
+
+@dataclass
+class ResultadoSimulacion:
+    """
+    Resultado de simular():
+      - pasos: lapsos ejecutados en los que se aplicó alguna regla.
+      - motivo: "sin_reglas" (configuración de parada), "predicado"
+        (se cumplió `parada`) o "max_pasos".
+      - salida: recursos de la membrana de salida al terminar.
+      - lapsos: LapsoResult de cada lapso (registrar="completo").
+      - resumen: ResumenLapso de cada lapso (registrar="resumen").
+    """
+    pasos: int
+    motivo: str
+    salida: Multiset
+    lapsos: List[LapsoResult] = field(default_factory=list)
+    resumen: List[ResumenLapso] = field(default_factory=list)
+
+    @property
+    def detenido(self) -> bool:
+        """True si el sistema alcanzó la configuración de parada."""
+        return self.motivo == "sin_reglas"
+
+def semilla_lapso(rng_seed: Optional[Union[int, str]], paso: int) -> Optional[Union[int, str]]:
+    """
+    Semilla del lapso `paso` (desde 0) de una simulación con `rng_seed`:
+    rng_seed + paso si es un entero, y "<rng_seed>/<paso>" si es texto.
+    Con enteros, la simulación de semilla s + 1 repite los lapsos de la de
+    semilla s desplazados uno; las semillas de texto distintas no comparten
+    ningún lapso, así que son las que deben usar las réplicas.
+    """
+    if rng_seed is None:
+        return None
+    if isinstance(rng_seed, str):
+        return f"{rng_seed}/{paso}"
+    return rng_seed + paso
+
+
+def simular(
+    sistema: SistemaP,
+    max_pasos: Optional[int] = None,
+    parada: Optional[Callable[[Multiset], bool]] = None,
+    rng_seed: Optional[Union[int, str]] = None,
+    modo_seleccion: str = "voraz",
+    cache: Optional[CacheMaximales] = None,
+    registrar: Optional[str] = None,
+    al_lapso: Optional[Callable[[int, LapsoResult], None]] = None,
+    ejecutor: Optional[Executor] = None,
+    rng_por_membrana: bool = False,
+    retirar: Optional[Callable[[Membrana], bool]] = None,
+    contar: bool = False,
+    presupuesto: Optional[Presupuesto] = None,
+    tam_lote: Optional[int] = None
+) -> ResultadoSimulacion:
+    """
+    Ejecuta lapsos sobre `sistema` (in situ) hasta que ninguna regla sea
+    aplicable, hasta que `parada(recursos de la membrana de salida)` sea
+    True (se comprueba también antes del primer lapso) o hasta `max_pasos`
+    (None = sin límite). El lapso i usa la semilla semilla_lapso(rng_seed, i).
+
+    La parada se detecta de forma incremental: cada lapso sólo evalúa las
+    membranas cuyos recursos cambiaron en el anterior (ver `activas` en
+    simular_lapso). Con registrar="completo" se guardan los LapsoResult,
+    que cubren todas las membranas como simular_lapso (y por tanto se
+    evalúan todas en cada lapso); con "resumen", sólo un ResumenLapso por
+    lapso. La trayectoria es la misma en los tres modos.
+
+    `al_lapso(n, lapso)` se llama tras cada lapso n (desde 1) con su
+    LapsoResult completo, sin guardarlo: permite volcar resultados en
+    streaming con memoria constante.
+
+    `ejecutor`, `rng_por_membrana` y `tam_lote` se pasan a simular_lapso
+    para repartir la selección de cada lapso entre hilos o procesos.
+
+    Las membranas para las que `retirar(membrana)` es True tras un lapso
+    dejan de evaluarse hasta que reciban objetos nuevos, aunque tengan
+    reglas aplicables (p. ej. las que ya emitieron su resultado). Sólo se
+    aplica cuando los lapsos son incrementales (sin registrar="completo"
+    ni al_lapso).
+
+    `contar` se pasa a simular_lapso: cada LapsoResult registrado lleva el
+    número de maximales de cada membrana (su factor de ramificación).
+    `presupuesto` (ver Presupuesto) acota la enumeración en cada lapso, de
+    modo que ninguna configuración patológica bloquea la simulación; los
+    agotamientos quedan en LapsoResult.agotados y ResumenLapso.agotadas.
+    """
+    if registrar not in REGISTROS:
+        raise ValueError(f"Modo de registro desconocido: {registrar!r}")
+
+    def recursos_salida() -> Multiset:
+        mem = sistema.skin.get(sistema.output_membrane) if sistema.output_membrane else None
+        return mem.resources if mem is not None else {}
+
+    completo = registrar == "completo" or al_lapso is not None
+    resultado = ResultadoSimulacion(pasos=0, motivo="max_pasos", salida={})
+    activas: Set[str] = set(sistema.skin)
+    if parada is not None and parada(recursos_salida()):
+        resultado.motivo = "predicado"
+    else:
+        while max_pasos is None or resultado.pasos < max_pasos:
+            if not activas:
+                resultado.motivo = "sin_reglas"
+                break
+            semilla = semilla_lapso(rng_seed, resultado.pasos)
+            lapso = simular_lapso(
+                sistema, rng_seed=semilla, modo_seleccion=modo_seleccion, cache=cache,
+                activas=None if completo else activas,
+                ejecutor=ejecutor, rng_por_membrana=rng_por_membrana,
+                contar=contar, presupuesto=presupuesto, tam_lote=tam_lote
+            )
+            if not lapso.seleccionados:
+                resultado.motivo = "sin_reglas"
+                break
+            resultado.pasos += 1
+            if retirar is not None and not completo:
+                activas.difference_update(
+                    [mid for mid in activas if retirar(sistema.skin[mid])]
+                )
+            if al_lapso is not None:
+                al_lapso(resultado.pasos, lapso)
+            if registrar == "completo":
+                resultado.lapsos.append(lapso)
+            elif registrar == "resumen":
+                resultado.resumen.append(ResumenLapso(
+                    aplicaciones=sum(cnt for apps in lapso.seleccionados.values() for _, cnt in apps),
+                    creadas=len(lapso.created),
+                    disueltas=len(lapso.dissolved),
+                    agotadas=len(lapso.agotados or {}),
+                ))
+            if parada is not None and parada(recursos_salida()):
+                resultado.motivo = "predicado"
+                break
+
+    resultado.salida = dict(recursos_salida())
+    return resultado
+
+
 
 
 
@@ -337,66 +1631,106 @@ def simular_lapso(
 
 # ---------------------- REGISTRAR ESTADÍSTICAS MÚLTIPLES -----------------------
 
+COLUMNAS_ESTADISTICAS = [
+    "lapso", "membrana", "recursos_restantes", "producciones",
+    "aplicaciones", "creadas_global", "disueltas_global"
+]
+
+def _filas_lapso(idx_l: int, lapso: LapsoResult) -> List[list]:
+    """Filas (una por membrana) de registrar_estadisticas para un lapso."""
+    cre_str = ";".join(f"{p}->{c}" for p, c in lapso.created) if lapso.created else ""
+    dis_str = ";".join(lapso.dissolved) if lapso.dissolved else ""
+
+    rows = []
+    for mem_id in lapso.consumos:
+        rec_rest = lapso.consumos.get(mem_id, {})
+        prod     = lapso.producciones.get(mem_id, {})
+        apps     = lapso.seleccionados.get(mem_id, [])
+
+        apps_entries: list[str] = []
+        for regla, cnt in apps:
+            # Normalizar producciones de la regla
+            prod_defs = regla.productions
+
+            if isinstance(prod_defs, dict):
+                # legacy: dict de símbolo->cantidad
+                prod_list = list(prod_defs.items())
+            elif isinstance(prod_defs, list):
+                prod_list = []
+                for p in prod_defs:
+                    if hasattr(p, "symbol") and hasattr(p, "count"):
+                        prod_list.append((p.symbol, p.count))
+                    else:
+                        # tupla u otro tipo
+                        prod_list.append(p)
+            else:
+                prod_list = [prod_defs]
+
+            apps_entries.append(
+                f"{list(regla.left.items())} -> {prod_list} ×{cnt}"
+            )
+
+        apps_str = ";".join(apps_entries) if apps_entries else ""
+
+        rows.append([idx_l, mem_id, str(rec_rest), str(prod), apps_str, cre_str, dis_str])
+    return rows
+
 def registrar_estadisticas(
     sistema: SistemaP,
     lapsos: int,
     rng_seed: Optional[int] = None,
-    csv_path: Optional[str] = None
-) -> pd.DataFrame:
-    all_results = [
-        simular_lapso(sistema, rng_seed=(rng_seed + i) if rng_seed is not None else None)
-        for i in range(lapsos)
-    ]
-
-    rows = []
-    for idx_l, lapso in enumerate(all_results, start=1):
-        cre_str = ";".join(f"{p}->{c}" for p, c in lapso.created) if lapso.created else ""
-        dis_str = ";".join(lapso.dissolved) if lapso.dissolved else ""
-
-        for mem_id in lapso.consumos:
-            rec_rest = lapso.consumos.get(mem_id, {})
-            prod     = lapso.producciones.get(mem_id, {})
-            apps     = lapso.seleccionados.get(mem_id, [])
-
-            apps_entries: list[str] = []
-            for regla, cnt in apps:
-                # Normalizar producciones de la regla
-                prod_defs = regla.productions
-
-                if isinstance(prod_defs, dict):
-                    # legacy: dict de símbolo->cantidad
-                    prod_list = list(prod_defs.items())
-                elif isinstance(prod_defs, list):
-                    prod_list = []
-                    for p in prod_defs:
-                        if hasattr(p, "symbol") and hasattr(p, "count"):
-                            prod_list.append((p.symbol, p.count))
-                        else:
-                            # tupla u otro tipo
-                            prod_list.append(p)
-                else:
-                    prod_list = [prod_defs]
-
-                apps_entries.append(
-                    f"{list(regla.left.items())} -> {prod_list} ×{cnt}"
-                )
+    csv_path: Optional[str] = None,
+    devolver_df: bool = True,
+    comprimir: Optional[bool] = None,
+    filas_por_bloque: int = 10_000
+) -> Optional[pd.DataFrame]:
+    """
+    Simula hasta `lapsos` lapsos y registra una fila por lapso y membrana.
+    La simulación termina en cuanto el sistema se detiene (ver simular), y
+    los lapsos posteriores no se registran: con `lapsos` mayor que los
+    pasos hasta la parada hay menos de `lapsos` lapsos registrados (antes
+    se repetía la configuración de parada hasta completarlos).
+
+    Con `csv_path`, las filas de cada lapso se escriben al terminar éste,
+    en bloques de `filas_por_bloque` filas, comprimidas con gzip si
+    `comprimir` es True (por defecto, si la ruta acaba en ".gz"). Devuelve
+    el DataFrame de todas las filas; con devolver_df=False no se construye
+    (la memoria no crece con el número de lapsos) y se devuelve None.
+    """
+    filas: List[list] = []
+    bloque: List[list] = []
+    salida = escritor = None
+    if csv_path:
+        if comprimir is None:
+            comprimir = str(csv_path).endswith(".gz")
+        if comprimir:
+            salida = gzip.open(csv_path, "wt", newline="", encoding="utf-8")
+        else:
+            salida = open(csv_path, "w", newline="", encoding="utf-8")
+        escritor = csv.writer(salida, lineterminator="\n")
+        escritor.writerow(COLUMNAS_ESTADISTICAS)
 
-            apps_str = ";".join(apps_entries) if apps_entries else ""
+    def volcar(n: int, lapso: LapsoResult) -> None:
+        nuevas = _filas_lapso(n, lapso)
+        if devolver_df:
+            filas.extend(nuevas)
+        if escritor is not None:
+            bloque.extend(nuevas)
+            if len(bloque) >= filas_por_bloque:
+                escritor.writerows(bloque)
+                bloque.clear()
 
-            rows.append({
-                "lapso": idx_l,
-                "membrana": mem_id,
-                "recursos_restantes": str(rec_rest),
-                "producciones": str(prod),
-                "aplicaciones": apps_str,
-                "creadas_global": cre_str,
-                "disueltas_global": dis_str
-            })
+    try:
+        simular(sistema, lapsos, rng_seed=rng_seed, al_lapso=volcar)
+        if escritor is not None:
+            escritor.writerows(bloque)
+    finally:
+        if salida is not None:
+            salida.close()
 
-    df = pd.DataFrame(rows)
-    if csv_path:
-        df.to_csv(csv_path, index=False)
-    return df
+    if not devolver_df:
+        return None
+    return pd.DataFrame(filas, columns=COLUMNAS_ESTADISTICAS)
 
 
 
@@ -406,18 +1740,18 @@ def merge_systems(*systems: SistemaP, global_id: str = "global", output_membrane
     merged = SistemaP()
     global_mem = Membrana(id_mem=global_id, resources={}, reglas=[], children=[], parent=None)
     merged.add_membrane(global_mem)
-    for idx, sys in enumerate(systems):
-        mapping: Dict[str, str] = {old: f"{global_id}_{idx}_{old}" for old in sys.skin}
-        for old_id, membrana in sys.skin.items():
+    for idx, sistema in enumerate(systems):
+        mapping: Dict[str, str] = {old: f"{global_id}_{idx}_{old}" for old in sistema.skin}
+        for old_id, membrana in sistema.skin.items():
             new_mem = Membrana(
                 id_mem=mapping[old_id],
                 resources=deepcopy(membrana.resources),
-                reglas=[deepcopy(r) for r in membrana.reglas],
+                reglas=compartir_reglas(membrana.reglas),
                 children=[],
                 parent=None
             )
             merged.skin[new_mem.id_mem] = new_mem
-        for old_id, membrana in sys.skin.items():
+        for old_id, membrana in sistema.skin.items():
             new_id = mapping[old_id]
             parent_old = membrana.parent
             parent_new = global_id if parent_old is None else mapping[parent_old]
@@ -0,0 +1,976 @@
+"""
+compilado.py
+
+Compilación de un SistemaP a una representación numérica con NumPy:
+  1. TablaSimbolos: interna cada objeto como un índice entero.
+  2. ReglasCompiladas: las reglas de una membrana como filas dispersas
+     (lado izquierdo y producciones) sobre la tabla de símbolos.
+  3. ArenaMembranas: almacén de membranas con handles enteros y enlaces
+     padre/hija/hermana en arrays, con altas y bajas por lotes.
+  4. SistemaCompilado: los recursos de todas las membranas como una matriz
+     membranas × símbolos y un motor de lapsos que calcula aplicabilidad,
+     consumo y producción con operaciones vectorizadas, de una vez para
+     cada familia de membranas con la misma tabla de reglas.
+
+Con la misma semilla, SistemaCompilado.paso elige los mismos multiconjuntos
+que simular_lapso y llega a la misma configuración, con los mismos IDs de
+membranas nuevas. a_sistema() devuelve un SistemaP normal.
+"""
+
+from __future__ import annotations
+import random
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .SistemaP import (
+    SistemaP,
+    Membrana,
+    Regla,
+    TablaReglas,
+    compartir_reglas,
+    Direction,
+    Multiset,
+    LapsoResult,
+    CacheMaximales,
+    Presupuesto,
+    seleccionar_maximal,
+    componentes_reglas,
+    huella_reglas,
+    _normalizar_producciones,
+    _normalizar_creacion,
+)
+
+__all__ = [
+    "TablaSimbolos",
+    "ReglasCompiladas",
+    "preseleccionar_familias",
+    "ArenaMembranas",
+    "SistemaCompilado",
+    "compilar",
+]
+
+
+# ----------------------------------------------------------------------
+# 1. Tabla de símbolos
+# ----------------------------------------------------------------------
+
+class TablaSimbolos:
+    """
+    Asigna a cada símbolo un índice entero estable (orden de aparición).
+    """
+
+    def __init__(self, simbolos: Iterable[str] = ()):
+        self.simbolos: List[str] = []
+        self.indices: Dict[str, int] = {}
+        for sym in simbolos:
+            self.internar(sym)
+
+    def internar(self, simbolo: str) -> int:
+        idx = self.indices.get(simbolo)
+        if idx is None:
+            idx = len(self.simbolos)
+            self.indices[simbolo] = idx
+            self.simbolos.append(simbolo)
+        return idx
+
+    def internar_multiset(self, ms: Multiset) -> None:
+        for sym in ms:
+            self.internar(sym)
+
+    def internar_regla(self, regla: Regla) -> None:
+        """Interna todos los símbolos que aparecen en una regla."""
+        self.internar_multiset(regla.left)
+        for prod in _normalizar_producciones(regla):
+            self.internar(prod.symbol)
+        if regla.division:
+            for ms in regla.division:
+                self.internar_multiset(ms)
+        for cm in regla.create_membranes:
+            self.internar_multiset(dict(_normalizar_creacion(cm)[1]))
+
+    def vector(self, ms: Multiset, estricto: bool = True) -> np.ndarray:
+        """
+        Convierte un multiconjunto en un vector de cuentas (int64). Con
+        estricto=False se ignoran los símbolos que no están en la tabla.
+        """
+        vec = np.zeros(len(self.simbolos), dtype=np.int64)
+        indices = self.indices
+        for sym, cnt in ms.items():
+            idx = indices.get(sym)
+            if idx is None:
+                if estricto:
+                    raise KeyError(sym)
+                continue
+            vec[idx] += cnt
+        return vec
+
+    def multiset(self, vec: np.ndarray) -> Multiset:
+        """Convierte un vector de cuentas en un multiconjunto (sin ceros)."""
+        return {self.simbolos[i]: int(vec[i]) for i in np.flatnonzero(vec)}
+
+    def __len__(self) -> int:
+        return len(self.simbolos)
+
+    def __contains__(self, simbolo: str) -> bool:
+        return simbolo in self.indices
+
+    def __repr__(self) -> str:
+        return f"TablaSimbolos({len(self.simbolos)} símbolos)"
+
+
+# ----------------------------------------------------------------------
+# 2. Reglas compiladas
+# ----------------------------------------------------------------------
+
+def _dispersas(
+    filas: List[List[Tuple[int, int]]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Empaqueta una lista de filas [(símbolo, cuenta), ...] en formato CSR:
+    (punteros, símbolos, cuentas).
+    """
+    punteros = np.zeros(len(filas) + 1, dtype=np.int64)
+    simbolos: List[int] = []
+    cuentas: List[int] = []
+    for k, fila in enumerate(filas):
+        for sym, cnt in fila:
+            simbolos.append(sym)
+            cuentas.append(cnt)
+        punteros[k + 1] = len(simbolos)
+    return (
+        punteros,
+        np.asarray(simbolos, dtype=np.int64),
+        np.asarray(cuentas, dtype=np.int64),
+    )
+
+
+def _tripletes(
+    entradas: List[Tuple[int, int, int]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Empaqueta [(regla, símbolo, cuenta), ...] en tres arrays paralelos."""
+    if not entradas:
+        vacio = np.zeros(0, dtype=np.int64)
+        return vacio, vacio, vacio
+    reg, sim, cnt = zip(*entradas)
+    return (
+        np.asarray(reg, dtype=np.int64),
+        np.asarray(sim, dtype=np.int64),
+        np.asarray(cnt, dtype=np.int64),
+    )
+
+
+class ReglasCompiladas:
+    """
+    Tabla de reglas de una membrana compilada sobre una TablaSimbolos:
+      - izquierdas: lado izquierdo de cada regla en formato CSR
+        (izq_ptr, izq_sim, izq_cnt).
+      - normales / salidas: producciones NORMAL y OUT como tripletes
+        (regla, símbolo, cuenta).
+      - entradas: producciones IN agrupadas por membrana destino.
+      - division / creaciones: vectores precalculados de las reglas
+        estructurales.
+    """
+
+    def __init__(self, reglas: List[Regla], tabla: TablaSimbolos):
+        self.reglas: TablaReglas = compartir_reglas(reglas)
+        self.origen = reglas          # lista de la que se compiló
+        self.tabla = tabla
+        n = len(self.reglas)
+
+        self.izq_ptr, self.izq_sim, self.izq_cnt = _dispersas([
+            [(tabla.indices[sym], cnt) for sym, cnt in r.left.items() if cnt > 0]
+            for r in self.reglas
+        ])
+        longitudes = np.diff(self.izq_ptr)
+        self.con_izquierda = np.flatnonzero(longitudes > 0)
+        self.reglas_de = np.repeat(np.arange(n, dtype=np.int64), longitudes)
+        # Incidencia regla × símbolo, sólo para los símbolos que aparecen en
+        # el lado izquierdo de dos o más reglas (los únicos que las enfrentan)
+        simbolos, usos = np.unique(self.izq_sim, return_counts=True)
+        compartidos = simbolos[usos > 1]
+        self.incidencia_compartida: Optional[np.ndarray] = None
+        if compartidos.size:
+            columna = np.searchsorted(compartidos, self.izq_sim)
+            en_compartidos = compartidos[np.minimum(columna, compartidos.size - 1)] == self.izq_sim
+            self.incidencia_compartida = np.zeros((n, compartidos.size), dtype=np.int64)
+            self.incidencia_compartida[self.reglas_de[en_compartidos], columna[en_compartidos]] = 1
+
+        normales: List[Tuple[int, int, int]] = []
+        salidas: List[Tuple[int, int, int]] = []
+        entradas: Dict[str, List[Tuple[int, int, int]]] = {}
+        for k, regla in enumerate(self.reglas):
+            for prod in _normalizar_producciones(regla):
+                entrada = (k, tabla.indices[prod.symbol], prod.count)
+                if prod.direction == Direction.NORMAL:
+                    normales.append(entrada)
+                elif prod.direction == Direction.OUT:
+                    salidas.append(entrada)
+                elif prod.direction == Direction.IN and prod.target:
+                    entradas.setdefault(prod.target, []).append(entrada)
+        self.normales = _tripletes(normales)
+        self.salidas = _tripletes(salidas)
+        self.entradas = {dst: _tripletes(ents) for dst, ents in entradas.items()}
+
+        self.prioridades = np.array([r.priority for r in self.reglas], dtype=np.int64)
+        # Cubos de prioridad, de mayor a menor: (prioridad, índices de reglas)
+        self.niveles: List[Tuple[int, np.ndarray]] = [
+            (int(p), np.flatnonzero(self.prioridades == p))
+            for p in sorted(set(self.prioridades.tolist()), reverse=True)
+        ]
+        self.es_division = np.array([bool(r.division) for r in self.reglas], dtype=bool)
+        self.division: Dict[int, Tuple[np.ndarray, np.ndarray]] = {
+            k: (tabla.vector(r.division[0]), tabla.vector(r.division[1]))
+            for k, r in enumerate(self.reglas) if r.division
+        }
+        self.creaciones: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+        for k, regla in enumerate(self.reglas):
+            if regla.create_membranes:
+                self.creaciones[k] = [
+                    (etiqueta, tabla.vector(dict(iniciales)))
+                    for etiqueta, iniciales in map(_normalizar_creacion, regla.create_membranes)
+                ]
+        # Componente conexa de cada regla en el grafo de conflictos
+        self.componente_de = np.zeros(n, dtype=np.int64)
+        for c, posiciones in enumerate(componentes_reglas(list(self.reglas))):
+            self.componente_de[posiciones] = c
+        self.estructurales = self.es_division.copy()
+        self.estructurales[list(self.creaciones)] = True
+        self.n_reglas = n
+
+    def __len__(self) -> int:
+        return self.n_reglas
+
+    def izquierda(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Símbolos y cuentas del lado izquierdo de la regla k."""
+        a, b = self.izq_ptr[k], self.izq_ptr[k + 1]
+        return self.izq_sim[a:b], self.izq_cnt[a:b]
+
+    def max_applications_all(self, recursos: np.ndarray) -> np.ndarray:
+        """
+        Número máximo de aplicaciones de cada regla sobre el vector
+        `recursos`, en una sola reducción floor-divide/min. Igual que
+        max_applications, una regla con lado izquierdo vacío vale 0.
+        """
+        mult = np.zeros(self.n_reglas, dtype=np.int64)
+        if self.con_izquierda.size:
+            cocientes = recursos[self.izq_sim] // self.izq_cnt
+            mult[self.con_izquierda] = np.minimum.reduceat(
+                cocientes, self.izq_ptr[self.con_izquierda]
+            )
+        return mult
+
+    def top(self, mult: np.ndarray) -> np.ndarray:
+        """
+        Índices (en orden) de las reglas aplicables del cubo de mayor
+        prioridad que tenga alguna, dadas las multiplicidades `mult`.
+        """
+        for _, indices in self.niveles:
+            aplicables = indices[mult[indices] > 0]
+            if aplicables.size:
+                return aplicables
+        return indices[:0] if self.niveles else np.zeros(0, dtype=np.int64)
+
+    def consumo(self, veces: np.ndarray) -> np.ndarray:
+        """Vector de objetos consumidos al aplicar cada regla `veces`."""
+        return self.consumo_familia(veces[np.newaxis, :])[0]
+
+    def consumo_familia(self, veces: np.ndarray) -> np.ndarray:
+        """Como consumo, para una matriz miembros × reglas de veces."""
+        total = np.zeros((veces.shape[0], len(self.tabla)), dtype=np.int64)
+        np.add.at(total, (slice(None), self.izq_sim), self.izq_cnt * veces[:, self.reglas_de])
+        return total
+
+    def produccion_familia(
+        self,
+        tripletes: Tuple[np.ndarray, np.ndarray, np.ndarray],
+        veces: np.ndarray
+    ) -> np.ndarray:
+        """
+        Objetos producidos por `tripletes` (normales, salidas o una
+        entrada) para una matriz miembros × reglas de veces.
+        """
+        total = np.zeros((veces.shape[0], len(self.tabla)), dtype=np.int64)
+        reg, sim, cnt = tripletes
+        if reg.size:
+            np.add.at(total, (slice(None), sim), cnt * veces[:, reg])
+        return total
+
+    # ----------------------- selección por familias -------------------
+
+    def max_applications_familia(self, recursos: np.ndarray) -> np.ndarray:
+        """
+        max_applications_all para una familia de membranas con esta tabla:
+        `recursos` es una matriz miembros × símbolos y el resultado una
+        matriz miembros × reglas.
+        """
+        mult = np.zeros((recursos.shape[0], self.n_reglas), dtype=np.int64)
+        if self.con_izquierda.size:
+            cocientes = recursos[:, self.izq_sim] // self.izq_cnt
+            mult[:, self.con_izquierda] = np.minimum.reduceat(
+                cocientes, self.izq_ptr[self.con_izquierda], axis=1
+            )
+        return mult
+
+    def top_familia(self, mult: np.ndarray) -> np.ndarray:
+        """
+        Máscara miembros × reglas con las reglas aplicables del cubo de
+        mayor prioridad de cada miembro (la fila de top() como booleanos).
+        """
+        top = np.zeros(mult.shape, dtype=bool)
+        pendientes = np.ones(mult.shape[0], dtype=bool)
+        for _, indices in self.niveles:
+            aplicables = mult[:, indices] > 0
+            filas = np.flatnonzero(pendientes & aplicables.any(axis=1))
+            if filas.size:
+                top[np.ix_(filas, indices)] = aplicables[filas]
+                pendientes[filas] = False
+            if not pendientes.any():
+                break
+        return top
+
+    def preseleccionar(
+        self,
+        recursos: np.ndarray,
+        modo: str = "voraz"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Selección de toda una familia (matriz miembros × símbolos) con
+        operaciones sobre la matriz. Devuelve (veces, estado): por miembro,
+        INERTE si no tiene reglas aplicables; RESUELTA si en modo voraz sus
+        reglas del cubo superior no comparten objetos, de modo que el único
+        maximal aplica cada una su máximo (su fila de `veces`); PENDIENTE
+        en otro caso. Ver completar().
+        """
+        mult = self.max_applications_familia(recursos)
+        top = self.top_familia(mult)
+        veces = np.where(top, mult, 0)
+        con_reglas = top.any(axis=1)
+        estado = np.where(con_reglas, PENDIENTE, INERTE)
+        if modo == "voraz":
+            libres = con_reglas
+            if self.incidencia_compartida is not None:
+                usos = top.astype(np.int64) @ self.incidencia_compartida
+                libres = libres & ~(usos > 1).any(axis=1)
+            estado[libres] = RESUELTA
+        return veces, estado
+
+    def completar(
+        self,
+        veces: np.ndarray,
+        estado: int,
+        recursos: np.ndarray,
+        rng: Optional[random.Random],
+        modo: str = "voraz",
+        cache: Optional[CacheMaximales] = None,
+        presupuesto: Optional[Presupuesto] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Resultado de seleccionar() para un miembro preseleccionado. Las
+        filas RESUELTA no recalculan nada, pero sí consumen de `rng` las
+        mismas llamadas que seleccionar() (sin efecto si rng es None, p. ej.
+        con un generador propio por membrana), así que el resto de
+        membranas elige igual que sin preselección.
+        """
+        if estado == INERTE:
+            return None
+        if estado == PENDIENTE:
+            return self.seleccionar(recursos, rng, modo, cache, presupuesto)
+        if rng is not None:
+            _reproducir_voraz(veces[veces > 0].tolist(), rng)
+        return veces
+
+    def seleccionar(
+        self,
+        recursos: np.ndarray,
+        rng: random.Random,
+        modo: str = "voraz",
+        cache: Optional[CacheMaximales] = None,
+        presupuesto: Optional[Presupuesto] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Elige un multiconjunto maximal de las reglas aplicables de mayor
+        prioridad, igual que simular_lapso con seleccionar_maximal, y lo
+        devuelve como vector de veces por regla (None si nada es aplicable).
+        """
+        top = self.top(self.max_applications_all(recursos))
+        if not top.size:
+            return None
+        veces = np.zeros(self.n_reglas, dtype=np.int64)
+
+        if modo != "voraz":
+            # Las componentes de la tabla, restringidas a las reglas de top
+            reglas_top = [self.reglas[k] for k in top]
+            componentes: Dict[int, List[int]] = {}
+            for pos, c in enumerate(self.componente_de[top].tolist()):
+                componentes.setdefault(c, []).append(pos)
+            elegido = seleccionar_maximal(
+                reglas_top, self.tabla.multiset(recursos), rng, modo, cache,
+                list(componentes.values()), presupuesto
+            )
+            # Por posición en top: los id() de las reglas no sobreviven a
+            # pickle (p. ej. al enviar la tabla a un ProcessPoolExecutor)
+            posicion = {id(regla): k for regla, k in zip(reglas_top, top.tolist())}
+            for regla, cnt in elegido:
+                veces[posicion[id(regla)]] += cnt
+            return veces
+
+        # Mismo recorrido y mismas llamadas a rng que seleccionar_maximal("voraz")
+        restantes = recursos.copy()
+        while True:
+            mult = self.max_applications_all(restantes)[top]
+            candidatos = np.flatnonzero(mult > 0)
+            if not candidatos.size:
+                break
+            pos = candidatos[rng.randrange(len(candidatos))]
+            cnt = rng.randint(1, int(mult[pos]))
+            k = top[pos]
+            veces[k] += cnt
+            sim, cuenta = self.izquierda(k)
+            restantes[sim] -= cuenta * cnt
+        return veces
+
+    def elegir(
+        self,
+        recursos: Multiset,
+        rng: random.Random,
+        modo: str = "voraz",
+        cache: Optional[CacheMaximales] = None,
+        preseleccion: Optional[Tuple[np.ndarray, int]] = None,
+        presupuesto: Optional[Presupuesto] = None
+    ) -> List[Tuple[Regla, int]]:
+        """
+        Como seleccionar, pero sobre un multiconjunto y devolviendo
+        (Regla, veces). `preseleccion` es la (fila de veces, estado) del
+        miembro en preseleccionar_familias.
+        """
+        vector = self.tabla.vector(recursos, estricto=False)
+        if preseleccion is None:
+            veces = self.seleccionar(vector, rng, modo, cache, presupuesto)
+        else:
+            veces = self.completar(*preseleccion, vector, rng, modo, cache, presupuesto)
+        if veces is None:
+            return []
+        return [(self.reglas[k], int(veces[k])) for k in np.flatnonzero(veces)]
+
+    def __repr__(self) -> str:
+        return f"ReglasCompiladas({self.n_reglas} reglas, {len(self.tabla)} símbolos)"
+
+
+# Estado de cada miembro tras ReglasCompiladas.preseleccionar
+INERTE, RESUELTA, PENDIENTE = 0, 1, 2
+
+
+def _reproducir_voraz(maximos: List[int], rng: random.Random) -> None:
+    """
+    Repite las llamadas a `rng` de la selección voraz cuando las reglas
+    candidatas no comparten objetos: aplicar una regla sólo reduce su
+    propio máximo, así que basta llevar la cuenta de cada una.
+    """
+    vivas = list(range(len(maximos)))
+    while vivas:
+        j = rng.randrange(len(vivas))
+        pos = vivas[j]
+        maximos[pos] -= rng.randint(1, maximos[pos])
+        if maximos[pos] == 0:
+            vivas.pop(j)
+
+
+def preseleccionar_familias(
+    miembros: List[Tuple[ReglasCompiladas, np.ndarray]],
+    modo: str = "voraz"
+) -> List[Optional[Tuple[np.ndarray, int]]]:
+    """
+    Agrupa `miembros` (tabla compilada, vector de recursos) en familias que
+    comparten la misma tabla, apila los recursos de cada una en una matriz
+    y la preselecciona de una vez (ReglasCompiladas.preseleccionar).
+    Devuelve, en el orden de `miembros`, la (fila de veces, estado) de
+    cada uno, o None para los que no tienen familia (un solo miembro).
+    """
+    familias: Dict[int, List[int]] = {}
+    for pos, (rc, _) in enumerate(miembros):
+        familias.setdefault(id(rc), []).append(pos)
+    resultado: List[Optional[Tuple[np.ndarray, int]]] = [None] * len(miembros)
+    for posiciones in familias.values():
+        if len(posiciones) < 2:
+            continue
+        rc = miembros[posiciones[0]][0]
+        veces, estado = rc.preseleccionar(
+            np.stack([miembros[pos][1] for pos in posiciones]), modo
+        )
+        for fila, pos in enumerate(posiciones):
+            resultado[pos] = (veces[fila], int(estado[fila]))
+    return resultado
+
+
+# ----------------------------------------------------------------------
+# 3. Arena de membranas
+# ----------------------------------------------------------------------
+
+class ArenaMembranas:
+    """
+    Almacén de membranas indexado por enteros (handles). La estructura se
+    guarda en arrays paralelos, de modo que crear, disolver y re-enganchar
+    membranas son operaciones O(1) por membrana afectada:
+      - padre, primer_hijo, ultimo_hijo, sig_hermano, ant_hermano: enlaces
+        del árbol (-1 = ninguno); las hijas forman una lista doblemente
+        enlazada, así que la lista de hijas de una membrana se empalma en
+        la de otra en O(1) (más una escritura de `padre` por hija).
+      - secuencia: orden de alta, para recorrer las membranas en el mismo
+        orden que `skin`.
+      - viva, tabla_de: estado y tabla de reglas de cada handle.
+      - recursos: matriz capacidad × símbolos.
+    Los handles de membranas disueltas vuelven a una lista libre y se
+    reutilizan; los IDs nuevos se generan con un contador determinista.
+    """
+
+    def __init__(self, n_simbolos: int, capacidad: int = 16):
+        capacidad = max(int(capacidad), 1)
+        self.recursos = np.zeros((capacidad, n_simbolos), dtype=np.int64)
+        self.padre = np.full(capacidad, -1, dtype=np.int64)
+        self.primer_hijo = np.full(capacidad, -1, dtype=np.int64)
+        self.ultimo_hijo = np.full(capacidad, -1, dtype=np.int64)
+        self.sig_hermano = np.full(capacidad, -1, dtype=np.int64)
+        self.ant_hermano = np.full(capacidad, -1, dtype=np.int64)
+        self.secuencia = np.zeros(capacidad, dtype=np.int64)
+        self.tabla_de = np.zeros(capacidad, dtype=np.int64)
+        self.viva = np.zeros(capacidad, dtype=bool)
+        self.ids: List[Optional[str]] = [None] * capacidad
+        self.indice: Dict[str, int] = {}
+        self.libres: List[int] = []
+        self.tope = 0            # handles [0, tope) usados alguna vez
+        self.contador = 0        # para nuevo_id
+        self._siguiente_seq = 0
+
+    @property
+    def capacidad(self) -> int:
+        return self.padre.shape[0]
+
+    def _crecer(self, minimo: int) -> None:
+        nueva = max(minimo, 2 * self.capacidad)
+        extra = nueva - self.capacidad
+
+        def ampliar(arr: np.ndarray, relleno) -> np.ndarray:
+            forma = (extra,) + arr.shape[1:]
+            return np.concatenate([arr, np.full(forma, relleno, dtype=arr.dtype)])
+
+        self.recursos = ampliar(self.recursos, 0)
+        for nombre in ("padre", "primer_hijo", "ultimo_hijo", "sig_hermano", "ant_hermano"):
+            setattr(self, nombre, ampliar(getattr(self, nombre), -1))
+        self.secuencia = ampliar(self.secuencia, 0)
+        self.tabla_de = ampliar(self.tabla_de, 0)
+        self.viva = ampliar(self.viva, False)
+        self.ids.extend([None] * extra)
+
+    def nuevo_id(self, base: str) -> str:
+        """Mismo esquema que SistemaP.nuevo_id: '<base>_<n>'."""
+        while True:
+            self.contador += 1
+            candidato = f"{base}_{self.contador}"
+            if candidato not in self.indice:
+                return candidato
+
+    # ------------------------- enlaces del árbol ----------------------
+
+    def _enlazar(self, h: int, p: int) -> None:
+        """Añade h al final de las hijas de p (p = -1: raíz)."""
+        self.padre[h] = p
+        self.sig_hermano[h] = -1
+        if p < 0:
+            self.ant_hermano[h] = -1
+            return
+        ultimo = self.ultimo_hijo[p]
+        self.ant_hermano[h] = ultimo
+        if ultimo >= 0:
+            self.sig_hermano[ultimo] = h
+        else:
+            self.primer_hijo[p] = h
+        self.ultimo_hijo[p] = h
+
+    def _desenlazar(self, h: int) -> None:
+        p = self.padre[h]
+        ant, sig = self.ant_hermano[h], self.sig_hermano[h]
+        if p >= 0:
+            if ant >= 0:
+                self.sig_hermano[ant] = sig
+            else:
+                self.primer_hijo[p] = sig
+            if sig >= 0:
+                self.ant_hermano[sig] = ant
+            else:
+                self.ultimo_hijo[p] = ant
+        self.padre[h] = self.ant_hermano[h] = self.sig_hermano[h] = -1
+
+    def hijos(self, h: int) -> List[int]:
+        resultado: List[int] = []
+        c = self.primer_hijo[h]
+        while c >= 0:
+            resultado.append(int(c))
+            c = self.sig_hermano[c]
+        return resultado
+
+    # ------------------------- operaciones por lotes ------------------
+
+    def crear(
+        self,
+        ids: List[str],
+        padres: List[int],
+        tablas: List[int],
+        recursos: np.ndarray
+    ) -> np.ndarray:
+        """
+        Da de alta len(ids) membranas de una vez (handles de la lista libre
+        primero) y las engancha al final de las hijas de su padre.
+        Devuelve sus handles en el mismo orden.
+        """
+        n = len(ids)
+        reutilizados = [self.libres.pop() for _ in range(min(n, len(self.libres)))]
+        frescos = n - len(reutilizados)
+        if self.tope + frescos > self.capacidad:
+            self._crecer(self.tope + frescos)
+        handles = np.array(
+            reutilizados + list(range(self.tope, self.tope + frescos)), dtype=np.int64
+        )
+        self.tope += frescos
+
+        self.recursos[handles] = recursos
+        self.tabla_de[handles] = tablas
+        self.viva[handles] = True
+        self.primer_hijo[handles] = -1
+        self.ultimo_hijo[handles] = -1
+        self.secuencia[handles] = np.arange(self._siguiente_seq, self._siguiente_seq + n)
+        self._siguiente_seq += n
+        for h, mid, p in zip(handles.tolist(), ids, padres):
+            self.ids[h] = mid
+            self.indice[mid] = h
+            self._enlazar(h, p)
+        return handles
+
+    def disolver(self, handles: Iterable[int]) -> Dict[int, int]:
+        """
+        Da de baja las membranas indicadas, en orden. Las hijas de cada una
+        se empalman al final de las de su padre en O(1); además se
+        reescribe el puntero `padre` de cada hija, así que disolver cuesta
+        O(hijas). Devuelve {handle_disuelto: handle_heredero}, con -1 si la
+        heredera es la raíz.
+        """
+        heredero: Dict[int, int] = {}
+        for h in handles:
+            if not self.viva[h]:
+                continue
+            p = int(self.padre[h])
+            heredero[h] = p
+            primero, ultimo = self.primer_hijo[h], self.ultimo_hijo[h]
+            c = primero
+            while c >= 0:
+                self.padre[c] = p
+                c = self.sig_hermano[c]
+            if primero >= 0:
+                if p >= 0:
+                    cola = self.ultimo_hijo[p]
+                    self.ant_hermano[primero] = cola
+                    if cola >= 0:
+                        self.sig_hermano[cola] = primero
+                    else:
+                        self.primer_hijo[p] = primero
+                    self.ultimo_hijo[p] = ultimo
+                else:
+                    c = primero
+                    while c >= 0:
+                        sig = self.sig_hermano[c]
+                        self.ant_hermano[c] = self.sig_hermano[c] = -1
+                        c = sig
+            self.primer_hijo[h] = self.ultimo_hijo[h] = -1
+            self._desenlazar(h)
+            self.viva[h] = False
+            del self.indice[self.ids[h]]
+            self.ids[h] = None
+            self.libres.append(int(h))
+        # Resolver herederas disueltas en el mismo lote
+        for h in heredero:
+            p = heredero[h]
+            while p in heredero:
+                p = heredero[p]
+            heredero[h] = p
+        return heredero
+
+    # ------------------------------ consultas -------------------------
+
+    def vivas(self) -> np.ndarray:
+        """Handles vivos en orden de alta (el orden de `skin`)."""
+        handles = np.flatnonzero(self.viva[:self.tope])
+        return handles[np.argsort(self.secuencia[handles], kind="stable")]
+
+    def __len__(self) -> int:
+        return len(self.indice)
+
+    def __repr__(self) -> str:
+        return f"ArenaMembranas({len(self.indice)} vivas, capacidad={self.capacidad})"
+
+
+# ----------------------------------------------------------------------
+# 4. Sistema compilado y motor de lapsos
+# ----------------------------------------------------------------------
+
+class SistemaCompilado:
+    """
+    SistemaP compilado. Las membranas viven en una ArenaMembranas (una fila
+    de recursos por handle) y cada una referencia una tabla de
+    ReglasCompiladas; las membranas con reglas idénticas comparten tabla.
+    """
+
+    def __init__(self, sistema: SistemaP):
+        self.tabla = TablaSimbolos()
+        membranas = list(sistema.skin.values())
+        prototipos = list(sistema.prototypes.values())
+        for mem in membranas + prototipos:
+            self.tabla.internar_multiset(mem.resources)
+            for regla in mem.reglas:
+                self.tabla.internar_regla(regla)
+
+        self.tablas: List[ReglasCompiladas] = []
+        self._por_huella: Dict[Tuple, int] = {}
+        self._por_lista: Dict[int, Tuple[List[Regla], int]] = {}
+
+        self.prototypes: Dict[str, Membrana] = dict(sistema.prototypes)
+        self.tabla_prototipo: Dict[str, int] = {
+            etiqueta: self._tabla_de(prot.reglas)
+            for etiqueta, prot in sistema.prototypes.items()
+        }
+        self._tabla_vacia = self._tabla_de([])
+
+        self.arena = ArenaMembranas(len(self.tabla), capacidad=len(membranas))
+        self.arena.contador = sistema._contador
+        recursos = np.zeros((len(membranas), len(self.tabla)), dtype=np.int64)
+        for i, mem in enumerate(membranas):
+            recursos[i] = self.tabla.vector(mem.resources)
+        self.arena.crear(
+            [m.id_mem for m in membranas],
+            [-1] * len(membranas),
+            [self._tabla_de(m.reglas) for m in membranas],
+            recursos,
+        )
+        # Enlazar en el orden de `children` de cada membrana
+        for mem in membranas:
+            h = self.arena.indice[mem.id_mem]
+            for hijo_id in mem.children:
+                c = self.arena.indice.get(hijo_id)
+                if c is not None and self.arena.padre[c] < 0:
+                    self.arena._enlazar(c, h)
+        self.output_membrane = sistema.output_membrane
+
+    def _tabla_de(self, reglas: List[Regla]) -> int:
+        """Índice de la tabla compilada para `reglas`, compartida por contenido."""
+        visto = self._por_lista.get(id(reglas))
+        if visto is not None and visto[0] is reglas:
+            return visto[1]
+        huella = huella_reglas(reglas)
+        idx = self._por_huella.get(huella)
+        if idx is None:
+            idx = len(self.tablas)
+            self.tablas.append(ReglasCompiladas(reglas, self.tabla))
+            self._por_huella[huella] = idx
+        self._por_lista[id(reglas)] = (reglas, idx)
+        return idx
+
+    # ---------------------------- consultas ---------------------------
+
+    @property
+    def recursos(self) -> np.ndarray:
+        return self.arena.recursos
+
+    def membranas_vivas(self) -> np.ndarray:
+        return self.arena.vivas()
+
+    def recursos_de(self, id_mem: str) -> Multiset:
+        return self.tabla.multiset(self.arena.recursos[self.arena.indice[id_mem]])
+
+    def __len__(self) -> int:
+        return len(self.arena)
+
+    def __repr__(self) -> str:
+        return (
+            f"SistemaCompilado({len(self.arena)} membranas, {len(self.tabla)} símbolos, "
+            f"{len(self.tablas)} tablas de reglas, output={self.output_membrane!r})"
+        )
+
+    # ------------------------------ lapso -----------------------------
+
+    def paso(
+        self,
+        rng_seed: Optional[int] = None,
+        modo_seleccion: str = "voraz",
+        registrar: bool = True,
+        cache: Optional[CacheMaximales] = None,
+        presupuesto: Optional[Presupuesto] = None
+    ) -> Optional[LapsoResult]:
+        """
+        Simula un lapso con la misma semántica (y el mismo uso del generador
+        aleatorio y de IDs) que simular_lapso. Si `registrar` es False no
+        construye el LapsoResult y devuelve None.
+        """
+        rng = random.Random(rng_seed)
+        if presupuesto is not None:
+            presupuesto.iniciar_lapso()
+        arena = self.arena
+        vivas = arena.vivas().tolist()
+        recursos = arena.recursos
+        consumidos = recursos.copy()
+        producidos = np.zeros_like(recursos)
+        elegidos: Dict[int, np.ndarray] = {}
+        to_create: List[Tuple[int, str, np.ndarray, int]] = []
+        to_dissolve: List[int] = []
+        division_dissolved: Set[int] = set()
+
+        # Familias: membranas vivas que comparten tabla de reglas. Su
+        # aplicabilidad se calcula de una vez sobre la matriz de recursos.
+        familias: Dict[int, List[int]] = {}
+        for i in vivas:
+            familias.setdefault(int(arena.tabla_de[i]), []).append(i)
+        preseleccion: Dict[int, Tuple[np.ndarray, int]] = {}
+        for t_idx, miembros in familias.items():
+            if len(miembros) > 1:
+                veces, estado = self.tablas[t_idx].preseleccionar(
+                    recursos[miembros], modo_seleccion
+                )
+                for fila, i in enumerate(miembros):
+                    preseleccion[i] = (veces[fila], int(estado[fila]))
+
+        # — Fase 1: Selección (en el orden de `skin`, por el generador) —
+        for i in vivas:
+            t_idx = int(arena.tabla_de[i])
+            tabla = self.tablas[t_idx]
+            if presupuesto is not None:
+                presupuesto.iniciar_membrana(arena.ids[i])
+            if i in preseleccion:
+                veces = tabla.completar(
+                    *preseleccion[i], recursos[i], rng, modo_seleccion, cache, presupuesto
+                )
+            else:
+                veces = tabla.seleccionar(recursos[i], rng, modo_seleccion, cache, presupuesto)
+            if veces is None:
+                continue
+            elegidos[i] = veces
+            mem_id = arena.ids[i]
+            padre = int(arena.padre[i])
+
+            for k in np.flatnonzero(veces * tabla.estructurales):
+                cnt = int(veces[k])
+                if tabla.es_division[k]:
+                    v, w = tabla.division[k]
+                    sim, cuenta = tabla.izquierda(k)
+                    base = recursos[i].copy()
+                    base[sim] -= cuenta * cnt
+                    np.maximum(base, 0, out=base)
+                    to_dissolve.append(i)
+                    division_dissolved.add(i)
+                    for _ in range(cnt):
+                        id1 = arena.nuevo_id(mem_id)
+                        id2 = arena.nuevo_id(mem_id)
+                        to_create.append((padre, id1, base + v, t_idx))
+                        to_create.append((padre, id2, base + w, t_idx))
+                    continue
+                for _ in range(cnt):
+                    for etiqueta, iniciales in tabla.creaciones.get(k, ()):
+                        new_id = arena.nuevo_id(f"{mem_id}_{etiqueta}")
+                        t_prot = self.tabla_prototipo.get(etiqueta, self._tabla_vacia)
+                        to_create.append((i, new_id, iniciales, t_prot))
+
+        # Consumo y producción de cada familia como una matriz miembros ×
+        # reglas de veces (las divisiones no producen)
+        for t_idx, miembros in familias.items():
+            filas = [i for i in miembros if i in elegidos]
+            if not filas:
+                continue
+            tabla = self.tablas[t_idx]
+            efectivas = np.stack([elegidos[i] for i in filas])
+            efectivas[:, tabla.es_division] = 0
+            consumidos[filas] -= tabla.consumo_familia(efectivas)
+            producidos[filas] += tabla.produccion_familia(tabla.normales, efectivas)
+            padres = arena.padre[filas]
+            con_padre = padres >= 0
+            if tabla.salidas[0].size and con_padre.any():
+                np.add.at(
+                    producidos, padres[con_padre],
+                    tabla.produccion_familia(tabla.salidas, efectivas[con_padre]),
+                )
+            for destino, tripletes in tabla.entradas.items():
+                j = arena.indice.get(destino)
+                if j is not None:
+                    producidos[j] += tabla.produccion_familia(tripletes, efectivas).sum(axis=0)
+
+        # — Fase 2: Aplicar producciones —
+        filas = np.array(
+            [i for i in vivas if i not in division_dissolved], dtype=np.int64
+        )
+        if filas.size:
+            recursos[filas] = consumidos[filas] + producidos[filas]
+
+        resultado = None
+        if registrar:
+            resultado = LapsoResult(
+                seleccionados={
+                    arena.ids[i]: [
+                        (self.tablas[int(arena.tabla_de[i])].reglas[k], int(v[k]))
+                        for k in np.flatnonzero(v)
+                    ]
+                    for i, v in elegidos.items()
+                },
+                consumos={arena.ids[i]: self.tabla.multiset(consumidos[i]) for i in vivas},
+                producciones={arena.ids[i]: self.tabla.multiset(producidos[i]) for i in vivas},
+                created=[],
+                dissolved=[],
+                agotados=dict(presupuesto.agotados) if presupuesto is not None else None,
+            )
+
+        # — Fase 3: Disoluciones (por lotes) —
+        a_disolver = [
+            i for i in dict.fromkeys(to_dissolve)
+            if arena.ids[i] != self.output_membrane
+        ]
+        dissolved_list = [arena.ids[i] for i in a_disolver]
+        heredero = arena.disolver(a_disolver)
+
+        # — Fase 4: Creaciones (por lotes) —
+        created_list: List[Tuple[str, str]] = []
+        if to_create:
+            padres = [heredero.get(p, p) for p, _, _, _ in to_create]
+            arena.crear(
+                [new_id for _, new_id, _, _ in to_create],
+                padres,
+                [t_idx for _, _, _, t_idx in to_create],
+                np.stack([fila for _, _, fila, _ in to_create]),
+            )
+            created_list = [
+                (arena.ids[p] if p >= 0 else None, new_id)
+                for p, (_, new_id, _, _) in zip(padres, to_create)
+            ]
+
+        if resultado is not None:
+            resultado.created = created_list
+            resultado.dissolved = dissolved_list
+        return resultado
+
+    # ---------------------------- conversión --------------------------
+
+    def a_sistema(self) -> SistemaP:
+        """Reconstruye un SistemaP equivalente al estado actual."""
+        arena = self.arena
+        sistema = SistemaP(output_membrane=self.output_membrane)
+        sistema.prototypes = dict(self.prototypes)
+        sistema._contador = arena.contador
+        for i in arena.vivas().tolist():
+            p = int(arena.padre[i])
+            sistema.skin[arena.ids[i]] = Membrana(
+                id_mem=arena.ids[i],
+                resources=self.tabla.multiset(arena.recursos[i]),
+                reglas=self.tablas[int(arena.tabla_de[i])].reglas,
+                children=[arena.ids[h] for h in arena.hijos(i)],
+                parent=arena.ids[p] if p >= 0 else None,
+            )
+        return sistema
+
+
+def compilar(sistema: SistemaP) -> SistemaCompilado:
+    """Compila `sistema` (sin modificarlo) en un SistemaCompilado."""
+    return SistemaCompilado(sistema)
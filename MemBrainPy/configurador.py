@@ -450,9 +450,9 @@ class ConfiguradorPSistema(tk.Tk):
             if proto_id not in self.system.prototypes:
                 proto_mem = Membrana(id_mem=proto_id, resources={})
                 self.system.register_prototype(proto_mem)
-            self.system.prototypes[proto_id].reglas.append(regla)
+            self.system.prototypes[proto_id].add_regla(regla)
         else:
-            self.selected_membrane.reglas.append(regla)
+            self.selected_membrane.add_regla(regla)
 
         self.lbl_status.config(text='Regla añadida', foreground='green')
         self._actualizar_reglas()
@@ -496,7 +496,7 @@ class ConfiguradorPSistema(tk.Tk):
                 right = {t: random.randint(1,3) for t in random.sample(letras, prod_count)}
                 # Por simplicidad, todas las reglas aleatorias son normales
                 prods = [Production(symbol=t, count=n, direction=Direction.NORMAL) for t,n in right.items()]
-                m.reglas.append(Regla(left=left, productions=prods, priority=random.randint(1,5)))
+                m.add_regla(Regla(left=left, productions=prods, priority=random.randint(1,5)))
         self.exit_membrane_id = random.choice(ids) if ids else None
         self.system.output_membrane = self.exit_membrane_id
         if ids:
@@ -518,7 +518,7 @@ class ConfiguradorPSistema(tk.Tk):
             messagebox.showwarning('Advertencia','Seleccione una regla')
             return
         idx = sel[0]
-        self.selected_membrane.reglas.pop(idx)
+        self.selected_membrane.remove_regla(idx)
         self._actualizar_reglas()
 
     def borrar_membrana(self):
@@ -0,0 +1,251 @@
+"""
+estadisticas_columnares.py
+
+Estadísticas de simulación en formato largo (tidy) y numérico, en lugar
+de multiconjuntos convertidos a texto:
+  - objetos: una fila por (run, lapso, membrana, símbolo) con los objetos
+    que quedan tras el consumo (restante) y los producidos este lapso.
+  - aplicaciones: una fila por (run, lapso, membrana, regla) con las veces
+    que se aplicó la regla.
+Membranas, símbolos y reglas se guardan como códigos enteros con sus
+tablas de nombres; el índice de cada regla es estable (orden de primera
+aparición, identificando reglas iguales por huella_regla).
+
+Se guardan en .npz (sin pickle) o, si está instalado pyarrow, en
+Parquet/Arrow (un fichero por tabla), y se cargan directamente como
+arrays NumPy o DataFrames con columnas categóricas.
+"""
+
+from __future__ import annotations
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .SistemaP import SistemaP, Regla, LapsoResult, huella_regla, simular
+
+__all__ = [
+    "COLUMNAS_OBJETOS",
+    "COLUMNAS_APLICACIONES",
+    "EstadisticasColumnares",
+    "registrar_estadisticas_columnares",
+]
+
+COLUMNAS_OBJETOS = ["run", "lapso", "membrana", "simbolo", "restante", "producido"]
+COLUMNAS_APLICACIONES = ["run", "lapso", "membrana", "regla", "veces"]
+
+
+class EstadisticasColumnares:
+    """
+    Acumula lapsos en bloques de enteros y los expone por columnas.
+    """
+
+    def __init__(self):
+        self.membranas: List[str] = []
+        self.simbolos: List[str] = []
+        self.reglas: List[Regla] = []
+        self.reglas_texto: Optional[List[str]] = None   # sólo al cargar de disco
+        self._idx_membrana: Dict[str, int] = {}
+        self._idx_simbolo: Dict[str, int] = {}
+        self._idx_regla: Dict[Tuple, int] = {}
+        self._bloques_objetos: List[np.ndarray] = []
+        self._bloques_aplicaciones: List[np.ndarray] = []
+        self._objetos: Optional[np.ndarray] = None
+        self._aplicaciones: Optional[np.ndarray] = None
+
+    # ------------------------------ códigos ---------------------------
+
+    @staticmethod
+    def _codigo(nombre, tabla: list, indices: dict, clave=None) -> int:
+        clave = nombre if clave is None else clave
+        idx = indices.get(clave)
+        if idx is None:
+            idx = indices[clave] = len(tabla)
+            tabla.append(nombre)
+        return idx
+
+    def codigo_membrana(self, id_mem: str) -> int:
+        return self._codigo(id_mem, self.membranas, self._idx_membrana)
+
+    def codigo_simbolo(self, simbolo: str) -> int:
+        return self._codigo(simbolo, self.simbolos, self._idx_simbolo)
+
+    def codigo_regla(self, regla: Regla) -> int:
+        return self._codigo(regla, self.reglas, self._idx_regla, huella_regla(regla))
+
+    # ------------------------------ registro --------------------------
+
+    def agregar_lapso(self, run: int, lapso_n: int, lapso: LapsoResult) -> None:
+        """Añade las filas de un LapsoResult (de simular_lapso o simular)."""
+        objetos: List[Tuple[int, int, int, int, int, int]] = []
+        for mem_id in dict.fromkeys([*lapso.consumos, *lapso.producciones]):
+            m = self.codigo_membrana(mem_id)
+            restante = lapso.consumos.get(mem_id, {})
+            producido = lapso.producciones.get(mem_id, {})
+            for sym in dict.fromkeys([*restante, *producido]):
+                r, p = restante.get(sym, 0), producido.get(sym, 0)
+                if r or p:
+                    objetos.append((run, lapso_n, m, self.codigo_simbolo(sym), r, p))
+
+        aplicaciones = [
+            (run, lapso_n, self.codigo_membrana(mem_id), self.codigo_regla(regla), cnt)
+            for mem_id, apps in lapso.seleccionados.items()
+            for regla, cnt in apps
+        ]
+        if objetos:
+            self._bloques_objetos.append(np.array(objetos, dtype=np.int64))
+        if aplicaciones:
+            self._bloques_aplicaciones.append(np.array(aplicaciones, dtype=np.int64))
+        self._objetos = self._aplicaciones = None
+
+    @staticmethod
+    def _compactar(bloques: List[np.ndarray], ancho: int) -> np.ndarray:
+        if not bloques:
+            return np.zeros((0, ancho), dtype=np.int64)
+        if len(bloques) > 1:
+            bloques[:] = [np.concatenate(bloques)]
+        return bloques[0]
+
+    # ----------------------------- columnas ---------------------------
+
+    def objetos(self) -> Dict[str, np.ndarray]:
+        """Columnas de la tabla de objetos (códigos enteros)."""
+        if self._objetos is None:
+            self._objetos = self._compactar(self._bloques_objetos, len(COLUMNAS_OBJETOS))
+        return {c: self._objetos[:, j] for j, c in enumerate(COLUMNAS_OBJETOS)}
+
+    def aplicaciones(self) -> Dict[str, np.ndarray]:
+        """Columnas de la tabla de aplicaciones de reglas (códigos enteros)."""
+        if self._aplicaciones is None:
+            self._aplicaciones = self._compactar(
+                self._bloques_aplicaciones, len(COLUMNAS_APLICACIONES)
+            )
+        return {c: self._aplicaciones[:, j] for j, c in enumerate(COLUMNAS_APLICACIONES)}
+
+    def a_dataframes(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        (objetos, aplicaciones) como DataFrames; membrana y símbolo son
+        categóricas sobre los códigos, sin convertir a texto cada fila.
+        """
+        membranas = pd.Index(self.membranas, dtype=object)
+        simbolos = pd.Index(self.simbolos, dtype=object)
+        df_obj = pd.DataFrame(self.objetos())
+        df_obj["membrana"] = pd.Categorical.from_codes(df_obj["membrana"], membranas)
+        df_obj["simbolo"] = pd.Categorical.from_codes(df_obj["simbolo"], simbolos)
+        df_apps = pd.DataFrame(self.aplicaciones())
+        df_apps["membrana"] = pd.Categorical.from_codes(df_apps["membrana"], membranas)
+        return df_obj, df_apps
+
+    def descripcion_reglas(self) -> List[str]:
+        """Texto de cada regla, indexado por su código."""
+        if self.reglas_texto is not None:
+            return list(self.reglas_texto)
+        return [repr(regla) for regla in self.reglas]
+
+    # ---------------------------- persistencia ------------------------
+
+    def guardar(self, ruta: str) -> List[str]:
+        """
+        Guarda ambas tablas según la extensión de `ruta`:
+          - ".npz": un único fichero con las columnas y las tablas de nombres.
+          - ".parquet", ".arrow" o ".feather": un fichero por tabla
+            ("<base>_objetos<ext>", "<base>_aplicaciones<ext>", "<base>_reglas<ext>");
+            requiere pyarrow.
+        Devuelve las rutas escritas.
+        """
+        base, ext = os.path.splitext(os.fspath(ruta))
+        ext = ext.lower()
+        if ext == ".npz":
+            columnas = {f"objetos_{c}": v for c, v in self.objetos().items()}
+            columnas.update({f"aplicaciones_{c}": v for c, v in self.aplicaciones().items()})
+            np.savez_compressed(
+                ruta,
+                membranas=np.array(self.membranas, dtype=str),
+                simbolos=np.array(self.simbolos, dtype=str),
+                reglas=np.array(self.descripcion_reglas(), dtype=str),
+                **columnas,
+            )
+            return [ruta]
+        if ext not in (".parquet", ".arrow", ".feather"):
+            raise ValueError(f"Formato no soportado: {ext!r} (use .npz, .parquet, .arrow o .feather)")
+
+        try:
+            import pyarrow as pa
+            import pyarrow.feather as feather
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError(f"Guardar en {ext} requiere pyarrow") from exc
+
+        df_obj, df_apps = self.a_dataframes()
+        df_reglas = pd.DataFrame({
+            "regla": np.arange(len(self.reglas)),
+            "descripcion": self.descripcion_reglas(),
+        })
+        rutas = []
+        for nombre, df in (("objetos", df_obj), ("aplicaciones", df_apps), ("reglas", df_reglas)):
+            destino = f"{base}_{nombre}{ext}"
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            if ext == ".parquet":
+                pq.write_table(tabla, destino)
+            else:
+                feather.write_feather(tabla, destino)
+            rutas.append(destino)
+        return rutas
+
+    @classmethod
+    def cargar_npz(cls, ruta: str) -> "EstadisticasColumnares":
+        """
+        Carga un .npz escrito por guardar(). Las reglas se recuperan sólo
+        como texto (`reglas_texto`); `reglas` queda vacío, así que no se
+        deben añadir más lapsos al resultado.
+        """
+        est = cls()
+        with np.load(ruta, allow_pickle=False) as datos:
+            est.membranas = datos["membranas"].tolist()
+            est.simbolos = datos["simbolos"].tolist()
+            est.reglas_texto = datos["reglas"].tolist()
+            est._objetos = np.column_stack(
+                [datos[f"objetos_{c}"] for c in COLUMNAS_OBJETOS]
+            ).reshape(-1, len(COLUMNAS_OBJETOS))
+            est._aplicaciones = np.column_stack(
+                [datos[f"aplicaciones_{c}"] for c in COLUMNAS_APLICACIONES]
+            ).reshape(-1, len(COLUMNAS_APLICACIONES))
+        est._idx_membrana = {m: i for i, m in enumerate(est.membranas)}
+        est._idx_simbolo = {s: i for i, s in enumerate(est.simbolos)}
+        est._bloques_objetos = [est._objetos]
+        est._bloques_aplicaciones = [est._aplicaciones]
+        return est
+
+    def __repr__(self) -> str:
+        return (
+            f"EstadisticasColumnares({len(self.objetos()['run'])} filas de objetos, "
+            f"{len(self.aplicaciones()['run'])} aplicaciones, {len(self.reglas)} reglas)"
+        )
+
+
+def registrar_estadisticas_columnares(
+    sistema: SistemaP,
+    lapsos: int,
+    rng_seed: Optional[Union[int, str]] = None,
+    runs: int = 1,
+    ruta: Optional[str] = None
+) -> EstadisticasColumnares:
+    """
+    Versión numérica de registrar_estadisticas: simula `runs` réplicas
+    (cada una sobre una instantánea de `sistema`, la réplica r con la
+    semilla de texto "<rng_seed>/<r>", de modo que ninguna comparte lapsos
+    con otra; ver semilla_lapso) de hasta `lapsos` lapsos y registra sus
+    tablas de objetos y aplicaciones. Si se da `ruta`, las guarda con
+    guardar().
+    """
+    est = EstadisticasColumnares()
+    for run in range(runs):
+        semilla = f"{rng_seed}/{run}" if rng_seed is not None else None
+        simular(
+            sistema.snapshot(), lapsos, rng_seed=semilla,
+            al_lapso=lambda n, lapso, run=run: est.agregar_lapso(run, n, lapso),
+        )
+    if ruta:
+        est.guardar(ruta)
+    return est
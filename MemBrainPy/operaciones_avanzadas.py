@@ -8,25 +8,18 @@ funciones básicas y devuelve el resultado numérico correspondiente.
 from __future__ import annotations
 from typing import Optional
 
-from .SistemaP import simular_lapso, SistemaP, Membrana
+from .SistemaP import simular, SistemaP, Membrana
 from . import funciones
 
 
 def _run_suma(n: int, m: int, rng_seed: Optional[int] = 0) -> int:
     """Ejecuta el sistema de :func:`funciones.suma` y devuelve ``n + m``.
 
-    La simulación se realiza paso a paso en modo max_paralelo hasta vaciar
-    las membranas "a" y "b", o alcanzar un límite de pasos determinista.
+    La simulación se realiza en modo max_paralelo hasta la configuración de
+    parada (ninguna regla aplicable), con ``n + m`` pasos como cota.
     """
     sistema: SistemaP = funciones.suma(n, m)
-    max_steps = max(n + m, 1)
-    for step in range(max_steps):
-        simular_lapso(sistema, rng_seed=(rng_seed or 0) + step)
-        m1 = sistema.skin.get("m1")
-        if not m1:
-            break
-        if m1.resources.get("a", 0) == 0 and m1.resources.get("b", 0) == 0:
-            break
+    simular(sistema, max_pasos=max(n + m, 1), rng_seed=rng_seed or 0)
     m_out = sistema.skin.get("m_out")
     return m_out.resources.get("c", 0) if m_out else 0
 
@@ -0,0 +1,399 @@
+"""
+ponderado.py
+
+Representación comprimida por multiplicidad de un SistemaP. Tras una
+división o una creación masiva suele haber miles de membranas idénticas;
+aquí cada grupo se guarda como una membrana representante con un peso
+(el número de copias):
+  - Se agrupan las membranas hoja con las mismas reglas, los mismos
+    recursos y el mismo padre, que no son la membrana de salida, no son
+    destino de producciones IN (se las nombra por ID) y cuyas reglas no
+    crean membranas (las hijas de cada copia no serían idénticas).
+  - En cada lapso, una representante cuyo maximal es único avanza
+    entera; si no, se sortea de una vez cuántas copias eligen cada
+    maximal (multinomiales con la distribución del modo de selección) y
+    la representante se parte en un grupo por elección distinta.
+  - Lo que una representante envía a otras membranas se multiplica por
+    su peso y las hijas de una división heredan el peso; tras el lapso se
+    vuelven a fusionar las representantes iguales.
+Las cuentas agregadas (membranas, objetos, aplicaciones de reglas) son
+exactas sin expandir el sistema. La trayectoria tiene la misma
+distribución que la del sistema expandido, pero no es la misma con la
+misma semilla, y los IDs de las copias no se conservan.
+"""
+
+from __future__ import annotations
+import itertools
+import random
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .SistemaP import (
+    SistemaP,
+    Membrana,
+    Regla,
+    Direction,
+    Multiset,
+    LapsoResult,
+    ResultadoSimulacion,
+    CacheMaximales,
+    Presupuesto,
+    PresupuestoAgotado,
+    iterar_maximales,
+    huella_regla,
+    huella_reglas,
+    reglas_compiladas,
+    simular_lapso,
+    semilla_lapso,
+    _normalizar_producciones,
+)
+from .compilado import PENDIENTE
+
+__all__ = ["SistemaPonderado", "comprimir", "aplicaciones_totales"]
+
+
+class SistemaPonderado:
+    """
+    SistemaP en el que la membrana `id` representa pesos[id] copias
+    idénticas (1 si no aparece en `pesos`). Las representantes con peso
+    mayor que 1 son siempre hojas.
+    """
+
+    def __init__(self, sistema: SistemaP, pesos: Optional[Dict[str, int]] = None):
+        self.sistema = sistema
+        self.pesos: Dict[str, int] = dict(pesos or {})
+
+    def peso(self, mem_id: str) -> int:
+        return self.pesos.get(mem_id, 1)
+
+    # ----------------------------- fusión -----------------------------
+
+    def _destinos_in(self) -> set:
+        """IDs nombrados como destino de alguna producción IN."""
+        destinos = set()
+        vistas = set()
+        tablas = [m.reglas for m in self.sistema.skin.values()]
+        tablas += [p.reglas for p in self.sistema.prototypes.values()]
+        for reglas in tablas:
+            if id(reglas) in vistas:
+                continue
+            vistas.add(id(reglas))
+            for regla in reglas:
+                for prod in _normalizar_producciones(regla):
+                    if prod.direction == Direction.IN and prod.target:
+                        destinos.add(prod.target)
+        return destinos
+
+    def _agrupables(self) -> Iterator[Membrana]:
+        destinos = self._destinos_in()
+        crean: Dict[int, bool] = {}
+        for mem in self.sistema.skin.values():
+            if mem.children or mem.id_mem == self.sistema.output_membrane or mem.id_mem in destinos:
+                continue
+            if id(mem.reglas) not in crean:
+                crean[id(mem.reglas)] = any(r.create_membranes for r in mem.reglas)
+            if not crean[id(mem.reglas)]:
+                yield mem
+
+    def fusionar(self) -> int:
+        """
+        Fusiona las membranas agrupables idénticas en la primera de cada
+        grupo (en el orden de `skin`), sumando sus pesos. Devuelve el
+        número de membranas eliminadas.
+        """
+        huellas: Dict[int, Tuple] = {}
+        representante: Dict[Tuple, str] = {}
+        sobrantes: List[str] = []
+        for mem in self._agrupables():
+            if id(mem.reglas) not in huellas:
+                huellas[id(mem.reglas)] = huella_reglas(mem.reglas)
+            clave = (
+                mem.parent,
+                huellas[id(mem.reglas)],
+                frozenset((s, c) for s, c in mem.resources.items() if c),
+            )
+            rep_id = representante.setdefault(clave, mem.id_mem)
+            if rep_id != mem.id_mem:
+                self.pesos[rep_id] = self.peso(rep_id) + self.pesos.pop(mem.id_mem, 1)
+                sobrantes.append(mem.id_mem)
+        self.sistema.remove_membranes(sobrantes)
+        return len(sobrantes)
+
+    # ------------------------------ lapso -----------------------------
+
+    def _elegir(
+        self,
+        rng: random.Random,
+        modo_seleccion: str,
+        cache: Optional[CacheMaximales],
+        presupuesto: Optional[Presupuesto] = None
+    ) -> Dict[str, List[Tuple[Regla, int]]]:
+        """
+        Selección del lapso. Parte las representantes cuyas copias eligen
+        maximales distintos y devuelve la elección de cada representante.
+        Cuántas copias eligen cada maximal se sortea de una vez (ver
+        _repartir_voraz y _repartir_uniforme), con un coste que depende de
+        las elecciones distintas y no del número de copias. Los límites por
+        membrana de `presupuesto` valen para todas las copias de una
+        representante juntas.
+        """
+        elecciones: Dict[str, List[Tuple[Regla, int]]] = {}
+        partes: List[Tuple[Membrana, str, Dict[str, int], int]] = []
+        generador: Optional[np.random.Generator] = None
+        for mem in list(self.sistema.skin.values()):
+            rc = reglas_compiladas(mem)
+            copias = self.peso(mem.id_mem)
+            if presupuesto is not None:
+                presupuesto.iniciar_membrana(mem.id_mem)
+            if copias == 1:
+                elegido = rc.elegir(mem.resources, rng, modo_seleccion, cache, None, presupuesto)
+                if elegido:
+                    elecciones[mem.id_mem] = elegido
+                continue
+
+            vector = rc.tabla.vector(mem.resources, estricto=False)
+            veces, estado = rc.preseleccionar(vector[None, :], modo_seleccion)
+            if estado[0] != PENDIENTE:
+                # Maximal único (o ninguno): todas las copias hacen lo mismo
+                elegido = rc.completar(veces[0], int(estado[0]), vector, None)
+                if elegido is not None:
+                    elecciones[mem.id_mem] = [(rc.reglas[k], int(elegido[k])) for k in elegido.nonzero()[0]]
+                continue
+
+            if generador is None:
+                generador = np.random.default_rng(rng.getrandbits(64))
+            grupos = None
+            if modo_seleccion == "uniforme":
+                try:
+                    grupos = _repartir_uniforme(rc, vector, copias, generador, presupuesto)
+                except PresupuestoAgotado:
+                    grupos = _repartir_voraz(rc, vector, copias, generador)
+            elif modo_seleccion == "voraz":
+                grupos = _repartir_voraz(rc, vector, copias, generador)
+            if grupos is None:
+                # Más maximales que copias: cada copia elige por separado
+                grupos = Counter()
+                for _ in range(copias):
+                    elegido = rc.seleccionar(vector, rng, modo_seleccion, cache, presupuesto)
+                    grupos[tuple((int(k), int(elegido[k])) for k in elegido.nonzero()[0])] += 1
+            for j, (posiciones, n) in enumerate(grupos.most_common()):
+                destino = mem.id_mem if j == 0 else self.sistema.nuevo_id(mem.id_mem)
+                if j == 0:
+                    self.pesos[mem.id_mem] = n
+                else:
+                    partes.append((mem, destino, mem.resources, n))
+                elecciones[destino] = [(rc.reglas[k], cnt) for k, cnt in posiciones]
+
+        if partes:
+            nuevas = []
+            for mem, nuevo_id, recursos, n in partes:
+                nuevas.append((Membrana(id_mem=nuevo_id, resources=recursos, reglas=mem.reglas), mem.parent))
+                self.pesos[nuevo_id] = n
+            self.sistema.add_membranes(nuevas)
+        for mid in [mid for mid, n in self.pesos.items() if n == 1]:
+            del self.pesos[mid]
+        return elecciones
+
+    def paso(
+        self,
+        rng_seed: Optional[Union[int, str]] = None,
+        modo_seleccion: str = "voraz",
+        cache: Optional[CacheMaximales] = None,
+        presupuesto: Optional[Presupuesto] = None
+    ) -> LapsoResult:
+        """
+        Simula un lapso (ver simular_lapso) sobre las representantes y
+        vuelve a fusionar las que quedan iguales. El LapsoResult describe
+        una copia de cada representante; su campo `pesos` da las copias.
+        """
+        rng = random.Random(rng_seed)
+        if presupuesto is not None:
+            presupuesto.iniciar_lapso()
+        elecciones = self._elegir(rng, modo_seleccion, cache, presupuesto)
+        lapso = simular_lapso(self.sistema, elecciones=elecciones, pesos=self.pesos)
+        if presupuesto is not None:
+            lapso.agotados = dict(presupuesto.agotados)
+        self.fusionar()
+        return lapso
+
+    def simular(
+        self,
+        max_pasos: Optional[int] = None,
+        parada: Optional[Callable[[Multiset], bool]] = None,
+        rng_seed: Optional[Union[int, str]] = None,
+        modo_seleccion: str = "voraz",
+        cache: Optional[CacheMaximales] = None,
+        presupuesto: Optional[Presupuesto] = None
+    ) -> ResultadoSimulacion:
+        """
+        Como SistemaP.simular, pero con lapsos ponderados (sin registro).
+        """
+        def recursos_salida() -> Multiset:
+            mem = self.sistema.skin.get(self.sistema.output_membrane or "")
+            return mem.resources if mem is not None else {}
+
+        resultado = ResultadoSimulacion(pasos=0, motivo="max_pasos", salida={})
+        if parada is not None and parada(recursos_salida()):
+            resultado.motivo = "predicado"
+        else:
+            while max_pasos is None or resultado.pasos < max_pasos:
+                semilla = semilla_lapso(rng_seed, resultado.pasos)
+                if not self.paso(semilla, modo_seleccion, cache, presupuesto).seleccionados:
+                    resultado.motivo = "sin_reglas"
+                    break
+                resultado.pasos += 1
+                if parada is not None and parada(recursos_salida()):
+                    resultado.motivo = "predicado"
+                    break
+        resultado.salida = dict(recursos_salida())
+        return resultado
+
+    # ---------------------------- agregados ---------------------------
+
+    def configuraciones(self) -> List[Tuple[Membrana, int]]:
+        """Parejas (representante, copias) en el orden de `skin`."""
+        return [(mem, self.peso(mem.id_mem)) for mem in self.sistema.skin.values()]
+
+    def total_membranas(self) -> int:
+        """Número de membranas del sistema expandido."""
+        return sum(self.peso(mid) for mid in self.sistema.skin)
+
+    def recursos_totales(self) -> Multiset:
+        """Objetos de todas las copias, sumados por símbolo."""
+        total: Counter = Counter()
+        for mem, copias in self.configuraciones():
+            for sym, cnt in mem.resources.items():
+                total[sym] += cnt * copias
+        return {sym: cnt for sym, cnt in total.items() if cnt}
+
+    def expandir(self) -> SistemaP:
+        """
+        SistemaP con cada representante repetida según su peso (las copias
+        reciben IDs nuevos). Sólo para inspección: el coste vuelve a crecer
+        con el número de membranas.
+        """
+        sistema = self.sistema.snapshot()
+        nuevas = []
+        for mem, copias in self.configuraciones():
+            for _ in range(copias - 1):
+                nuevas.append((
+                    Membrana(id_mem=sistema.nuevo_id(mem.id_mem), resources=dict(mem.resources), reglas=mem.reglas),
+                    mem.parent,
+                ))
+        sistema.add_membranes(nuevas)
+        return sistema
+
+    def __repr__(self) -> str:
+        return (
+            f"SistemaPonderado({len(self.sistema.skin)} representantes, "
+            f"{self.total_membranas()} membranas)"
+        )
+
+
+def _repartir_voraz(
+    rc,
+    recursos: np.ndarray,
+    copias: int,
+    generador: np.random.Generator
+) -> Counter:
+    """
+    Reparto de `copias` que eligen cada una con la selección voraz
+    (ReglasCompiladas.seleccionar). Se sigue el proceso voraz con grupos de
+    copias en el mismo estado: en cada iteración un grupo se reparte con
+    una multinomial entre sus reglas aplicables (equiprobables) y, dentro
+    de cada regla, entre las veces 1..máximo. Devuelve {elección
+    ((posición, veces), ...): copias}, con la misma distribución que
+    `copias` selecciones independientes.
+    """
+    top = rc.top(rc.max_applications_all(recursos))
+    grupos: Counter = Counter()
+    pila = [(copias, recursos, np.zeros(len(top), dtype=np.int64))]
+    while pila:
+        n, restantes, veces = pila.pop()
+        mult = rc.max_applications_all(restantes)[top]
+        candidatos = np.flatnonzero(mult > 0)
+        if not candidatos.size:
+            grupos[tuple((int(top[j]), int(veces[j])) for j in np.flatnonzero(veces))] += n
+            continue
+        por_regla = generador.multinomial(n, np.full(candidatos.size, 1 / candidatos.size))
+        for pos, n_regla in zip(candidatos.tolist(), por_regla.tolist()):
+            if not n_regla:
+                continue
+            maximo = int(mult[pos])
+            if n_regla < maximo:
+                cuentas, n_cuenta = np.unique(
+                    generador.integers(1, maximo + 1, size=n_regla), return_counts=True
+                )
+            else:
+                n_cuenta = generador.multinomial(n_regla, np.full(maximo, 1 / maximo))
+                cuentas = np.flatnonzero(n_cuenta) + 1
+                n_cuenta = n_cuenta[cuentas - 1]
+            sim, cuenta = rc.izquierda(int(top[pos]))
+            for cnt, m in zip(cuentas.tolist(), n_cuenta.tolist()):
+                hijo = restantes.copy()
+                hijo[sim] -= cuenta * cnt
+                veces_hijo = veces.copy()
+                veces_hijo[pos] += cnt
+                pila.append((m, hijo, veces_hijo))
+    return grupos
+
+
+def _repartir_uniforme(
+    rc,
+    recursos: np.ndarray,
+    copias: int,
+    generador: np.random.Generator,
+    presupuesto: Optional[Presupuesto] = None
+) -> Optional[Counter]:
+    """
+    Reparto de `copias` que eligen cada una un maximal uniforme: si las
+    reglas del cubo superior tienen a lo sumo `copias` maximales, una
+    multinomial equiprobable sobre ellos (un maximal único no consume el
+    generador). Si hay más, devuelve None: las elecciones distintas serían
+    del orden de las copias de todos modos.
+    """
+    top = rc.top(rc.max_applications_all(recursos)).tolist()
+    if not top:
+        return Counter()
+    reglas = [rc.reglas[k] for k in top]
+    posicion = {id(regla): k for regla, k in zip(reglas, top)}
+    maximales = list(itertools.islice(
+        iterar_maximales(reglas, rc.tabla.multiset(recursos), presupuesto), copias + 1
+    ))
+    if len(maximales) > copias:
+        return None
+    if len(maximales) == 1:
+        reparto = [copias]
+    else:
+        reparto = generador.multinomial(copias, np.full(len(maximales), 1 / len(maximales))).tolist()
+    return Counter({
+        tuple((posicion[id(regla)], cnt) for regla, cnt in maximal): n
+        for maximal, n in zip(maximales, reparto) if n
+    })
+
+
+def comprimir(sistema: SistemaP) -> SistemaPonderado:
+    """
+    SistemaPonderado a partir de una instantánea de `sistema` (que no se
+    modifica), con las membranas idénticas ya fusionadas.
+    """
+    ponderado = SistemaPonderado(sistema.snapshot())
+    ponderado.fusionar()
+    return ponderado
+
+
+def aplicaciones_totales(lapso: LapsoResult) -> List[Tuple[Regla, int]]:
+    """
+    Aplicaciones de cada regla en todas las copias durante `lapso`
+    (reglas iguales se suman por huella_regla).
+    """
+    pesos = lapso.pesos or {}
+    totales: Dict[Tuple, List] = {}
+    for mem_id, aplicaciones in lapso.seleccionados.items():
+        for regla, cnt in aplicaciones:
+            entrada = totales.setdefault(huella_regla(regla), [regla, 0])
+            entrada[1] += cnt * pesos.get(mem_id, 1)
+    return [(regla, n) for regla, n in totales.values()]
+
@@ -0,0 +1,142 @@
+"""
+replicas.py
+
+Ejecución de muchas réplicas de un mismo SistemaP con semillas distintas,
+repartidas entre procesos con ProcessPoolExecutor:
+  - El sistema (o la ruta de un .pli, que se lee con Lector.leer_sistema)
+    se envía una sola vez a cada proceso, en su inicializador; cada tarea
+    sólo transporta su lote de semillas.
+  - Cada réplica parte de una instantánea copy-on-write del sistema y se
+    simula con simular() hasta la parada, el predicado o max_pasos, con la
+    semilla de texto "<semilla>" (ver semilla_lapso): cada réplica tiene
+    su propio generador en cada lapso, sin solaparse con las demás.
+  - Los resúmenes (salida final, pasos, motivo, tiempo) vuelven en
+    streaming a medida que terminan los lotes.
+"""
+
+from __future__ import annotations
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+from .SistemaP import SistemaP, Multiset, simular
+
+__all__ = ["ResumenReplica", "iterar_replicas", "simular_replicas"]
+
+
+@dataclass
+class ResumenReplica:
+    """
+    Resumen de una réplica:
+      - semilla: semilla de la réplica (se simuló con rng_seed=str(semilla)).
+      - pasos, motivo: como en ResultadoSimulacion.
+      - salida: recursos finales de la membrana de salida.
+      - segundos: tiempo de simulación de la réplica.
+    """
+    semilla: int
+    pasos: int
+    motivo: str
+    salida: Multiset
+    segundos: float
+
+
+# ------------------------- estado de cada proceso -------------------------
+
+_SISTEMA: Optional[SistemaP] = None
+_OPCIONES: dict = {}
+
+
+def _cargar(origen: Union[SistemaP, str]) -> SistemaP:
+    if isinstance(origen, SistemaP):
+        return origen
+    from .Lector import leer_sistema
+    return leer_sistema(os.fspath(origen))
+
+
+def _inicializar(origen: Union[SistemaP, str], opciones: dict) -> None:
+    """Inicializador del proceso: recibe el sistema una única vez."""
+    global _SISTEMA, _OPCIONES
+    _SISTEMA = _cargar(origen)
+    _OPCIONES = opciones
+
+
+def _replica(sistema: SistemaP, semilla: int, opciones: dict) -> ResumenReplica:
+    inicio = time.perf_counter()
+    # Con la semilla entera, la réplica s + 1 repetiría la s desplazada un lapso
+    resultado = simular(sistema.snapshot(), rng_seed=str(semilla), **opciones)
+    return ResumenReplica(
+        semilla=semilla,
+        pasos=resultado.pasos,
+        motivo=resultado.motivo,
+        salida=resultado.salida,
+        segundos=time.perf_counter() - inicio,
+    )
+
+
+def _lote(semillas: List[int]) -> List[ResumenReplica]:
+    return [_replica(_SISTEMA, semilla, _OPCIONES) for semilla in semillas]
+
+
+# ------------------------------- API pública ------------------------------
+
+def iterar_replicas(
+    sistema: Union[SistemaP, str, os.PathLike],
+    semillas: Union[int, Iterable[int]],
+    max_pasos: Optional[int] = 1000,
+    parada: Optional[Callable[[Multiset], bool]] = None,
+    modo_seleccion: str = "voraz",
+    workers: Optional[int] = None,
+    lote: Optional[int] = None
+) -> Iterator[ResumenReplica]:
+    """
+    Simula una réplica de `sistema` (SistemaP o ruta a un .pli) por cada
+    semilla de `semillas` (un entero n equivale a range(n)) y va
+    devolviendo sus ResumenReplica según terminan, no en orden de semilla.
+    Cada réplica se detiene como simular(); `max_pasos` tiene un valor
+    finito por defecto para que un sistema que no se detiene no bloquee
+    los procesos (None = sin límite).
+
+    `workers` procesos (por defecto os.cpu_count(); 1 = en este proceso)
+    reciben lotes de `lote` semillas (por defecto, unos cuatro lotes por
+    proceso). `parada` debe poder serializarse con pickle (una función de
+    módulo, no una lambda) si se usan procesos.
+    """
+    semillas = list(range(semillas)) if isinstance(semillas, int) else list(semillas)
+    if not isinstance(sistema, SistemaP):
+        sistema = os.fspath(sistema)
+    opciones = {"max_pasos": max_pasos, "parada": parada, "modo_seleccion": modo_seleccion}
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(semillas) <= 1:
+        base = _cargar(sistema)
+        for semilla in semillas:
+            yield _replica(base, semilla, opciones)
+        return
+
+    lote = lote or max(1, len(semillas) // (workers * 4))
+    lotes = [semillas[i:i + lote] for i in range(0, len(semillas), lote)]
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(lotes)),
+        initializer=_inicializar,
+        initargs=(sistema, opciones),
+    ) as pool:
+        for futuro in as_completed([pool.submit(_lote, l) for l in lotes]):
+            yield from futuro.result()
+
+
+def simular_replicas(
+    sistema: Union[SistemaP, str, os.PathLike],
+    semillas: Union[int, Iterable[int]],
+    max_pasos: Optional[int] = 1000,
+    parada: Optional[Callable[[Multiset], bool]] = None,
+    modo_seleccion: str = "voraz",
+    workers: Optional[int] = None,
+    lote: Optional[int] = None
+) -> List[ResumenReplica]:
+    """Como iterar_replicas, pero devuelve todos los resúmenes ordenados por semilla."""
+    return sorted(
+        iterar_replicas(sistema, semillas, max_pasos, parada, modo_seleccion, workers, lote),
+        key=lambda r: r.semilla,
+    )
@@ -1,5 +1,39 @@
+import csv
+import gzip
+import itertools
+import os
 import random
-from .SistemaP import SistemaP, Membrana, Regla
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from .SistemaP import (
+    SistemaP,
+    Membrana,
+    Regla,
+    Production,
+    Direction,
+    Presupuesto,
+    compartir_reglas,
+    simular,
+    simular_lapso,
+    iterar_maximales,
+    contar_maximales,
+    es_maximal,
+    registrar_estadisticas,
+    COLUMNAS_ESTADISTICAS,
+)
+
+__all__ = [
+    "sistema_basico",
+    "sistema_anidado",
+    "sistema_con_conflictos",
+    "Sistema_complejo",
+    "direccionamiento",
+    "actividad1",
+    "actividad2",
+    "division_creacion",
+]
 
 def sistema_basico(recursos: dict = None, num_reglas: int = None) -> SistemaP:
     """
@@ -227,4 +261,520 @@ def division_creacion() -> SistemaP:
     m.add_regla(Regla({"x": 1}, {}, priority=1, create_membranes=[("k", {"y": 2})]))
     
     sistema.add_membrane(m)
-    return sistema
\ No newline at end of file
+    return sistema
+
+
+# --------------------------------------------------------------------------
+# Tests (python -m unittest discover, o pytest)
+# --------------------------------------------------------------------------
+
+def _sistema_aleatorio(r: random.Random) -> SistemaP:
+    """Membranas hermanas con una tabla de reglas aleatoria compartida."""
+    simbolos = "abcd"
+
+    def ms():
+        return {s: r.randint(1, 3) for s in r.sample(simbolos, r.randint(1, 2))}
+
+    reglas = compartir_reglas([
+        Regla(
+            left=ms(),
+            productions=[Production(
+                symbol=r.choice(simbolos), count=r.randint(1, 2),
+                direction=r.choice([Direction.NORMAL, Direction.NORMAL, Direction.OUT]),
+            )],
+            priority=r.randint(1, 2),
+        )
+        for _ in range(r.randint(1, 4))
+    ])
+    sistema = SistemaP(output_membrane="root")
+    sistema.add_membrane(Membrana(id_mem="root", resources={}))
+    for i in range(r.randint(2, 6)):
+        recursos = {s: r.randint(0, 8) for s in simbolos}
+        sistema.add_membrane(Membrana(id_mem=f"m{i}", resources=recursos, reglas=reglas), "root")
+    return sistema
+
+
+def _estado(sistema: SistemaP):
+    return [
+        (m.id_mem, {s: c for s, c in m.resources.items() if c}, list(m.children), m.parent)
+        for m in sistema.skin.values()
+    ]
+
+
+def _elecciones(lapso):
+    return {mid: [(repr(r), c) for r, c in apps] for mid, apps in lapso.seleccionados.items()}
+
+
+class TestCompilado(unittest.TestCase):
+
+    def test_equivale_a_simular_lapso(self):
+        from .compilado import compilar
+        from .funciones import division
+        fabricas = [lambda i=i: _sistema_aleatorio(random.Random(i)) for i in range(40)]
+        fabricas += [division_creacion, lambda: division(17, 3), lambda: actividad2(5, 3)]
+        for fabrica in fabricas:
+            for modo in ("voraz", "uniforme"):
+                sistema, compilado = fabrica(), compilar(fabrica())
+                for t in range(5):
+                    esperado = simular_lapso(sistema, rng_seed=t, modo_seleccion=modo)
+                    obtenido = compilado.paso(rng_seed=t, modo_seleccion=modo)
+                    self.assertEqual(_elecciones(obtenido), _elecciones(esperado))
+                    self.assertEqual(_estado(compilado.a_sistema()), _estado(sistema))
+
+
+class TestMaximales(unittest.TestCase):
+
+    def test_contar_coincide_con_iterar(self):
+        for i in range(400):
+            r = random.Random(i)
+            reglas = [
+                Regla(left={s: r.randint(1, 2) for s in r.sample("abcdef", r.randint(0, 3))})
+                for _ in range(r.randint(0, 7))
+            ]
+            recursos = {s: r.randint(0, 7) for s in "abcdef"}
+            maximales = list(iterar_maximales(reglas, recursos))
+            self.assertEqual(contar_maximales(reglas, recursos), len(maximales))
+            self.assertTrue(all(es_maximal(reglas, recursos, m) for m in maximales))
+
+    def test_presupuesto_agotado_recurre_a_voraz(self):
+        reglas = [Regla(left={"a": 1, "b": 1}), Regla(left={"a": 1, "c": 1}), Regla(left={"b": 1, "c": 1})]
+        recursos = {"a": 500, "b": 500, "c": 500}
+        sistema = SistemaP(output_membrane="m")
+        sistema.add_membrane(Membrana(id_mem="m", resources=dict(recursos), reglas=reglas))
+        lapso = simular_lapso(
+            sistema, rng_seed=0, modo_seleccion="uniforme", contar=True,
+            presupuesto=Presupuesto(nodos=100),
+        )
+        self.assertEqual(lapso.agotados, {"m": "nodos"})
+        self.assertIsNone(lapso.maximales["m"])
+        self.assertTrue(es_maximal(reglas, recursos, lapso.seleccionados["m"]))
+
+
+def _eleccion_binaria() -> SistemaP:
+    """Una membrana que en cada lapso elige al azar entre producir x o y."""
+    sistema = SistemaP(output_membrane="m")
+    sistema.add_membrane(Membrana(id_mem="m", resources={"a": 1}, reglas=[
+        Regla(left={"a": 1}, productions=[Production("a", 1), Production("x", 1)]),
+        Regla(left={"a": 1}, productions=[Production("a", 1), Production("y", 1)]),
+    ]))
+    return sistema
+
+
+class TestReplicas(unittest.TestCase):
+
+    def _secuencia(self, semilla) -> str:
+        elegidos = []
+        simular(
+            _eleccion_binaria(), 30, rng_seed=semilla,
+            al_lapso=lambda n, lapso: elegidos.append(
+                lapso.seleccionados["m"][0][0].productions[1].symbol
+            ),
+        )
+        return "".join(elegidos)
+
+    def test_replicas_independientes(self):
+        from .replicas import simular_replicas
+        resumenes = simular_replicas(_eleccion_binaria(), 8, max_pasos=30, workers=1)
+        secuencias = [self._secuencia(str(r.semilla)) for r in resumenes]
+        for r, secuencia in zip(resumenes, secuencias):
+            self.assertEqual(r.salida.get("x", 0), secuencia.count("x"))
+        # Ninguna réplica repite a la anterior desplazada un lapso
+        for anterior, siguiente in zip(secuencias, secuencias[1:]):
+            self.assertNotEqual(anterior[1:], siguiente[:-1])
+
+    def test_replicas_en_procesos(self):
+        from .replicas import simular_replicas
+        serie = simular_replicas(_eleccion_binaria(), 7, max_pasos=30, workers=1)
+        paralelo = simular_replicas(_eleccion_binaria(), 7, max_pasos=30, workers=2, lote=3)
+        self.assertEqual(
+            [(r.semilla, r.pasos, r.motivo, r.salida) for r in paralelo],
+            [(r.semilla, r.pasos, r.motivo, r.salida) for r in serie],
+        )
+        # Sin max_pasos, un sistema que no se detiene también termina
+        for r in simular_replicas(_eleccion_binaria(), 2, workers=2):
+            self.assertEqual(r.motivo, "max_pasos")
+
+
+class TestPonderado(unittest.TestCase):
+
+    @staticmethod
+    def _sistema(copias: int, reglas_a) -> SistemaP:
+        reglas = compartir_reglas([
+            Regla(left={"d": 1}, priority=2, division=({"a": 2}, {"a": 3})),
+            *reglas_a,
+        ])
+        sistema = SistemaP(output_membrane="root")
+        sistema.add_membrane(Membrana(id_mem="root", resources={}))
+        sistema.add_membranes([
+            (Membrana(id_mem=f"m{i}", resources={"d": 1}, reglas=reglas), "root")
+            for i in range(copias)
+        ])
+        return sistema
+
+    def test_agregados_como_expandido(self):
+        from .ponderado import comprimir
+        a_x = Regla(left={"a": 1}, productions=[Production("x", 1, Direction.OUT)])
+        a_y = Regla(left={"a": 1}, productions=[Production("y", 1, Direction.OUT)])
+        for modo in ("voraz", "uniforme"):
+            for reglas_a in ([a_x], [a_x, a_y]):
+                expandido = self._sistema(200, reglas_a)
+                ponderado = comprimir(expandido)
+                for t in range(4):
+                    simular_lapso(expandido, rng_seed=t, modo_seleccion=modo)
+                    ponderado.paso(rng_seed=t, modo_seleccion=modo)
+                    self.assertEqual(ponderado.total_membranas(), len(expandido.skin))
+                    totales = ponderado.recursos_totales()
+                    esperados = _totales(expandido)
+                    if len(reglas_a) == 1:
+                        self.assertEqual(totales, esperados)
+                    else:
+                        # x e y se reparten al azar; el total de objetos no
+                        self.assertEqual(sum(totales.values()), sum(esperados.values()))
+                salida = ponderado.sistema.skin["root"].resources
+                self.assertEqual(salida.get("x", 0) + salida.get("y", 0), 200 * 5)
+                if len(reglas_a) == 1:
+                    self.assertEqual(salida, expandido.skin["root"].resources)
+
+
+def _totales(sistema: SistemaP) -> dict:
+    total: dict = {}
+    for mem in sistema.skin.values():
+        for s, c in mem.resources.items():
+            if c:
+                total[s] = total.get(s, 0) + c
+    return total
+
+
+class TestProcesos(unittest.TestCase):
+
+    def test_uniforme_en_procesos(self):
+        reglas = [
+            Regla(left={"a": 1, "b": 1}, productions=[Production("x", 1)]),
+            Regla(left={"a": 1, "c": 1}),
+            Regla(left={"b": 1, "c": 1}),
+        ]
+        sistema = SistemaP(output_membrane="skin")
+        sistema.add_membrane(Membrana(id_mem="skin", resources={}))
+        for i in range(6):
+            recursos = {"a": 3 + i, "b": 3, "c": 2}
+            sistema.add_membrane(Membrana(id_mem=f"m{i}", resources=recursos, reglas=list(reglas)), "skin")
+        serie = simular_lapso(
+            sistema.snapshot(), rng_seed=5, modo_seleccion="uniforme", rng_por_membrana=True
+        )
+        with ProcessPoolExecutor(2) as ejecutor:
+            paralelo = simular_lapso(
+                sistema.snapshot(), rng_seed=5, modo_seleccion="uniforme",
+                ejecutor=ejecutor, tam_lote=2,
+            )
+        self.assertEqual(len(paralelo.seleccionados), 6)
+        self.assertEqual(_elecciones(paralelo), _elecciones(serie))
+
+
+class TestEstadisticas(unittest.TestCase):
+
+    @staticmethod
+    def _sistema() -> SistemaP:
+        # a: 8 → 4 → 2 → 1, y se detiene tras 3 lapsos
+        sistema = SistemaP(output_membrane="m")
+        sistema.add_membrane(Membrana(id_mem="m", resources={"a": 8}, reglas=[
+            Regla(left={"a": 2}, productions=[Production("a", 1), Production("b", 1)]),
+        ]))
+        return sistema
+
+    def test_csv_en_streaming(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            for nombre, abrir in (("e.csv", open), ("e.csv.gz", gzip.open)):
+                ruta = os.path.join(carpeta, nombre)
+                df = registrar_estadisticas(self._sistema(), 10, csv_path=ruta, filas_por_bloque=2)
+                with abrir(ruta, "rt", newline="", encoding="utf-8") as f:
+                    filas = list(csv.reader(f))
+                self.assertEqual(filas[0], COLUMNAS_ESTADISTICAS)
+                self.assertEqual(filas[1:], df.astype(str).values.tolist())
+                # Tras la parada no se registran más lapsos
+                self.assertEqual(df["lapso"].tolist(), [1, 2, 3])
+
+    def test_sin_dataframe(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, "e.csv")
+            self.assertIsNone(registrar_estadisticas(self._sistema(), 10, csv_path=ruta, devolver_df=False))
+            with open(ruta, newline="", encoding="utf-8") as f:
+                self.assertEqual(len(list(csv.reader(f))), 4)
+
+
+def _foto(sistema: SistemaP):
+    """Estado completo (recursos, estructura y reglas) para comparar sistemas."""
+    return _estado(sistema), {mid: [repr(r) for r in m.reglas] for mid, m in sistema.skin.items()}
+
+
+class TestInstantaneas(unittest.TestCase):
+
+    @staticmethod
+    def _sistema() -> SistemaP:
+        sistema = SistemaP(output_membrane="skin")
+        sistema.add_membrane(Membrana(id_mem="skin", resources={"z": 1}))
+        sistema.add_membrane(Membrana(id_mem="m1", resources={"a": 4}, reglas=[
+            Regla(left={"a": 1}, productions=[Production("b", 1)]),
+        ]), "skin")
+        sistema.add_membrane(Membrana(id_mem="m2", resources={"a": 2}, reglas=compartir_reglas([
+            Regla(left={"a": 2}, productions=[Production("c", 1, Direction.OUT)]),
+        ])), "skin")
+        return sistema
+
+    @staticmethod
+    def _modificar(sistema: SistemaP) -> None:
+        m1 = sistema._editable("m1")
+        m1.resources["a"] = m1.resources.get("a", 0) + 10
+        m1.add_regla(Regla(left={"b": 1}, productions=[Production("d", 1)]))
+        sistema._editable("m2").remove_regla(0)
+        sistema.add_membrane(Membrana(id_mem="m3", resources={"e": 1}), "m1")
+        sistema.remove_membranes(["m2"])
+        simular_lapso(sistema, rng_seed=0)
+
+    def test_fork_aislado(self):
+        for modificar_fork in (True, False):
+            original = self._sistema()
+            simular_lapso(original, rng_seed=0)   # compila las reglas antes de copiar
+            copia = original.fork()
+            esperado = _foto(original)
+            self._modificar(copia if modificar_fork else original)
+            intacto, modificado = (original, copia) if modificar_fork else (copia, original)
+            self.assertEqual(_foto(intacto), esperado)
+            self.assertNotEqual(_foto(modificado), esperado)
+            # El sistema intacto sigue simulando igual que uno nuevo
+            referencia = self._sistema()
+            simular_lapso(referencia, rng_seed=0)
+            simular_lapso(referencia, rng_seed=1)
+            simular_lapso(intacto, rng_seed=1)
+            self.assertEqual(_foto(intacto), _foto(referencia))
+
+
+# ------------------------------- SAT --------------------------------------
+
+def _expresion_aleatoria(r: random.Random, variables: int, profundidad: int):
+    from .SAT import Variable, Negacion, Conjuncion, Disyuncion
+    if profundidad == 0 or r.random() < 0.25:
+        return Variable(f"x{r.randint(1, variables)}")
+    tipo = r.choice((Negacion, Conjuncion, Disyuncion))
+    if tipo is Negacion:
+        return Negacion(_expresion_aleatoria(r, variables, profundidad - 1))
+    return tipo(
+        _expresion_aleatoria(r, variables, profundidad - 1),
+        _expresion_aleatoria(r, variables, profundidad - 1),
+    )
+
+
+def _valor(expr, asignacion: dict) -> bool:
+    from .SAT import Variable, Negacion, Conjuncion
+    if isinstance(expr, Variable):
+        return asignacion[expr.nombre]
+    if isinstance(expr, Negacion):
+        return not _valor(expr.operando, asignacion)
+    if isinstance(expr, Conjuncion):
+        return _valor(expr.left, asignacion) and _valor(expr.right, asignacion)
+    return _valor(expr.left, asignacion) or _valor(expr.right, asignacion)
+
+
+def _variables(expr) -> list:
+    from .SAT import Variable, Negacion
+    if isinstance(expr, Variable):
+        return [expr.nombre]
+    if isinstance(expr, Negacion):
+        return _variables(expr.operando)
+    return sorted(set(_variables(expr.left)) | set(_variables(expr.right)))
+
+
+def _satisfacible(expr) -> bool:
+    """Satisfacibilidad por fuerza bruta (tabla de verdad)."""
+    variables = _variables(expr)
+    return any(
+        _valor(expr, dict(zip(variables, bits)))
+        for bits in itertools.product([False, True], repeat=len(variables))
+    )
+
+
+def _veredictos(sistema: SistemaP) -> dict:
+    """{asignación: veredicto} de las membranas de asignación de un sistema SAT."""
+    from .SAT import asignacion_de, VEREDICTO_T, VEREDICTO_F
+    return {
+        tuple(asignacion_de(m.resources).items()): VEREDICTO_T in m.resources
+        for m in sistema.skin.values()
+        if VEREDICTO_T in m.resources or VEREDICTO_F in m.resources
+    }
+
+
+class TestSAT(unittest.TestCase):
+
+    def assertVeredictosCorrectos(self, expr, sistema: SistemaP) -> None:
+        veredictos = _veredictos(sistema)
+        self.assertEqual(len(veredictos), 2 ** len(_variables(expr)))
+        for asignacion, veredicto in veredictos.items():
+            self.assertEqual(veredicto, _valor(expr, dict(asignacion)))
+
+    def test_estructura_como_tabla_de_verdad(self):
+        from .SAT import generar_sistema_por_estructura, pasos_evaluacion
+        for i in range(150):
+            expr = _expresion_aleatoria(random.Random(i), 4, 4)
+            for compartir in (False, True):
+                sistema = generar_sistema_por_estructura(expr, compartir)
+                simular(sistema, pasos_evaluacion(expr))
+                self.assertVeredictosCorrectos(expr, sistema)
+                salida = sistema.skin["M_root"].resources
+                self.assertEqual("SAT" in salida, _satisfacible(expr))
+
+    def test_testigo(self):
+        from .SAT import resolver_con_testigo
+        for i in range(60):
+            expr = _expresion_aleatoria(random.Random(i), 4, 4)
+            variables = _variables(expr)
+            for por_division, compartir, libres in itertools.product(
+                (False, True), (False, True), (0, 1, 10)
+            ):
+                testigo = resolver_con_testigo(expr, por_division, libres, compartir)
+                if testigo is None:
+                    self.assertFalse(_satisfacible(expr))
+                else:
+                    self.assertEqual(sorted(testigo), variables)
+                    self.assertTrue(_valor(expr, testigo))
+
+    def test_testigo_insatisfacible(self):
+        from .SAT import AnalizadorExpresion, resolver_con_testigo
+        expr = AnalizadorExpresion("(a | b) & (~a | b) & (a | ~b) & (~a | ~b)").parse()
+        for por_division in (False, True):
+            for libres in (0, 1, 2):
+                self.assertIsNone(resolver_con_testigo(expr, por_division, libres))
+        # Un único testigo: lo encuentra con cualquier reparto
+        expr = AnalizadorExpresion("a & ~b & c").parse()
+        for por_division in (False, True):
+            for libres in (0, 2, 3):
+                self.assertEqual(
+                    resolver_con_testigo(expr, por_division, libres),
+                    {"a": True, "b": False, "c": True},
+                )
+
+    def test_prefijo_fija_variables(self):
+        from .SAT import (
+            AnalizadorExpresion, generar_sistema_por_estructura,
+            generar_sistema_por_division, pasos_evaluacion,
+        )
+        expr = AnalizadorExpresion("(a | ~b) & (b | c) & ~(a & c)").parse()
+        variables = _variables(expr)
+        fija = "b"
+        for por_division in (False, True):
+            generar = generar_sistema_por_division if por_division else generar_sistema_por_estructura
+            for valor in (False, True):
+                sistema = generar(expr, prefijo={fija: valor})
+                simular(sistema, pasos_evaluacion(expr, por_division))
+                veredictos = _veredictos(sistema)
+                self.assertEqual(len(veredictos), 2 ** (len(variables) - 1))
+                for asignacion, veredicto in veredictos.items():
+                    self.assertEqual(dict(asignacion)[fija], valor)
+                    self.assertEqual(veredicto, _valor(expr, dict(asignacion)))
+
+    def test_division_como_tabla_de_verdad(self):
+        from .SAT import generar_sistema_por_division, pasos_evaluacion
+        for i in range(100):
+            expr = _expresion_aleatoria(random.Random(i), 4, 4)
+            sistema = generar_sistema_por_division(expr)
+            # pasos_evaluacion es cota: las puertas que ya conocen su valor
+            # (or con un hijo T, and con un hijo F) pueden responder antes
+            simular(sistema, pasos_evaluacion(expr, por_division=True))
+            self.assertVeredictosCorrectos(expr, sistema)
+            self.assertEqual("SAT" in sistema.skin["M_root"].resources, _satisfacible(expr))
+
+    def test_pasos_evaluacion(self):
+        from .SAT import (
+            AnalizadorExpresion, generar_sistema_por_estructura,
+            generar_sistema_por_division, pasos_evaluacion,
+        )
+        expr = AnalizadorExpresion("(a | b | ~c) & ~(a & d)").parse()
+        # Profundidad 3: and → not → and (las cadenas cuentan como una puerta)
+        self.assertEqual(pasos_evaluacion(expr), 3 + 2)
+        self.assertEqual(pasos_evaluacion(expr, por_division=True), 4 + 3 + 1)
+        # Y es ajustada: un lapso antes aún falta algún veredicto
+        for por_division in (False, True):
+            generar = generar_sistema_por_division if por_division else generar_sistema_por_estructura
+            sistema = generar(expr)
+            simular(sistema, pasos_evaluacion(expr, por_division) - 1)
+            self.assertLess(len(_veredictos(sistema)), 2 ** 4)
+            simular(sistema, 1)
+            self.assertEqual(len(_veredictos(sistema)), 2 ** 4)
+
+    def test_tseitin_equisatisfacible(self):
+        from .SAT import (
+            Conjuncion, Negacion, clausulas_tseitin, compartir_subexpresiones,
+            expresion_desde_clausulas,
+        )
+        for i in range(150):
+            expr = _expresion_aleatoria(random.Random(i), 4, 3)
+            if i % 2:
+                # Casi todas las fórmulas aleatorias son satisfacibles; e ∧ ¬f añade insatisfacibles
+                expr = Conjuncion(expr, Negacion(_expresion_aleatoria(random.Random(-i), 4, 2)))
+            for e in (expr, compartir_subexpresiones(expr)):
+                clausulas = clausulas_tseitin(e)
+                self.assertEqual(
+                    _satisfacible(expresion_desde_clausulas(clausulas)), _satisfacible(expr)
+                )
+
+    def test_clausula_larga(self):
+        from .SAT import (
+            AnalizadorExpresion, Conjuncion, expresion_desde_clausulas,
+            pasos_evaluacion, resolver_satisfaccion,
+        )
+        # Mil literales sobre cuatro variables: una sola puerta or de 1000 entradas
+        clausula = [f"x{k % 4}" for k in range(1000)]
+        expr = expresion_desde_clausulas([clausula])
+        self.assertEqual(pasos_evaluacion(expr), 3)
+        for por_division in (False, True):
+            self.assertTrue(resolver_satisfaccion(expr, por_division=por_division))
+        # Con todas las variables a false la cláusula no puede cumplirse
+        expr = Conjuncion(expr, AnalizadorExpresion("~x0 & ~x1 & ~x2 & ~x3").parse())
+        self.assertEqual(pasos_evaluacion(expr), 4)
+        for por_division in (False, True):
+            self.assertFalse(resolver_satisfaccion(expr, por_division=por_division))
+
+
+DIMACS = """c ejemplo
+c con comentarios
+p cnf 3 3
+1 -2
+ 0 2 3 0
+-1
+-3 0
+%
+0
+"""
+
+
+class TestDimacs(unittest.TestCase):
+
+    def _escribir(self, carpeta: str, nombre: str, texto: str) -> str:
+        ruta = os.path.join(carpeta, nombre)
+        with (gzip.open if nombre.endswith(".gz") else open)(ruta, "wt") as f:
+            f.write(texto)
+        return ruta
+
+    def test_leer_dimacs(self):
+        from .SAT import leer_dimacs
+        with tempfile.TemporaryDirectory() as carpeta:
+            for nombre in ("f.cnf", "f.cnf.gz"):
+                ruta = self._escribir(carpeta, nombre, DIMACS)
+                self.assertEqual(
+                    leer_dimacs(ruta), [["x1", "~x2"], ["x2", "x3"], ["~x1", "~x3"]]
+                )
+
+    def test_lote_en_procesos(self):
+        from .SAT import resolver_satisfaccion_lote
+        instancias = {
+            "sat.cnf": (DIMACS, True),
+            "unsat.cnf": ("p cnf 2 4\n1 2 0\n-1 2 0\n1 -2 0\n-1 -2 0\n", False),
+            "vacia.cnf": ("p cnf 0 0\n", True),
+        }
+        with tempfile.TemporaryDirectory() as carpeta:
+            rutas = [self._escribir(carpeta, n, texto) for n, (texto, _) in instancias.items()]
+            for por_division in (False, True):
+                resumenes = resolver_satisfaccion_lote(rutas, workers=2, por_division=por_division)
+                self.assertEqual([r.ruta for r in resumenes], rutas)
+                self.assertEqual(
+                    [r.satisfacible for r in resumenes], [sat for _, sat in instancias.values()]
+                )
+                self.assertEqual([(r.variables, r.clausulas) for r in resumenes], [(3, 3), (2, 4), (0, 0)])
@@ -11,6 +11,7 @@ import matplotlib.pyplot as plt
 from matplotlib.patches import Rectangle
 from copy import deepcopy
 from typing import List, Dict, Optional, Tuple
+from itertools import islice
 import math
 
 from .SistemaP import (
@@ -20,11 +21,36 @@ from .SistemaP import (
     Production,        # ← añadido
     Direction,         # ← añadido
     simular_lapso,
-    generar_maximales,
-    max_applications,
+    iterar_maximales,
+    reglas_top,
     LapsoResult,
 )
 
+# Maximales mostrados por membrana en el panel "Maximales generados"
+MAXIMALES_MOSTRADOS = 12
+
+
+def _maximales_mostrados(m: Membrana, recursos: Dict[str, int]) -> Optional[str]:
+    """
+    Texto con los primeros MAXIMALES_MOSTRADOS maximales de las reglas de
+    mayor prioridad de `m` ("…" si hay más), o None si no tiene reglas
+    aplicables. Se enumeran de forma perezosa: no se generan los demás.
+    """
+    top = reglas_top(m, recursos)
+    if not top:
+        return None
+    conjuntos = list(islice(iterar_maximales(top, recursos), MAXIMALES_MOSTRADOS + 1))
+    rep = []
+    for combo in conjuntos[:MAXIMALES_MOSTRADOS]:
+        elems = []
+        for regla, veces in combo:
+            ridx = m.reglas.index(regla) + 1
+            elems += [f"r{ridx}"] * veces
+        rep.append("{" + ",".join(elems) + "}")
+    if len(conjuntos) > MAXIMALES_MOSTRADOS:
+        rep.append("…")
+    return ",".join(rep)
+
 
 def _format_productions(r: Regla) -> str:
     """
@@ -113,10 +139,7 @@ def dibujar_membrana(
 
 
 def obtener_membranas_top(sistema: SistemaP) -> List[Membrana]:
-    todos_ids = set(sistema.skin.keys())
-    ids_hijas = {h for m in sistema.skin.values() for h in m.children}
-    top_ids = todos_ids - ids_hijas
-    return [sistema.skin[mid] for mid in top_ids]
+    return sistema.top_membranes()
 
 
 def dibujar_reglas(fig: plt.Figure, sistema: SistemaP) -> None:
@@ -163,7 +186,7 @@ def simular_y_visualizar(
     rng_seed: Optional[int] = None
 ) -> None:
     modo = "max_paralelo"
-    historial: List[SistemaP] = [deepcopy(sistema)]
+    historial: List[SistemaP] = [sistema.snapshot()]
     max_aplicados: List[Optional[Dict[str, List[Tuple[Regla, int]]]]] = [None]
     idx = 0
 
@@ -189,20 +212,9 @@ def simular_y_visualizar(
         texto_candidatos = "Maximales generados:\n"
         estado_actual = historial[i]
         for m in estado_actual.skin.values():
-            rec_disp = deepcopy(m.resources)
-            aplicables = [r for r in m.reglas if max_applications(rec_disp, r) > 0]
-            if aplicables:
-                prio_max = max(r.priority for r in aplicables)
-                reglas_top = [r for r in aplicables if r.priority == prio_max]
-                conjuntos = generar_maximales(reglas_top, rec_disp)
-                rep = []
-                for combo in conjuntos:
-                    elems = []
-                    for regla, veces in combo:
-                        ridx = m.reglas.index(regla) + 1
-                        elems += [f"r{ridx}"] * veces
-                    rep.append("{" + ",".join(elems) + "}")
-                texto_candidatos += f"{m.id_mem}: " + ",".join(rep) + "\n"
+            rep = _maximales_mostrados(m, deepcopy(m.resources))
+            if rep is not None:
+                texto_candidatos += f"{m.id_mem}: " + rep + "\n"
         ax.text(
             0.02, 0.02, texto_candidatos,
             transform=ax.transAxes, fontsize=8,
@@ -225,7 +237,7 @@ def simular_y_visualizar(
         nonlocal idx
         if event.key == "right" and idx < pasos:
             if idx == len(historial) - 1:
-                copia = deepcopy(historial[idx])
+                copia = historial[idx].fork()
                 lap = simular_lapso(copia, rng_seed=rng_seed)
                 historial.append(copia)
                 max_aplicados.append(lap.seleccionados)
@@ -257,7 +269,7 @@ def simular_varios_y_visualizar(
             raise TypeError(
                 f"Elemento {idx_s} no es SistemaP, es {type(sis).__name__}"
             )
-    historiales: List[List[SistemaP]] = [[deepcopy(s) for s in sistemas]]
+    historiales: List[List[SistemaP]] = [[s.snapshot() for s in sistemas]]
     max_aplicados: List[List[Optional[Dict[str, List[Tuple[Regla, int]]]]]] = [[None] * len(sistemas)]
     idx = 0
     n = len(sistemas)
@@ -284,20 +296,9 @@ def simular_varios_y_visualizar(
                     )
                 texto_cand = 'Maximales generados:'
                 for m in est.skin.values():
-                    rec = deepcopy(m.resources)
-                    aplic = [r for r in m.reglas if max_applications(rec, r) > 0]
-                    if aplic:
-                        prio = max(r.priority for r in aplic)
-                        top = [r for r in aplic if r.priority == prio]
-                        combos = generar_maximales(top, rec)
-                        rep: List[str] = []
-                        for combo in combos:
-                            elems: List[str] = []
-                            for regla, cnt in combo:
-                                idx_r = m.reglas.index(regla) + 1
-                                elems += [f'r{idx_r}'] * cnt
-                            rep.append('{' + ','.join(elems) + '}')
-                        texto_cand += f' {m.id_mem}: ' + ','.join(rep)
+                    rep = _maximales_mostrados(m, deepcopy(m.resources))
+                    if rep is not None:
+                        texto_cand += f' {m.id_mem}: ' + rep
                 wrapped = textwrap.fill(texto_cand, width=40)
                 ax.text(
                     0.02, 0.05, wrapped,
@@ -342,7 +343,7 @@ def simular_varios_y_visualizar(
         nonlocal idx
         if event.key == 'right' and idx < pasos:
             if idx == len(historiales) - 1:
-                nuevos = [deepcopy(historiales[-1][k]) for k in range(len(sistemas))]
+                nuevos = [historiales[-1][k].fork() for k in range(len(sistemas))]
                 sel_line: List[Optional[Dict[str,List[Tuple[Regla,int]]]]] = []
                 for k, sis in enumerate(nuevos):
                     seed = None if rng_seed is None else rng_seed + k + len(historiales)
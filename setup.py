@@ -18,6 +18,7 @@ setup(
     url="https://github.com/Guillemon01/MemBrainPy",
     packages=find_packages(),        # detecta MemBrainPy y subpaquetes
     install_requires=[
+        "numpy>=1.17",
         "pandas>=1.0",
         "matplotlib>=3.0",
     ],